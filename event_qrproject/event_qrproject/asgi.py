@@ -5,6 +5,35 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+Scan-node deployment profile
+----------------------------
+The gate-facing endpoints have native async versions (tickets/async_views.py):
+
+    POST /tickets/api/async/validate/
+    GET  /tickets/async/validate/<token>/
+
+Serve them from an ASGI server so one process can hold many concurrent
+scanners while they wait on the database, e.g.:
+
+    uvicorn event_qrproject.asgi:application --host 0.0.0.0 --port 8000 \
+        --workers 2 --loop uvloop --http httptools --no-access-log
+
+or, under gunicorn's process manager:
+
+    gunicorn event_qrproject.asgi:application -k uvicorn.workers.UvicornWorker \
+        --workers 2 --bind 0.0.0.0:8000
+
+Scan nodes can also run the trimmed settings_scan profile (validation
+endpoints only, minimal middleware, no admin/auth/sessions/messages):
+
+    DJANGO_SETTINGS_MODULE=event_qrproject.settings_scan uvicorn event_qrproject.asgi:application ...
+
+Notes:
+- Keep CONN_MAX_AGE at 0 under ASGI; async ORM calls run in a thread pool
+  and persistent connections are not reused between requests.
+- Add workers per CPU core, not per expected concurrent scanner.
+- Serve static/media files from the reverse proxy, not from Django.
 """
 
 import os
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 # Middleware
 # ------------------------------------------------------------------
 MIDDLEWARE = [
+    "tickets.middleware.MetricsMiddleware",  # first, so timings cover the whole stack
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -62,7 +63,8 @@ ROOT_URLCONF = "event_qrproject.urls"
 # ------------------------------------------------------------------
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates, timing renders for the request metrics.
+        "BACKEND": "tickets.metrics.InstrumentedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -82,15 +84,131 @@ TEMPLATES = [
 WSGI_APPLICATION = "event_qrproject.wsgi.application"
 
 # ------------------------------------------------------------------
-# Database (default: SQLite)
+# Database, chosen with DB_PROFILE:
+#   "sqlite"     plain SQLite file (default, development)
+#   "sqlite-wal" SQLite tuned for a single-box venue: WAL journal so
+#                readers never wait on the check-in writer,
+#                synchronous=NORMAL, a busy timeout instead of
+#                "database is locked" errors, and mmap'd reads
+#   "postgres"   PostgreSQL (psycopg 3) with persistent, health-checked
+#                connections, or a connection pool when DB_POOL_MAX_SIZE
+#                is set (requires psycopg[pool])
+# Compare them with `manage.py benchmark_checkins`.
 # ------------------------------------------------------------------
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+DB_PROFILE = os.getenv("DB_PROFILE", "sqlite")
+SQLITE_PATH = os.getenv("SQLITE_PATH") or BASE_DIR / "db.sqlite3"
+
+if DB_PROFILE == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": SQLITE_PATH,
+        }
+    }
+elif DB_PROFILE == "sqlite-wal":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": SQLITE_PATH,
+            "OPTIONS": {
+                # Take the write lock at BEGIN so concurrent writers queue on
+                # the busy timeout instead of failing on lock upgrade.
+                "transaction_mode": "IMMEDIATE",
+                "timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 20)),  # seconds
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))};"
+                    "PRAGMA cache_size=-65536;"
+                    "PRAGMA temp_store=MEMORY;"
+                ),
+            },
+        }
+    }
+elif DB_PROFILE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("POSTGRES_DB", "event_qr"),
+            "USER": os.getenv("POSTGRES_USER", "postgres"),
+            "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
+            "HOST": os.getenv("POSTGRES_HOST", "localhost"),
+            "PORT": os.getenv("POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
     }
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 0))
+    if DB_POOL_MAX_SIZE:
+        # The pool replaces persistent connections; Django refuses both.
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+            "max_size": DB_POOL_MAX_SIZE,
+            "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+        }
+else:
+    raise ValueError(f"Unknown DB_PROFILE: {DB_PROFILE}")
+
+# ------------------------------------------------------------------
+# Caches
+# "tickets" / "events" back the scan cache in tickets/scan_cache.py.
+# LocMemCache is per-process; use FileBasedCache (or a shared backend)
+# to share entries between workers.
+# ------------------------------------------------------------------
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "tickets": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "tickets",
+        "TIMEOUT": int(os.getenv("TICKET_CACHE_TIMEOUT", 300)),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("TICKET_CACHE_MAX_ENTRIES", 200000))},
+    },
+    "events": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "events",
+        "TIMEOUT": int(os.getenv("TICKET_CACHE_TIMEOUT", 300)),
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+    # Rate-limit buckets, negative cache and Bloom filter generations
+    # (tickets/shield.py). Share it between workers for exact limits.
+    "shield": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shield",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
 }
 
+# Scan endpoint shielding: (tokens per second, burst) per client IP and
+# per scanner device (X-Device-ID / "device_id"); None disables a limit.
+TICKET_RATE_LIMITS = {
+    "ip": (50, 100),
+    "device": (10, 20),
+}
+TICKET_NEGATIVE_CACHE_TTL = 300  # seconds a not-found / forged scan is remembered
+TICKET_BLOOM_FILTERS = True
+TICKET_BLOOM_ERROR_RATE = 0.001
+TICKET_BLOOM_TTL = 300  # seconds before a per-process filter is rebuilt anyway
+
+# Scan attempt log (tickets/scan_log.py): buffered per process and written
+# with bulk_create every TICKET_SCAN_LOG_BATCH_SIZE attempts or
+# TICKET_SCAN_LOG_FLUSH_SECONDS, whichever comes first. Attempts still
+# buffered when a process dies are lost.
+TICKET_SCAN_LOG = os.getenv("TICKET_SCAN_LOG", "1") == "1"
+TICKET_SCAN_LOG_BATCH_SIZE = 500
+TICKET_SCAN_LOG_FLUSH_SECONDS = 2
+TICKET_SCAN_LOG_MAX_PENDING = 50000
+# Tokens scanner devices present to the offline sync APIs, comma-separated
+# (tickets/permissions.py). Staff logins are accepted too.
+TICKET_SCANNER_TOKENS = [t for t in os.getenv("TICKET_SCANNER_TOKENS", "").split(",") if t]
+# Check-in rollups (tickets/rollups.py): per-minute counts per event and
+# gate, folded into hourly rows by manage.py downsample_checkin_rollups once
+# an event has been over this many days.
+TICKET_ROLLUP_MINUTE_DAYS = int(os.getenv("TICKET_ROLLUP_MINUTE_DAYS", 7))
+
 # ------------------------------------------------------------------
 # Password validation
 # ------------------------------------------------------------------
@@ -123,7 +241,60 @@ MEDIA_ROOT = BASE_DIR / "media"
 BASE_URL = "https://refractorily-catabatic-shirleen.ngrok-free.dev"
  # Example: https://abcd1234.ngrok-free.app
 
+# ------------------------------------------------------------------
+# QR images
+# Tickets' QR codes are rendered on demand by tickets/qr/<token>/ and kept
+# in a bounded in-memory LRU, optionally backed by a disk directory.
+# Set TICKET_STORE_QR_IMAGES to also write a PNG per ticket at registration.
+# ------------------------------------------------------------------
+TICKET_STORE_QR_IMAGES = os.getenv("TICKET_STORE_QR_IMAGES", "0") == "1"
+# What ticket QR codes encode: "url" (the validation page, readable by any
+# phone camera) or "compact" (base45 id + truncated MAC for gate scanners).
+TICKET_QR_PAYLOAD = os.getenv("TICKET_QR_PAYLOAD", "url")
+TICKET_QR_RENDERER = os.getenv("TICKET_QR_RENDERER", "png")  # "png", "svg" or "http"
+TICKET_QR_RENDERER_OPTIONS = {}  # e.g. {"box_size": 8, "error_correction": "L"}
+TICKET_QR_CACHE_BYTES = int(os.getenv("TICKET_QR_CACHE_BYTES", 64 * 1024 * 1024))
+TICKET_QR_CACHE_DIR = os.getenv("TICKET_QR_CACHE_DIR") or None
+TICKET_QR_CACHE_MAX_AGE = 24 * 60 * 60
+# Processes rendering QR codes missing from storage for print exports
+# (tickets/events/<id>/print/, manage.py print_tickets); None = one per CPU.
+TICKET_PRINT_WORKERS = int(os.getenv("TICKET_PRINT_WORKERS", 0)) or None
+# Bulk issuance from api/issue/ (tickets/issuance.py): jobs run at most
+# TICKET_ISSUE_JOBS at a time per process and share one pool of
+# TICKET_ISSUE_WORKERS render processes (None = one per CPU). Job status
+# rows idle for TICKET_ISSUE_JOB_TTL seconds are purged.
+TICKET_ISSUE_JOBS = int(os.getenv("TICKET_ISSUE_JOBS", 2))
+TICKET_ISSUE_WORKERS = int(os.getenv("TICKET_ISSUE_WORKERS", 0)) or None
+TICKET_ISSUE_JOB_TTL = 24 * 60 * 60
+# Where manage.py archive_tickets writes ended events' tickets (gzipped
+# NDJSON, one file per event). Not under MEDIA_ROOT: it is never served.
+TICKET_ARCHIVE_DIR = os.getenv("TICKET_ARCHIVE_DIR") or BASE_DIR / "archive"
+TICKET_ARCHIVE_AFTER_DAYS = int(os.getenv("TICKET_ARCHIVE_AFTER_DAYS", 30))
+
+# ------------------------------------------------------------------
+# Key used to sign ticket payloads (see tickets/utils.py)
+# ------------------------------------------------------------------
+TICKET_HMAC_KEY = os.getenv("TICKET_HMAC_KEY", SECRET_KEY)
+# Each event signs with a key derived from TICKET_HMAC_KEY. While this is on,
+# signatures made with TICKET_HMAC_KEY itself are still accepted.
+TICKET_ACCEPT_GLOBAL_SIGNATURES = os.getenv("TICKET_ACCEPT_GLOBAL_SIGNATURES", "1") == "1"
+
 # ------------------------------------------------------------------
 # Default primary key field type
 # ------------------------------------------------------------------
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# ------------------------------------------------------------------
+# Request metrics (tickets/metrics.py), scraped from /tickets/metrics/.
+# Views running more queries than their budget log a warning on the
+# "tickets.metrics" logger; budgets are per URL name.
+# ------------------------------------------------------------------
+TICKET_QUERY_BUDGET = int(os.getenv("TICKET_QUERY_BUDGET", 20))
+# A warm scan: the cached lookup, then BEGIN, the ticket and counter
+# UPDATEs, the rollup upsert, and COMMIT.
+TICKET_QUERY_BUDGETS = {
+    "validate_ticket": 6,
+    "validate_ticket_async": 6,
+    "api_validate_ticket": 6,
+    "api_validate_ticket_async": 6,
+}
@@ -0,0 +1,51 @@
+# settings_scan.py
+#
+# Scan-node profile, for horizontally scaled workers that only validate
+# tickets:
+#
+#     DJANGO_SETTINGS_MODULE=event_qrproject.settings_scan \
+#         gunicorn event_qrproject.wsgi:application
+#
+# (or event_qrproject.asgi:application for the async endpoints, see asgi.py).
+# Everything else comes from settings.py: database, caches, signing keys,
+# rate limits and scan log. Only the validation endpoints are routed
+# (tickets/scan_urls.py), with no admin, auth, sessions or messages apps
+# and a minimal middleware chain: the scan endpoints take no cookies,
+# the API views are CSRF-exempt and the QR link is a GET. Run migrations
+# and management commands with the full settings.
+
+import os
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = os.getenv("DJANGO_DEBUG", "0") == "1"
+
+INSTALLED_APPS = [
+    "tickets",
+]
+
+MIDDLEWARE = [
+    "tickets.middleware.MetricsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+]
+
+ROOT_URLCONF = "event_qrproject.urls_scan"
+
+TEMPLATES = [
+    {
+        "BACKEND": "tickets.metrics.InstrumentedDjangoTemplates",
+        "DIRS": [],
+        "APP_DIRS": True,
+        "OPTIONS": {"context_processors": []},
+    },
+]
+
+# No django.contrib.auth: DRF must not build request.user, and only JSON
+# (or form-encoded) bodies come in and JSON goes out.
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [],
+    "DEFAULT_PERMISSION_CLASSES": [],
+    "UNAUTHENTICATED_USER": None,
+    "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
+    "DEFAULT_PARSER_CLASSES": ["rest_framework.parsers.JSONParser", "rest_framework.parsers.FormParser"],
+}
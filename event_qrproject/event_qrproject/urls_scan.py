@@ -0,0 +1,8 @@
+# event_qr_project/urls_scan.py
+# URLconf of the scan-node profile (settings_scan.py): no admin, no
+# issuance or management pages.
+from django.urls import path, include
+
+urlpatterns = [
+    path('tickets/', include('tickets.scan_urls')),
+]
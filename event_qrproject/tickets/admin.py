@@ -1,10 +1,18 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Ticket, Event
+from .models import CheckInRollup, EventArchive, ScanAttempt, Ticket, Event
+from .pagination import CappedCountPaginator
 
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
     list_display = ("id", "event", "status", "signature", "created_at")
+    list_select_related = ("event",)
+    list_filter = ("status",)
+    ordering = ("-created_at",)
+    # Avoid COUNT(*) over the whole table on every changelist page.
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ("event",)
     readonly_fields = ('qr_image_preview',)  # add other readonly fields as needed
 
     def qr_image_preview(self, obj):
@@ -17,3 +25,56 @@ class TicketAdmin(admin.ModelAdmin):
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
     list_display = ("title", "start_at", "end_at")
+    ordering = ("-start_at",)
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(EventArchive)
+class EventArchiveAdmin(admin.ModelAdmin):
+    # Written by manage.py archive_tickets.
+    list_display = ("event", "tickets", "used", "expired", "archived_at", "compacted_at")
+    list_select_related = ("event",)
+    ordering = ("-archived_at",)
+    exclude = ("bloom",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ScanAttempt)
+class ScanAttemptAdmin(admin.ModelAdmin):
+    # Append-only: rows are written by tickets/scan_log.py and never edited.
+    list_display = ("scanned_at", "outcome", "ticket_id", "event_id", "device_id", "gate")
+    list_filter = ("outcome",)
+    search_fields = ("=ticket__id", "=device_id", "=gate")
+    ordering = ("-scanned_at",)
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CheckInRollup)
+class CheckInRollupAdmin(admin.ModelAdmin):
+    # Maintained by tickets/rollups.py; rebuild with manage.py rebuild_checkin_rollups.
+    list_display = ("bucket", "event", "resolution", "gate", "count")
+    list_select_related = ("event",)
+    list_filter = ("resolution",)
+    search_fields = ("=event__id", "=gate")
+    ordering = ("-bucket",)
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
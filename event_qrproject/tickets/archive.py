@@ -0,0 +1,205 @@
+# tickets/archive.py
+"""
+Archival of ended events' tickets.
+
+Once an event has been over for settings.TICKET_ARCHIVE_AFTER_DAYS, its
+tickets are written to ``<TICKET_ARCHIVE_DIR>/<event id>.ndjson.gz`` (the
+NDJSON export format, gzipped) and an EventArchive row records their
+counts and a Bloom filter of the archived ids and tokens. The live rows
+and their QR image files are then deleted in batches. Event and
+EventCounter rows are kept, so the event's stats read the same.
+
+Re-running is harmless: an event that already has an archive only gets
+its remaining archived rows deleted.
+"""
+import gzip
+import json
+import os
+import tempfile
+import threading
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import scan_cache, shield
+from .expiry import expire_event_tickets
+from .export import EXPORT_FIELDS, export_rows
+from .models import Event, EventArchive, Ticket
+
+DEFAULT_BATCH_SIZE = 2000
+BLOOM_ERROR_RATE = 0.01
+
+
+def archive_file(archive):
+    return os.path.join(settings.TICKET_ARCHIVE_DIR, archive.path)
+
+
+def write_archive(event, archived_at, chunk_size=DEFAULT_BATCH_SIZE):
+    """
+    Write ``event``'s tickets created up to ``archived_at`` to its archive
+    file and record the EventArchive. The file is written under a
+    temporary name and moved into place once complete.
+    """
+    directory = settings.TICKET_ARCHIVE_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = f"{event.id}.ndjson.gz"
+
+    tickets = Ticket.objects.filter(event=event, created_at__lte=archived_at)
+    bloom = shield.BloomFilter(2 * tickets.count(), BLOOM_ERROR_RATE)
+    counts = Counter()
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as out:
+                for row in export_rows(event, chunk_size=chunk_size, until=archived_at):
+                    record = dict(zip(EXPORT_FIELDS, row))
+                    out.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+                    bloom.add(record["id"])
+                    bloom.add(record["token"])
+                    counts[record["status"]] += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp, os.path.join(directory, path))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+    archive, _ = EventArchive.objects.update_or_create(event=event, defaults={
+        "path": path,
+        "tickets": sum(counts.values()),
+        "used": counts[Ticket.STATUS_USED],
+        "expired": counts[Ticket.STATUS_EXPIRED],
+        "bloom": bloom.to_bytes(),
+        "archived_at": archived_at,
+        "compacted_at": None,
+    })
+    return archive
+
+
+def compact(archive, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Delete the live rows and QR files of the tickets in ``archive``,
+    ``batch_size`` per transaction. Returns the number of rows deleted.
+    """
+    tickets = Ticket.objects.filter(event_id=archive.event_id, created_at__lte=archive.archived_at)
+    total = 0
+    while True:
+        with transaction.atomic():
+            chunk = list(tickets.values_list("id", "token", "qr_image")[:batch_size])
+            if not chunk:
+                break
+            # _raw_delete() skips the post_delete receivers, so EventCounter
+            # keeps the event's totals and no row is read back per ticket.
+            Ticket.objects.filter(pk__in=[ticket_id for ticket_id, _, _ in chunk])._raw_delete(Ticket.objects.db)
+        scan_cache.invalidate_tickets((ticket_id, token) for ticket_id, token, _ in chunk)
+        for _, _, name in chunk:
+            if name:
+                default_storage.delete(name)
+        total += len(chunk)
+
+    EventArchive.objects.filter(pk=archive.pk).update(compacted_at=timezone.now())
+    shield.bump_event(archive.event_id)
+    return total
+
+
+def archive_event(event, now=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Expire (if not swept yet), archive and compact ``event``.
+    Returns ``(EventArchive, rows deleted)``.
+    """
+    now = now or timezone.now()
+    if event.tickets_expired_at is None:
+        expire_event_tickets(event, now, batch_size)
+    archive = EventArchive.objects.filter(event=event).first() or write_archive(event, now, batch_size)
+    return archive, compact(archive, batch_size)
+
+
+def archivable_events(now=None, days=None, events=None):
+    """Events over for ``days`` (default: settings.TICKET_ARCHIVE_AFTER_DAYS) and not yet compacted."""
+    now = now or timezone.now()
+    days = settings.TICKET_ARCHIVE_AFTER_DAYS if days is None else days
+    events = events if events is not None else Event.objects.all()
+    return events.filter(end_at__lt=now - timedelta(days=days)).filter(
+        Q(archive__isnull=True) | Q(archive__compacted_at__isnull=True)
+    ).order_by("end_at")
+
+
+def archive_ended_events(now=None, days=None, events=None, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Archive and compact every archivable event (see archivable_events()).
+    Returns ``(events_archived, rows_deleted)``.
+    """
+    now = now or timezone.now()
+    archived = deleted = 0
+    for event in archivable_events(now, days, events).only("id", "title", "end_at", "tickets_expired_at"):
+        archive, count = archive_event(event, now, batch_size)
+        archived += 1
+        deleted += count
+        if progress:
+            progress(event, archive, count)
+    return archived, deleted
+
+
+# =============================
+# LOOKUP
+# =============================
+def _find(archive, key):
+    needle = key.encode()
+    with gzip.open(archive_file(archive), "rb") as f:
+        for line in f:
+            if needle in line:
+                record = json.loads(line)
+                if key in (record["id"], record["token"]):
+                    return record
+    return None
+
+
+# event id -> (archived_at, BloomFilter) of its archive, per process
+_blooms = {}
+_blooms_lock = threading.Lock()
+
+
+def _bloom_filters(archives):
+    """
+    The Bloom filters of ``archives``, in order. Only filters not cached
+    yet, or of archives rewritten since, are read from the database.
+    """
+    with _blooms_lock:
+        cached = dict(_blooms)
+    stale = [a.pk for a in archives if cached.get(a.pk, (None,))[0] != a.archived_at]
+    if stale:
+        rows = EventArchive.objects.filter(pk__in=stale).values_list("pk", "archived_at", "bloom")
+        for pk, archived_at, bloom in rows.iterator():
+            cached[pk] = (archived_at, shield.BloomFilter.from_bytes(bytes(bloom)))
+        with _blooms_lock:
+            _blooms.update((pk, cached[pk]) for pk in stale if pk in cached)
+    return [cached[a.pk][1] if a.pk in cached else None for a in archives]
+
+
+def lookup(key, event_id=None):
+    """
+    Find an archived ticket by id or token (``key``), optionally only in
+    the archive of ``event_id`` (a UUID). Returns its archived record
+    (EXPORT_FIELDS plus ``event_id``) or None. Archives are only read when
+    their Bloom filter says they may hold the ticket.
+    """
+    try:
+        key = str(uuid.UUID(str(key)))
+    except ValueError:
+        return None
+    archives = EventArchive.objects.only("event_id", "path", "archived_at")
+    if event_id:
+        archives = archives.filter(event_id=event_id)
+    archives = list(archives)
+    for archive, bloom in zip(archives, _bloom_filters(archives)):
+        if bloom is not None and key in bloom:
+            record = _find(archive, key)
+            if record:
+                return {**record, "event_id": str(archive.event_id)}
+    return None
@@ -0,0 +1,133 @@
+# tickets/async_views.py
+"""
+Native async versions of the scan endpoints.
+
+Served without a thread hop when the project runs under ASGI (see
+event_qrproject/asgi.py); under WSGI Django runs them in an event loop
+per request, so they still work but bring no benefit there.
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+
+from . import scan_cache, scan_log, shield
+from .feed import broker
+from .models import Event
+from .validation_views import check_in_response, parse_validation_request, rejection_response, signature_error
+
+SSE_HEARTBEAT_SECONDS = 15
+
+
+@require_GET
+async def validate_ticket(request, token):
+    """Async variant of validation_views.validate_ticket."""
+    rejection = await shield.ascreen(request, token=token)
+    if rejection:
+        scan_log.record(request, rejection.reason)
+        body, code, headers = rejection_response(rejection)
+        return HttpResponse(body["reason"], status=code, headers=headers)
+
+    result, entry = await scan_cache.acheck_in(token=token, gate=scan_log.rollup_gate(request))
+    if entry is None:
+        scan_log.record(request, "not_found")
+        await shield.aremember_rejection("not_found", token=token)
+        raise Http404("Ticket not found.")
+    scan_log.record(request, result.reason, entry.ticket_id, entry.event_id)
+
+    ticket = await scan_cache.abuild_ticket(entry)
+    color = "success" if result.success else "danger" if ticket.status == "used" else "secondary"
+
+    return render(request, "tickets/validate.html", {
+        "ticket": ticket,
+        "message": result.message,
+        "color": color
+    })
+
+
+@csrf_exempt
+@require_POST
+async def validate_ticket_api(request):
+    """Async variant of validation_views.validate_ticket_api (JSON body only)."""
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JsonResponse({"status": "error", "reason": "invalid_payload"}, status=status.HTTP_400_BAD_REQUEST)
+
+    ticket_id, sig, compact, error = parse_validation_request(data)
+    if error:
+        body, code = error
+        scan_log.record(request, body["reason"], data=data)
+        return JsonResponse(body, status=code)
+
+    event_id = data.get("event_id")
+    rejection = await shield.ascreen(request, data, ticket_id=ticket_id, sig=sig, event_id=event_id)
+    if rejection:
+        scan_log.record(request, rejection.reason, ticket_id, event_id, data)
+        body, code, headers = rejection_response(rejection)
+        return JsonResponse(body, status=code, headers=headers)
+
+    try:
+        entry = await scan_cache.aget_ticket_entry(ticket_id=ticket_id)
+    except ValidationError:
+        scan_log.record(request, "invalid_payload", event_id=event_id, data=data)
+        return JsonResponse({"status": "error", "reason": "invalid_payload"}, status=status.HTTP_400_BAD_REQUEST)
+    event = entry and await scan_cache.aget_event(entry.event_id)
+    error = signature_error(ticket_id, sig, entry, event, event_id, compact)
+    if error:
+        body, code = error
+        scan_log.record(request, body["reason"], ticket_id, event_id or (entry and entry.event_id), data)
+        if entry is None or body["reason"] != "not_found":
+            await shield.aremember_rejection(body["reason"], ticket_id=ticket_id, sig=sig)
+        return JsonResponse(body, status=code)
+
+    result, entry = await scan_cache.acheck_in(ticket_id=ticket_id, gate=scan_log.rollup_gate(request, data))
+    scan_log.record(request, result.reason, ticket_id, entry and entry.event_id, data)
+    body, code = check_in_response(ticket_id, result)
+    return JsonResponse(body, status=code)
+
+
+async def _sse_checkins(event_id, after):
+    sub = broker.subscribe(event_id)
+    try:
+        yield "retry: 2000\n\n"
+        last = after
+        pending = broker.recent(event_id, after)
+        while True:
+            for seq, data in pending:
+                if seq > last:
+                    last = seq
+                    yield f"id: {seq}\nevent: checkin\ndata: {json.dumps(data)}\n\n"
+            if sub.dropped:
+                yield "event: dropped\ndata: {}\n\n"
+                return
+            pending = await sub.aget(SSE_HEARTBEAT_SECONDS)
+            if not pending:
+                yield ": keep-alive\n\n"
+    finally:
+        sub.close()
+
+
+@require_GET
+async def checkin_stream(request, event_id):
+    """
+    Server-sent events feed of an event's check-ins. Needs ASGI; WSGI
+    deployments should use the long-poll endpoint (views.CheckInFeedAPI).
+    """
+    if not await Event.objects.filter(pk=event_id).aexists():
+        raise Http404("Event not found.")
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.GET.get("after") or 0)
+    except ValueError:
+        after = 0
+
+    response = StreamingHttpResponse(_sse_checkins(event_id, after), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,56 @@
+# tickets/counters.py
+"""
+EventCounter upkeep outside the check-in paths: counting tickets created
+or deleted through the ORM, and rebuilding counters from scratch.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Event, EventCounter, Ticket
+
+
+def rebuild_counters(events=None):
+    """
+    Recompute EventCounter rows from the tickets table for ``events``
+    (a queryset, default: all events). Returns the number of events rebuilt.
+    """
+    if events is None:
+        events = Event.objects.all()
+
+    count = 0
+    for event_id in events.values_list("id", flat=True).iterator():
+        with transaction.atomic():
+            counts = Ticket.objects.filter(event_id=event_id).aggregate(
+                issued=Count("pk"),
+                used=Count("pk", filter=Q(status=Ticket.STATUS_USED)),
+                expired=Count("pk", filter=Q(status=Ticket.STATUS_EXPIRED)),
+            )
+            EventCounter.objects.update_or_create(event_id=event_id, defaults=counts)
+        count += 1
+    return count
+
+
+@receiver(post_save, sender=Event)
+def _create_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        EventCounter.objects.get_or_create(event=instance)
+
+
+@receiver(post_save, sender=Ticket)
+def _count_issued(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        EventCounter.add(instance.event_id, issued=1)
+
+
+@receiver(post_delete, sender=Ticket)
+def _count_deleted(sender, instance, **kwargs):
+    deltas = {"issued": -1}
+    if instance.status == Ticket.STATUS_USED:
+        deltas["used"] = -1
+    elif instance.status == Ticket.STATUS_EXPIRED:
+        deltas["expired"] = -1
+    EventCounter.objects.filter(event_id=instance.event_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
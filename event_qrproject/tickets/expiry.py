@@ -0,0 +1,66 @@
+# tickets/expiry.py
+"""
+Bulk expiry of tickets whose event has ended.
+
+Scans of an ended event are rejected from the event's end time alone;
+this sweep is what actually moves the remaining active tickets to
+"expired", in chunks of set-based UPDATEs so no transaction holds the
+table for long. Each event is stamped with ``tickets_expired_at`` once
+swept, so scheduled runs (e.g. cron every few minutes) only look at
+events that ended since the previous run. Re-running is harmless.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import scan_cache
+from .models import Event, EventCounter, Ticket
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def expire_event_tickets(event, now=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Expire every active ticket of ``event``, ``chunk_size`` rows per
+    transaction, and stamp the event as swept. Returns the number expired.
+    """
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            chunk = list(
+                Ticket.objects.filter(event=event, status=Ticket.STATUS_ACTIVE)
+                .values_list("id", "token")[:chunk_size]
+            )
+            if not chunk:
+                break
+            updated = Ticket.objects.filter(
+                pk__in=[ticket_id for ticket_id, _ in chunk], status=Ticket.STATUS_ACTIVE
+            ).update(status=Ticket.STATUS_EXPIRED, updated_at=now)
+            EventCounter.add(event.id, expired=updated)
+        scan_cache.invalidate_tickets(chunk)
+        total += updated
+
+    # update() skips post_save, so the cached event is left as is.
+    Event.objects.filter(pk=event.pk).update(tickets_expired_at=now)
+    return total
+
+
+def expire_ended_events(now=None, chunk_size=DEFAULT_CHUNK_SIZE, events=None, resweep=False, progress=None):
+    """
+    Sweep events that have ended: by default only those not swept yet,
+    with ``resweep`` every ended event in ``events`` (a queryset, default:
+    all events). Returns ``(events_swept, tickets_expired)``.
+    """
+    now = now or timezone.now()
+    events = (events if events is not None else Event.objects.all()).filter(end_at__lt=now)
+    if not resweep:
+        events = events.filter(tickets_expired_at__isnull=True)
+
+    swept = expired = 0
+    for event in events.order_by("end_at").only("id", "title", "end_at"):
+        count = expire_event_tickets(event, now, chunk_size)
+        swept += 1
+        expired += count
+        if progress:
+            progress(event, count)
+    return swept, expired
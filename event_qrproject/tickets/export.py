@@ -0,0 +1,56 @@
+# tickets/export.py
+import csv
+import json
+
+from .models import Ticket
+
+EXPORT_FIELDS = ("id", "status", "created_at", "used_at", "token")
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer rows."""
+
+    def write(self, value):
+        return value
+
+
+def _format_value(value):
+    if value is None:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def export_rows(event, status=None, chunk_size=2000, until=None):
+    """
+    Yield one tuple of EXPORT_FIELDS per ticket (created up to ``until``,
+    if given), read with a server-side cursor.
+    """
+    tickets = Ticket.objects.filter(event=event)
+    if status:
+        tickets = tickets.filter(status=status)
+    if until:
+        tickets = tickets.filter(created_at__lte=until)
+    rows = tickets.order_by().values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield tuple(_format_value(value) for value in row)
+
+
+def iter_export(event, fmt="csv", status=None, chunk_size=2000):
+    """Yield the export of ``event``'s tickets as CSV or NDJSON text chunks."""
+    rows = export_rows(event, status=status, chunk_size=chunk_size)
+    if fmt == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(["" if value is None else value for value in row])
+    elif fmt == "ndjson":
+        for row in rows:
+            yield json.dumps(dict(zip(EXPORT_FIELDS, row)), separators=(",", ":")) + "\n"
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
@@ -0,0 +1,127 @@
+# tickets/feed.py
+"""
+In-process pub/sub of check-ins per event, feeding the SSE and long-poll
+endpoints.
+
+Every message gets a per-event sequence number and the last few are kept
+in a ring buffer, so a client reconnecting with ``Last-Event-ID`` (SSE) or
+``?after=`` (long-poll) picks up what it missed. Each subscriber has a
+bounded buffer; one that falls behind is dropped and has to reconnect,
+so a slow dashboard never holds up the scan path that publishes.
+
+The broker is per process: run the feed on the same process as the scan
+endpoints (e.g. one ASGI worker per venue) or only that worker's scans
+are seen.
+"""
+import asyncio
+import itertools
+import threading
+from collections import defaultdict, deque
+
+SUBSCRIBER_BUFFER = 100
+RECENT_MESSAGES = 200
+
+
+class Subscription:
+    def __init__(self, broker, event_id, maxsize):
+        self.broker = broker
+        self.event_id = event_id
+        self.maxsize = maxsize
+        self.dropped = False
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._waiters = set()
+
+    def push(self, message):
+        """Called by the broker; never blocks."""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self.dropped = True
+            else:
+                self._items.append(message)
+            self._cond.notify_all()
+            waiters = list(self._waiters)
+        for loop, wake in waiters:
+            loop.call_soon_threadsafe(wake.set)
+        if self.dropped:
+            self.close()
+
+    def _drain(self):
+        items = list(self._items)
+        self._items.clear()
+        return items
+
+    def get(self, timeout):
+        """Wait up to ``timeout`` seconds and return the pending messages (possibly none)."""
+        with self._cond:
+            if not self._items and not self.dropped:
+                self._cond.wait(timeout)
+            return self._drain()
+
+    async def aget(self, timeout):
+        """Async variant of get()."""
+        wake = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wake)
+        with self._cond:
+            if self._items or self.dropped:
+                return self._drain()
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._cond:
+            self._waiters.discard(waiter)
+            return self._drain()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self, subscriber_buffer=SUBSCRIBER_BUFFER, recent=RECENT_MESSAGES):
+        self.subscriber_buffer = subscriber_buffer
+        self._subscribers = defaultdict(set)
+        self._recent = defaultdict(lambda: deque(maxlen=recent))
+        self._seq = defaultdict(itertools.count)
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_id):
+        sub = Subscription(self, str(event_id), self.subscriber_buffer)
+        with self._lock:
+            self._subscribers[sub.event_id].add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.event_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.event_id]
+
+    def publish(self, event_id, data):
+        """Fan ``data`` (a JSON-serializable dict) out to the event's subscribers."""
+        event_id = str(event_id)
+        with self._lock:
+            message = (next(self._seq[event_id]) + 1, data)
+            self._recent[event_id].append(message)
+            subs = list(self._subscribers.get(event_id, ()))
+        for sub in subs:
+            sub.push(message)
+
+    def recent(self, event_id, after=0):
+        """Buffered messages for ``event_id`` with a sequence number above ``after``."""
+        with self._lock:
+            return [m for m in self._recent.get(str(event_id), ()) if m[0] > after]
+
+
+broker = Broker()
+
+
+def publish_check_in(event_id, ticket_id, used_at, source):
+    broker.publish(event_id, {
+        "ticket_id": str(ticket_id),
+        "used_at": used_at.isoformat() if used_at else None,
+        "source": source,
+    })
@@ -0,0 +1,177 @@
+# tickets/issuance.py
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import shield
+from .models import EventCounter, IssueJob, Ticket
+from .qr import render_ticket
+from .utils import build_qr_content, get_qr_renderer
+
+DEFAULT_CHUNK_SIZE = 1000
+
+logger = logging.getLogger("tickets.issuance")
+
+
+def issue_tickets(event, count, chunk_size=DEFAULT_CHUNK_SIZE, render_qr=True, workers=None, progress=None, pool=None):
+    """
+    Create ``count`` tickets for ``event`` using chunked ``bulk_create``,
+    rendering each chunk's QR images in a process pool (``pool``, or one
+    of ``workers`` processes started for the call) as soon as it is
+    inserted, so only one chunk of tickets is held at a time.
+
+    ``progress`` is an optional callable ``(stage, done, total)`` where
+    stage is "created" or "rendered".
+    Returns the number of tickets created.
+    """
+    if render_qr and pool is None:
+        with _new_pool(workers) as pool:
+            return issue_tickets(event, count, chunk_size, progress=progress, pool=pool)
+
+    renderer = get_qr_renderer() if render_qr else None
+    done = rendered = 0
+    while done < count:
+        batch = [Ticket.new_signed(event) for _ in range(min(chunk_size, count - done))]
+        with transaction.atomic():
+            Ticket.objects.bulk_create(batch, batch_size=chunk_size)
+            EventCounter.add(event.id, issued=len(batch))
+        shield.add_tickets(event.id, [(ticket.id, ticket.token) for ticket in batch])
+        done += len(batch)
+        if progress:
+            progress("created", done, count)
+
+        if render_qr:
+            rendered += render_qr_images(batch, chunk_size=chunk_size, renderer=renderer, pool=pool)
+            if progress:
+                progress("rendered", rendered, count)
+    return done
+
+
+def _new_pool(workers=None):
+    # "spawn" keeps the pool safe to start from a request thread.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def render_qr_images(tickets, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, progress=None, renderer=None, pool=None):
+    """
+    Render and store QR images for ``tickets`` in a process pool, writing
+    ``qr_image`` back with ``bulk_update`` once per chunk.
+    ``renderer`` defaults to the one configured in settings; ``pool``
+    defaults to a pool of ``workers`` processes started for the call.
+    """
+    if pool is None:
+        with _new_pool(workers) as pool:
+            return render_qr_images(tickets, chunk_size, progress=progress, renderer=renderer, pool=pool)
+
+    renderer = renderer or get_qr_renderer()
+    by_id = {str(t.id): t for t in tickets}
+    items = [(ticket_id, build_qr_content(t.id, t.token, t.event)) for ticket_id, t in by_id.items()]
+    total = len(items)
+    pending = []
+    done = 0
+
+    for ticket_id, image in pool.map(partial(render_ticket, renderer), items, chunksize=64):
+        ticket = by_id[ticket_id]
+        ticket.qr_image = default_storage.save(
+            ticket.qr_image.field.generate_filename(ticket, f"ticket_{ticket_id}.{renderer.extension}"),
+            ContentFile(image),
+        )
+        pending.append(ticket)
+        if len(pending) >= chunk_size:
+            Ticket.objects.bulk_update(pending, ["qr_image"])
+            done += len(pending)
+            pending = []
+            if progress:
+                progress("rendered", done, total)
+
+    if pending:
+        Ticket.objects.bulk_update(pending, ["qr_image"])
+        done += len(pending)
+        if progress:
+            progress("rendered", done, total)
+    return done
+
+
+# =============================
+# BACKGROUND JOBS
+# =============================
+# Per process: the threads running jobs and the render processes they share.
+_runner = None
+_render_pool = None
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def _pools():
+    global _runner, _render_pool, _pools_pid
+    with _pools_lock:
+        # Executors don't survive fork; start fresh ones in a forked worker.
+        if _pools_pid != os.getpid():
+            _runner = ThreadPoolExecutor(max_workers=settings.TICKET_ISSUE_JOBS, thread_name_prefix="issue")
+            _render_pool = None
+            _pools_pid = os.getpid()
+        if _render_pool is None:
+            _render_pool = _new_pool(settings.TICKET_ISSUE_WORKERS)
+        return _runner, _render_pool
+
+
+def _discard_render_pool(pool):
+    global _render_pool
+    with _pools_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_job(job_id):
+    job = IssueJob.objects.filter(pk=job_id).first()
+    return job.as_dict() if job else None
+
+
+def run_issue_job(job_id, event, count, render_qr=True, chunk_size=DEFAULT_CHUNK_SIZE, pool=None):
+    """Run the IssueJob ``job_id``, recording its progress and outcome on the row."""
+    jobs = IssueJob.objects.filter(pk=job_id)
+
+    def update(stage, done, total):
+        jobs.update(**{stage: done}, updated_at=timezone.now())
+
+    try:
+        jobs.update(state="running", updated_at=timezone.now())
+        issue_tickets(event, count, chunk_size=chunk_size, render_qr=render_qr, progress=update, pool=pool)
+        state, error = "done", None
+    except Exception as e:
+        logger.exception("Issue job %s failed", job_id)
+        if isinstance(e, BrokenProcessPool) and pool is not None:
+            _discard_render_pool(pool)
+        state, error = "failed", str(e)
+    jobs.update(state=state, error=error, updated_at=timezone.now())
+
+
+def start_issue_job(event, count, render_qr=True, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Queue ``issue_tickets`` on this process's job threads and return a job
+    id whose progress can be read with ``get_job`` from any process.
+    """
+    IssueJob.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=settings.TICKET_ISSUE_JOB_TTL)).delete()
+    job = IssueJob.objects.create(event=event, count=count)
+    runner, pool = _pools()
+
+    def run():
+        try:
+            run_issue_job(job.id, event, count, render_qr=render_qr, chunk_size=chunk_size, pool=pool)
+        finally:
+            connection.close()
+
+    runner.submit(run)
+    return str(job.id)
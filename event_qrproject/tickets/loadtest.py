@@ -0,0 +1,273 @@
+# tickets/loadtest.py
+"""
+Load-test harness for the issuance and scan paths.
+
+Seeds a throwaway event with tickets, then drives each workload from a pool
+of worker threads:
+
+    register         POST api/register/
+    scan_html        GET  validate/<token>/
+    scan_api         POST api/validate/
+    scan_html_async  GET  async/validate/<token>/
+    scan_api_async   POST api/async/validate/
+
+Requests go either through Django's test client in this process (which also
+counts queries per request) or over HTTP to a running server sharing this
+database (``base_url``). The seeded tickets are split between the scan
+workloads and each is scanned ``duplicates`` times from different workers;
+any ticket accepted more than once is reported as an anomaly.
+"""
+import json
+import platform
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .issuance import issue_tickets
+from .models import Event, EventCounter, Ticket
+from .utils import build_payload, make_signature
+
+WORKLOADS = ("register", "scan_html", "scan_api", "scan_html_async", "scan_api_async")
+SCAN_WORKLOADS = WORKLOADS[1:]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values))), 1)
+    return sorted_values[rank - 1]
+
+
+# =============================
+# TRANSPORTS
+# =============================
+class LocalTransport:
+    """Runs requests through the test client and counts their queries."""
+
+    def __init__(self):
+        hosts = [h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")]
+        self.host = hosts[0] if hosts else "localhost"
+        self._local = threading.local()
+        self._workers = iter(range(1, 1 << 16))
+
+    def request(self, method, path, data=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            # One address per worker, as if each were a separate scanner.
+            n = next(self._workers)
+            client = self._local.client = Client(HTTP_HOST=self.host, REMOTE_ADDR=f"10.0.{n >> 8}.{n & 255}")
+        with CaptureQueriesContext(connection) as queries:
+            if method == "POST":
+                response = client.post(path, data, content_type="application/json")
+            else:
+                response = client.get(path)
+        return response.status_code, response.content, len(queries.captured_queries)
+
+    def close(self):
+        connection.close()
+
+
+class HTTPTransport:
+    """Sends requests to a running server; query counts are not available."""
+
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, data=None):
+        body = json.dumps(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        if body is not None:
+            req.add_header("Content-Type", "application/json")
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, resp.read(), None
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), None
+
+    def close(self):
+        pass
+
+
+# =============================
+# WORKLOADS
+# =============================
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def _register_jobs(event, count):
+    path = reverse("api_register_ticket")
+    return [("POST", path, {"event_id": str(event.id)}, None) for _ in range(count)]
+
+
+def _scan_jobs(workload, event, tickets, duplicates):
+    jobs = []
+    for ticket_id, token in tickets:
+        if workload in ("scan_html", "scan_html_async"):
+            name = "validate_ticket" if workload == "scan_html" else "validate_ticket_async"
+            job = ("GET", reverse(name, args=[token]), None, ticket_id)
+        else:
+            name = "api_validate_ticket" if workload == "scan_api" else "api_validate_ticket_async"
+            payload = build_payload(str(ticket_id), make_signature(ticket_id, event))
+            job = ("POST", reverse(name), {"payload": payload}, ticket_id)
+        jobs.extend([job] * duplicates)
+    return jobs
+
+
+def _accepted(workload, status_code, body):
+    if workload == "register":
+        return status_code == 201
+    if workload.startswith("scan_html"):
+        return status_code == 200 and b"alert-success" in body
+    return status_code == 200
+
+
+def _expected(workload, status_code):
+    """Responses a healthy server may give; anything else counts as an error."""
+    if workload == "register":
+        return status_code == 201
+    if workload.startswith("scan_html"):
+        return status_code == 200
+    return status_code in (200, 409)
+
+
+def run_workload(workload, jobs, transport, concurrency):
+    """Run ``jobs`` from ``concurrency`` threads; returns (stats, accepted ticket ids)."""
+    random.shuffle(jobs)
+    lock = threading.Lock()
+    latencies, queries, accepted = [], [], []
+    statuses = Counter()
+    errors = 0
+    position = iter(range(len(jobs)))
+
+    def worker():
+        nonlocal errors
+        mine_latency, mine_queries, mine_accepted, mine_status, mine_errors = [], [], [], Counter(), 0
+        try:
+            while True:
+                with lock:
+                    i = next(position, None)
+                if i is None:
+                    break
+                method, path, data, ticket_id = jobs[i]
+                start = time.perf_counter()
+                try:
+                    status_code, body, query_count = transport.request(method, path, data)
+                except Exception:
+                    mine_errors += 1
+                    mine_status["exception"] += 1
+                    continue
+                mine_latency.append(time.perf_counter() - start)
+                mine_status[str(status_code)] += 1
+                if query_count is not None:
+                    mine_queries.append(query_count)
+                if not _expected(workload, status_code):
+                    mine_errors += 1
+                if ticket_id is not None and _accepted(workload, status_code, body):
+                    mine_accepted.append(ticket_id)
+        finally:
+            transport.close()
+        with lock:
+            latencies.extend(mine_latency)
+            queries.extend(mine_queries)
+            accepted.extend(mine_accepted)
+            statuses.update(mine_status)
+            errors += mine_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    stats = {
+        "requests": len(jobs),
+        "errors": errors,
+        "statuses": dict(statuses),
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p95_ms": _ms(percentile(latencies, 95)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+        "max_ms": _ms(latencies[-1] if latencies else None),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        "max_queries": max(queries) if queries else None,
+    }
+    return stats, accepted
+
+
+def run(tickets=1000, register=200, workloads=("register", "scan_html", "scan_api"),
+        concurrency=8, duplicates=2, base_url=None, keep=False, progress=None):
+    """
+    Seed an event, run ``workloads`` and return the JSON-serializable report.
+    The event and its tickets are deleted afterwards unless ``keep``.
+    """
+    transport = HTTPTransport(base_url) if base_url else LocalTransport()
+    now = timezone.now()
+    event = Event.objects.create(title="loadtest", start_at=now, end_at=now + timedelta(days=1))
+    report = {
+        "meta": {
+            "started_at": now.isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "db_profile": getattr(settings, "DB_PROFILE", None),
+            "db_vendor": connection.vendor,
+            "target": base_url or "in-process",
+            "concurrency": concurrency,
+            "tickets": tickets,
+            "duplicates": duplicates,
+        },
+        "workloads": {},
+        "anomalies": {},
+    }
+    try:
+        scans = [w for w in workloads if w in SCAN_WORKLOADS]
+        if scans:
+            issue_tickets(event, tickets, render_qr=False)
+        seeded = list(Ticket.objects.filter(event=event).values_list("id", "token"))
+        accepted = defaultdict(int)
+
+        for workload in workloads:
+            if workload == "register":
+                jobs = _register_jobs(event, register)
+            else:
+                share = seeded[scans.index(workload)::len(scans)]
+                jobs = _scan_jobs(workload, event, share, duplicates)
+            if progress:
+                progress(workload, len(jobs))
+            stats, ids = run_workload(workload, jobs, transport, concurrency)
+            report["workloads"][workload] = stats
+            for ticket_id in ids:
+                accepted[ticket_id] += 1
+
+        scanned = {ticket_id for ticket_id, _ in seeded} if scans else set()
+        counter = EventCounter.objects.filter(event=event).values("issued", "used").first() or {}
+        used = Ticket.objects.filter(event=event, status=Ticket.STATUS_USED).count()
+        report["anomalies"] = {
+            "double_validated": sum(1 for n in accepted.values() if n > 1),
+            "never_validated": len(scanned - set(accepted)),
+            "accepted_but_not_used": max(len(accepted) - used, 0),
+            "counter_used_mismatch": counter.get("used", 0) - used,
+            "counter_issued_mismatch": counter.get("issued", 0) - Ticket.objects.filter(event=event).count(),
+        }
+    finally:
+        if not keep:
+            event.delete()
+    return report
@@ -0,0 +1,49 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.archive import DEFAULT_BATCH_SIZE, archivable_events, archive_ended_events
+from tickets.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the tickets of events that ended more than --days ago into "
+        "compressed per-event archives, then delete their live rows and QR "
+        "files in batches. Safe to re-run; look tickets up afterwards with "
+        "lookup_archived_ticket."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Days since the event ended (default: TICKET_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument("--event", dest="event_ids", action="append", help="Only this event; repeatable.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Tickets per DELETE.")
+        parser.add_argument("--dry-run", action="store_true", help="List the events that would be archived.")
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options["event_ids"]:
+            try:
+                events = events.filter(id__in=options["event_ids"])
+                missing = len(set(options["event_ids"])) - events.count()
+            except ValidationError:
+                raise CommandError("--event must be an event UUID.")
+            if missing:
+                raise CommandError(f"{missing} of the given events do not exist.")
+        if options["days"] is not None and options["days"] < 0:
+            raise CommandError("--days must not be negative.")
+
+        if options["dry_run"]:
+            for event in archivable_events(days=options["days"], events=events):
+                self.stdout.write(f"{event.title} ({event.id}), ended {event.end_at:%Y-%m-%d}")
+            return
+
+        def progress(event, archive, count):
+            self.stdout.write(
+                f"{event.title} ({event.id}): {archive.tickets} archived "
+                f"({archive.used} used, {archive.expired} expired), {count} rows deleted"
+            )
+
+        archived, deleted = archive_ended_events(
+            days=options["days"], events=events, batch_size=options["batch_size"], progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} events, deleted {deleted} ticket rows."))
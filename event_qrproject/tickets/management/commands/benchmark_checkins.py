@@ -0,0 +1,124 @@
+import json
+import statistics
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from tickets.issuance import issue_tickets
+from tickets.models import Event, Ticket
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure check-in throughput of the configured database (DB_PROFILE) "
+        "with concurrent writer threads, optionally alongside readers. "
+        "Runs against a throwaway event that is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=2000, help="Tickets to check in.")
+        parser.add_argument("--writers", type=int, default=8, help="Concurrent check-in threads.")
+        parser.add_argument("--readers", type=int, default=0, help="Threads reading ticket status meanwhile.")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark event and its tickets.")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+
+    def handle(self, *args, **options):
+        if options["tickets"] < 1 or options["writers"] < 1:
+            raise CommandError("--tickets and --writers must be at least 1.")
+
+        now = timezone.now()
+        event = Event.objects.create(
+            title="benchmark_checkins", start_at=now, end_at=now + timedelta(days=1)
+        )
+        try:
+            issue_tickets(event, options["tickets"], render_qr=False)
+            ids = list(Ticket.objects.filter(event=event).values_list("id", flat=True))
+            result = self._run(ids, options["writers"], options["readers"])
+        finally:
+            if not options["keep"]:
+                event.delete()
+
+        result = {
+            "profile": getattr(settings, "DB_PROFILE", None),
+            "vendor": connection.vendor,
+            "tickets": len(ids),
+            "writers": options["writers"],
+            "readers": options["readers"],
+            **result,
+        }
+        if options["json"]:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.stdout.write(
+            f"{result['profile']} ({result['vendor']}), {result['writers']} writers, {result['readers']} readers: "
+            f"{result['checkins_per_sec']:.1f} check-ins/s, p50 {result['p50_ms']:.2f} ms, "
+            f"p95 {result['p95_ms']:.2f} ms, {result['errors']} errors"
+            + (f", {result['reads_per_sec']:.1f} reads/s" if result["readers"] else "")
+        )
+
+    def _run(self, ids, writers, readers):
+        latencies = []
+        errors = []
+        reads = []
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def write(chunk):
+            mine, failed = [], 0
+            try:
+                for ticket_id in chunk:
+                    start = time.perf_counter()
+                    try:
+                        ok = Ticket.check_in(pk=ticket_id).success
+                    except OperationalError:
+                        ok = False
+                    mine.append(time.perf_counter() - start)
+                    failed += not ok
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(mine)
+                errors.append(failed)
+
+        def read():
+            count = 0
+            try:
+                while not done.is_set():
+                    for ticket_id in ids[count % len(ids):][:50]:
+                        Ticket.objects.filter(pk=ticket_id).values_list("status", flat=True).first()
+                        count += 1
+            except OperationalError:
+                pass
+            finally:
+                connection.close()
+            with lock:
+                reads.append(count)
+
+        chunks = [ids[i::writers] for i in range(writers)]
+        write_threads = [threading.Thread(target=write, args=(chunk,)) for chunk in chunks]
+        read_threads = [threading.Thread(target=read) for _ in range(readers)]
+
+        start = time.perf_counter()
+        for t in read_threads + write_threads:
+            t.start()
+        for t in write_threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        for t in read_threads:
+            t.join()
+
+        latencies.sort()
+        return {
+            "errors": sum(errors),
+            "seconds": round(elapsed, 3),
+            "checkins_per_sec": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 3),
+            "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+            "reads_per_sec": round(sum(reads) / elapsed, 1) if readers else None,
+        }
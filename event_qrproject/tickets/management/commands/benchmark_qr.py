@@ -0,0 +1,54 @@
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from tickets.qr import RENDERERS, make_renderer
+from tickets.utils import build_ticket_qr_url
+
+
+class Command(BaseCommand):
+    help = "Time each QR renderer backend on ticket-sized payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=200, help="Renders per backend.")
+        parser.add_argument(
+            "--backend", action="append", choices=sorted(RENDERERS),
+            help="Backend to benchmark; repeatable. Defaults to the local backends (png, svg).",
+        )
+        parser.add_argument("--box-size", type=int, default=10)
+        parser.add_argument("--error-correction", choices=["L", "M", "Q", "H"], default="M")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+
+    def handle(self, *args, **options):
+        payloads = [build_ticket_qr_url(uuid.uuid4()) for _ in range(options["count"])]
+        results = []
+        for backend in options["backend"] or ["png", "svg"]:
+            if backend == "http":
+                renderer = make_renderer(backend)
+            else:
+                renderer = make_renderer(
+                    backend, box_size=options["box_size"], error_correction=options["error_correction"]
+                )
+            total_bytes = 0
+            start = time.perf_counter()
+            for payload in payloads:
+                total_bytes += len(renderer.render(payload))
+            elapsed = time.perf_counter() - start
+            results.append({
+                "backend": backend,
+                "count": len(payloads),
+                "ms_per_render": round(elapsed * 1000 / len(payloads), 3),
+                "renders_per_sec": round(len(payloads) / elapsed, 1),
+                "avg_bytes": total_bytes // len(payloads),
+            })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for r in results:
+            self.stdout.write(
+                f"{r['backend']:>5}: {r['ms_per_render']:8.3f} ms/render  "
+                f"{r['renders_per_sec']:8.1f} renders/s  {r['avg_bytes']:7d} bytes avg"
+            )
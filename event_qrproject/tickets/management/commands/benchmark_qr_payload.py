@@ -0,0 +1,62 @@
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from tickets.payload import encode_compact, parse_payload
+from tickets.qr import qr_version, render_png
+from tickets.utils import build_payload, build_ticket_qr_url, make_signature
+
+
+class Command(BaseCommand):
+    help = "Compare QR payload formats: length, QR version, PNG size, render and parse time."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=200, help="Payloads per format.")
+        parser.add_argument("--box-size", type=int, default=10)
+        parser.add_argument("--error-correction", choices=["L", "M", "Q", "H"], default="M")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+
+    def handle(self, *args, **options):
+        ids = [uuid.uuid4() for _ in range(options["count"])]
+        formats = {
+            "url": [build_ticket_qr_url(uuid.uuid4()) for _ in ids],
+            "legacy": [build_payload(str(i), make_signature(i)) for i in ids],
+            "compact": [encode_compact(i, make_signature(i)) for i in ids],
+        }
+
+        results = []
+        for name, payloads in formats.items():
+            total_bytes = 0
+            start = time.perf_counter()
+            for payload in payloads:
+                total_bytes += len(render_png(payload, box_size=options["box_size"],
+                                              error_correction=options["error_correction"]))
+            render_elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if name != "url":
+                for payload in payloads:
+                    parse_payload(payload)
+            parse_elapsed = time.perf_counter() - start
+
+            results.append({
+                "format": name,
+                "count": len(payloads),
+                "chars": max(len(p) for p in payloads),
+                "qr_version": max(qr_version(p, options["error_correction"]) for p in payloads),
+                "avg_png_bytes": total_bytes // len(payloads),
+                "ms_per_render": round(render_elapsed * 1000 / len(payloads), 3),
+                "us_per_parse": round(parse_elapsed * 1e6 / len(payloads), 2) if name != "url" else None,
+            })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for r in results:
+            parse = f"{r['us_per_parse']:7.2f} us/parse" if r["us_per_parse"] is not None else ""
+            self.stdout.write(
+                f"{r['format']:>7}: {r['chars']:4d} chars  v{r['qr_version']:<3d} "
+                f"{r['avg_png_bytes']:6d} bytes avg  {r['ms_per_render']:7.3f} ms/render  {parse}"
+            )
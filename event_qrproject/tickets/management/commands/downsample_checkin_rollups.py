@@ -0,0 +1,41 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.models import Event
+from tickets.rollups import downsamplable_events, downsample_ended_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold the per-minute check-in rollup of events that ended more than "
+        "--days ago into hourly rows. Safe to re-run, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Days since the event ended (default: TICKET_ROLLUP_MINUTE_DAYS).")
+        parser.add_argument("--event", dest="event_ids", action="append", help="Only this event; repeatable.")
+        parser.add_argument("--dry-run", action="store_true", help="List the events that would be downsampled.")
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options["event_ids"]:
+            try:
+                events = events.filter(id__in=options["event_ids"])
+                missing = len(set(options["event_ids"])) - events.count()
+            except ValidationError:
+                raise CommandError("--event must be an event UUID.")
+            if missing:
+                raise CommandError(f"{missing} of the given events do not exist.")
+        if options["days"] is not None and options["days"] < 0:
+            raise CommandError("--days must not be negative.")
+
+        if options["dry_run"]:
+            for event in downsamplable_events(days=options["days"], events=events):
+                self.stdout.write(f"{event.title} ({event.id}), ended {event.end_at:%Y-%m-%d}")
+            return
+
+        def progress(event, count):
+            self.stdout.write(f"{event.title} ({event.id}): {count} minute rows folded")
+
+        done, folded = downsample_ended_events(days=options["days"], events=events, progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Downsampled {done} events, folded {folded} minute rows."))
@@ -0,0 +1,36 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.expiry import DEFAULT_CHUNK_SIZE, expire_ended_events
+from tickets.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Expire the active tickets of events that have ended. Only events not "
+        "swept before are visited, so it is cheap to run from cron every few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--event", dest="event_ids", action="append", help="Only this event; repeatable.")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Tickets per UPDATE.")
+        parser.add_argument("--resweep", action="store_true", help="Also visit events that were already swept.")
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options["event_ids"]:
+            try:
+                events = events.filter(id__in=options["event_ids"])
+                missing = len(set(options["event_ids"])) - events.count()
+            except ValidationError:
+                raise CommandError("--event must be an event UUID.")
+            if missing:
+                raise CommandError(f"{missing} of the given events do not exist.")
+
+        def progress(event, count):
+            self.stdout.write(f"{event.title} ({event.id}): {count} expired")
+
+        swept, expired = expire_ended_events(
+            chunk_size=options["chunk_size"], events=events, resweep=options["resweep"], progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(f"Swept {swept} events, expired {expired} tickets."))
@@ -0,0 +1,30 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.export import EXPORT_FORMATS, iter_export
+from tickets.models import Event
+
+
+class Command(BaseCommand):
+    help = "Stream every ticket of an event to a CSV or NDJSON file (or stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_id")
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+        parser.add_argument("--status", help="Only export tickets with this status.")
+        parser.add_argument("--output", "-o", help="Output file (default: stdout).")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(id=options["event_id"])
+        except (Event.DoesNotExist, ValidationError):
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+
+        chunks = iter_export(event, options["format"], status=options["status"], chunk_size=options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as out:
+                out.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
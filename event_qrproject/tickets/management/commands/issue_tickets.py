@@ -0,0 +1,37 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.issuance import DEFAULT_CHUNK_SIZE, issue_tickets
+from tickets.models import Event
+
+
+class Command(BaseCommand):
+    help = "Bulk-issue tickets for an event, rendering QR codes in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_id")
+        parser.add_argument("count", type=int)
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--workers", type=int, default=None, help="QR render processes (default: CPU count).")
+        parser.add_argument("--no-qr", action="store_true", help="Create the rows only, skip QR rendering.")
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(id=options["event_id"])
+        except (Event.DoesNotExist, ValidationError):
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+        if options["count"] < 1:
+            raise CommandError("count must be at least 1.")
+
+        def progress(stage, done, total):
+            self.stdout.write(f"{stage}: {done}/{total}")
+
+        created = issue_tickets(
+            event,
+            options["count"],
+            chunk_size=options["chunk_size"],
+            render_qr=not options["no_qr"],
+            workers=options["workers"],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Issued {created} tickets for '{event.title}'."))
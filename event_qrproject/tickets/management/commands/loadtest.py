@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.loadtest import WORKLOADS, run
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test registration and scanning against a throwaway event, in-process "
+        "or against a running server (--url) sharing this database. Reports "
+        "latency percentiles, throughput, queries per request and double validations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=1000, help="Tickets seeded for the scan workloads.")
+        parser.add_argument("--register", type=int, default=200, help="Requests for the register workload.")
+        parser.add_argument(
+            "--workload", action="append", choices=WORKLOADS,
+            help="Workload to run; repeatable. Defaults to register, scan_html and scan_api.",
+        )
+        parser.add_argument("--concurrency", type=int, default=8, help="Worker threads per workload.")
+        parser.add_argument("--duplicates", type=int, default=2, help="Times each seeded ticket is scanned.")
+        parser.add_argument("--url", help="Base URL of a running server, e.g. http://127.0.0.1:8000.")
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded event and tickets.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1 or options["duplicates"] < 1 or options["tickets"] < 1:
+            raise CommandError("--tickets, --concurrency and --duplicates must be at least 1.")
+
+        def progress(workload, requests):
+            if not options["json"]:
+                self.stdout.write(f"{workload}: {requests} requests")
+
+        report = run(
+            tickets=options["tickets"],
+            register=options["register"],
+            workloads=options["workload"] or ["register", "scan_html", "scan_api"],
+            concurrency=options["concurrency"],
+            duplicates=options["duplicates"],
+            base_url=options["url"],
+            keep=options["keep"],
+            progress=progress,
+        )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for name, r in report["workloads"].items():
+            queries = f"  {r['queries_per_request']:.1f} queries/req" if r["queries_per_request"] is not None else ""
+            self.stdout.write(
+                f"{name:>16}: {r['requests_per_sec']:8.1f} req/s  p50 {r['p50_ms']:7.2f}  p95 {r['p95_ms']:7.2f}  "
+                f"p99 {r['p99_ms']:7.2f} ms  {r['errors']} errors{queries}"
+            )
+        anomalies = {k: v for k, v in report["anomalies"].items() if v}
+        if anomalies:
+            self.stdout.write(self.style.ERROR(f"Anomalies: {anomalies}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No anomalies."))
@@ -0,0 +1,26 @@
+import json
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.archive import lookup
+
+
+class Command(BaseCommand):
+    help = "Look up an archived ticket by id or token and print its final state as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("key", help="Ticket id or token.")
+        parser.add_argument("--event", help="Only search this event's archive.")
+
+    def handle(self, *args, **options):
+        event_id = options["event"]
+        if event_id:
+            try:
+                event_id = uuid.UUID(event_id)
+            except ValueError:
+                raise CommandError("--event must be an event UUID.")
+        record = lookup(options["key"], event_id=event_id)
+        if record is None:
+            raise CommandError(f"No archived ticket {options['key']}.")
+        self.stdout.write(json.dumps(record, indent=2))
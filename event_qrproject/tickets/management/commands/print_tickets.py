@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.models import Event
+from tickets.print_export import DEFAULT_CHUNK_SIZE, PAGE_SIZES, PRINT_FORMATS, iter_qr_pdf, iter_qr_zip
+
+
+class Command(BaseCommand):
+    help = (
+        "Write an event's QR codes for printing: a ZIP of one image per ticket, "
+        "or a PDF of multi-up sheets with each ticket's id under its code. "
+        "Images missing from storage are rendered in a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_id")
+        parser.add_argument("--format", choices=sorted(PRINT_FORMATS), default="pdf")
+        parser.add_argument("--output", "-o", required=True, help="Output file.")
+        parser.add_argument("--status", help="Only include tickets with this status.")
+        parser.add_argument("--workers", type=int, default=settings.TICKET_PRINT_WORKERS,
+                            help="Rendering processes (default: one per CPU).")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--page-size", choices=sorted(PAGE_SIZES), default="a4")
+        parser.add_argument("--columns", type=int, default=4, help="Codes per row (PDF).")
+        parser.add_argument("--rows", type=int, default=6, help="Rows per page (PDF).")
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(id=options["event_id"])
+        except (Event.DoesNotExist, ValidationError):
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+        if options["columns"] < 1 or options["rows"] < 1:
+            raise CommandError("--columns and --rows must be at least 1.")
+
+        def progress(done):
+            self.stderr.write(f"\r{done} tickets", ending="")
+
+        common = dict(status=options["status"], chunk_size=options["chunk_size"],
+                      workers=options["workers"], progress=progress)
+        if options["format"] == "zip":
+            chunks = iter_qr_zip(event, **common)
+        else:
+            chunks = iter_qr_pdf(event, page_size=options["page_size"], columns=options["columns"],
+                                 rows=options["rows"], **common)
+
+        size = 0
+        with open(options["output"], "wb") as out:
+            for chunk in chunks:
+                out.write(chunk)
+                size += len(chunk)
+        self.stderr.write("")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']} ({size} bytes)."))
@@ -0,0 +1,35 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.models import Event
+from tickets.rollups import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-minute check-in rollup of events from their tickets' "
+        "used_at. With --from-scan-log, check-ins still in the scan log are "
+        "counted per gate. Archived events are skipped: their tickets are gone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_ids", nargs="*", help="Events to rebuild (default: all).")
+        parser.add_argument("--from-scan-log", action="store_true", help="Take gates from logged scans where available.")
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options["event_ids"]:
+            try:
+                events = events.filter(id__in=options["event_ids"])
+                missing = len(set(options["event_ids"])) - events.count()
+            except ValidationError:
+                raise CommandError("Event ids must be UUIDs.")
+            if missing:
+                raise CommandError(f"{missing} of the given events do not exist.")
+
+        rebuilt = 0
+        for event in events.filter(archive__isnull=True).only("id", "title").order_by("start_at"):
+            count = rebuild_rollup(event, from_scan_log=options["from_scan_log"])
+            self.stdout.write(f"{event.title} ({event.id}): {count} check-ins")
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt check-in rollups for {rebuilt} event(s)."))
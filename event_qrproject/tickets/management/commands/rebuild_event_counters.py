@@ -0,0 +1,25 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.counters import rebuild_counters
+from tickets.models import Event
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-event issued/used/expired counters from the tickets table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_ids", nargs="*", help="Events to rebuild (default: all).")
+
+    def handle(self, *args, **options):
+        events = Event.objects.all()
+        if options["event_ids"]:
+            try:
+                events = events.filter(id__in=options["event_ids"])
+                missing = len(set(options["event_ids"])) - events.count()
+            except ValidationError:
+                raise CommandError("Event ids must be UUIDs.")
+            if missing:
+                raise CommandError(f"{missing} of the given events do not exist.")
+        count = rebuild_counters(events)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters for {count} event(s)."))
@@ -0,0 +1,24 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.models import Event
+from tickets.scan_cache import warm_event
+
+
+class Command(BaseCommand):
+    help = (
+        "Preload an event's tickets into the scan cache. Only useful when the "
+        "\"tickets\" cache is shared between processes (e.g. FileBasedCache)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_id")
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(id=options["event_id"])
+        except (Event.DoesNotExist, ValidationError):
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+
+        count = warm_event(event)
+        self.stdout.write(self.style.SUCCESS(f"Cached {count} tickets for '{event.title}'."))
@@ -0,0 +1,254 @@
+# tickets/metrics.py
+"""
+In-process metrics registry with Prometheus text exposition.
+
+For every request, MetricsMiddleware records into per-view histograms:
+
+* total latency;
+* DB query count and time, via an execute wrapper installed on every
+  database connection;
+* template render time, via the InstrumentedDjangoTemplates backend;
+* QR encode time, for code wrapped in ``timed("qr")``.
+
+Values are kept per process, so scrape every worker (or run one worker per
+scan node) and aggregate in Prometheus.
+"""
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+# =============================
+# METRIC TYPES
+# =============================
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, labelnames, labelvalues, value in self.samples():
+            lines.append(f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class CounterMetric(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield self.name, self.labelnames, key, value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(counts), total, count) for key, (counts, total, count) in self._series.items())
+        names = self.labelnames + ("le",)
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", names, key + (_format_value(bound),), cumulative
+            yield f"{self.name}_sum", self.labelnames, key, total
+            yield f"{self.name}_count", self.labelnames, key, count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_class(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(CounterMetric, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """The registry in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() + "\n" for metric in metrics)
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    "tickets_http_requests_total", "Requests handled, by view, method and status.", ("view", "method", "status")
+)
+REQUEST_SECONDS = registry.histogram(
+    "tickets_http_request_duration_seconds", "Total request latency.", ("view", "method")
+)
+DB_QUERIES = registry.histogram(
+    "tickets_http_request_db_queries", "Database queries per request.", ("view",), buckets=QUERY_BUCKETS
+)
+DB_SECONDS = registry.histogram(
+    "tickets_http_request_db_seconds", "Time spent in database queries per request.", ("view",)
+)
+TEMPLATE_SECONDS = registry.histogram(
+    "tickets_http_request_template_seconds", "Template render time per request.", ("view",)
+)
+QR_ENCODE_SECONDS = registry.histogram(
+    "tickets_http_request_qr_encode_seconds", "QR encode time per request.", ("view",)
+)
+QUERY_BUDGET_EXCEEDED = registry.counter(
+    "tickets_query_budget_exceeded_total", "Requests that ran more queries than their budget.", ("view",)
+)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for this process's request metrics."""
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# =============================
+# PER-REQUEST STATS
+# =============================
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "statements", "phases")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+        self.phases = defaultdict(float)
+
+
+_current = contextvars.ContextVar("tickets_request_stats", default=None)
+
+
+def start_request():
+    """Start collecting stats for the current context; returns ``(stats, token)``."""
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to the current request's ``phase``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current.get()
+        if stats is not None:
+            stats.phases[phase] += time.perf_counter() - start
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper counting and timing queries made during a request."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - start
+        stats.statements[sql] += 1
+
+
+@receiver(connection_created)
+def _install_query_recorder(sender, connection, **kwargs):
+    # Insert first: connection.execute_wrapper() pops the last wrapper on exit.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+# =============================
+# TEMPLATES
+# =============================
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timed("template"):
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing renders into the request's stats."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,74 @@
+# tickets/middleware.py
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger("tickets.metrics")
+
+
+class MetricsMiddleware:
+    """
+    Records per-view latency, query count and time, template render time and
+    QR encode time into tickets.metrics, and logs a warning when a view runs
+    more queries than its budget (settings.TICKET_QUERY_BUDGET, overridable
+    per URL name in TICKET_QUERY_BUDGETS) - usually an N+1 lookup.
+    Place it first in MIDDLEWARE so the timings cover the whole stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self.observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self.observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, response, stats, elapsed):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+
+        metrics.REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        metrics.REQUEST_SECONDS.observe(elapsed, view=view, method=request.method)
+        metrics.DB_QUERIES.observe(stats.queries, view=view)
+        metrics.DB_SECONDS.observe(stats.db_seconds, view=view)
+        if "template" in stats.phases:
+            metrics.TEMPLATE_SECONDS.observe(stats.phases["template"], view=view)
+        if "qr" in stats.phases:
+            metrics.QR_ENCODE_SECONDS.observe(stats.phases["qr"], view=view)
+
+        budget = getattr(settings, "TICKET_QUERY_BUDGETS", {}).get(
+            view, getattr(settings, "TICKET_QUERY_BUDGET", None)
+        )
+        if budget is not None and stats.queries > budget:
+            metrics.QUERY_BUDGET_EXCEEDED.inc(view=view)
+            sql, repeats = stats.statements.most_common(1)[0]
+            logger.warning(
+                "%s %s ran %d queries (budget %d); most repeated (%dx): %s",
+                request.method, request.path, stats.queries, budget, repeats, sql,
+            )
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:37
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import Replace
+
+
+def strip_token_hyphens(apps, schema_editor):
+    """
+    Store tokens as 32 hex digits, the form UUIDField uses on backends
+    without a native uuid type (and which PostgreSQL casts cleanly).
+    """
+    Ticket = apps.get_model("tickets", "Ticket")
+    Ticket.objects.update(token=Replace("token", Value("-"), Value("")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0003_ticket_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='event',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='tickets.event'),
+        ),
+        migrations.RunPython(strip_token_hyphens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='ticket',
+            name='token',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['-start_at'], name='event_start_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['end_at'], name='event_end_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'status'], name='ticket_event_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['event'], name='ticket_event_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('used_at__isnull', False)), fields=['event', 'used_at'], name='ticket_event_used_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'updated_at'], name='ticket_event_updated_at_idx'),
+        ),
+    ]
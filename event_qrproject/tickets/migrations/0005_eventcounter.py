@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_counters(apps, schema_editor):
+    """Create a counter row for every existing event from its tickets."""
+    Event = apps.get_model("tickets", "Event")
+    Ticket = apps.get_model("tickets", "Ticket")
+    EventCounter = apps.get_model("tickets", "EventCounter")
+
+    counts = {
+        row["event_id"]: row
+        for row in Ticket.objects.values("event_id").annotate(
+            issued=Count("pk"),
+            used=Count("pk", filter=Q(status="used")),
+            expired=Count("pk", filter=Q(status="expired")),
+        ).order_by()
+    }
+    EventCounter.objects.bulk_create([
+        EventCounter(
+            event_id=event_id,
+            issued=counts.get(event_id, {}).get("issued", 0),
+            used=counts.get(event_id, {}).get("used", 0),
+            expired=counts.get(event_id, {}).get("expired", 0),
+        )
+        for event_id in Event.objects.values_list("id", flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_tune_indexes_token_uuid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventCounter',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to='tickets.event')),
+                ('issued', models.IntegerField(default=0)),
+                ('used', models.IntegerField(default=0)),
+                ('expired', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0005_eventcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='signing_key_version',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
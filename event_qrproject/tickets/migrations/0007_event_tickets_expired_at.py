@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_event_signing_key_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='tickets_expired_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
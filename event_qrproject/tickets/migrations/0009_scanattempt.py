@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_ticket_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanAttempt',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('outcome', models.CharField(choices=[('ok', 'Validated'), ('already_used', 'Already used'), ('expired', 'Expired'), ('invalid', 'Invalid'), ('not_found', 'Not found'), ('invalid_signature', 'Invalid signature'), ('invalid_payload', 'Invalid payload')], max_length=20)),
+                ('device_id', models.CharField(blank=True, default='', max_length=64)),
+                ('gate', models.CharField(blank=True, default='', max_length=64)),
+                ('scanned_at', models.DateTimeField()),
+                ('event', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='scan_attempts', to='tickets.event')),
+                ('ticket', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='scan_attempts', to='tickets.ticket')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ticket', 'scanned_at'], name='scan_ticket_scanned_at_idx'), models.Index(fields=['event', 'scanned_at'], name='scan_event_scanned_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0009_scanattempt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventArchive',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archive', serialize=False, to='tickets.event')),
+                ('path', models.CharField(max_length=255)),
+                ('tickets', models.IntegerField(default=0)),
+                ('used', models.IntegerField(default=0)),
+                ('expired', models.IntegerField(default=0)),
+                ('bloom', models.BinaryField()),
+                ('archived_at', models.DateTimeField()),
+                ('compacted_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
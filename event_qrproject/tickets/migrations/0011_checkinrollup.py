@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0010_eventarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckInRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour')], max_length=6)),
+                ('bucket', models.DateTimeField()),
+                ('gate', models.CharField(blank=True, default='', max_length=64)),
+                ('count', models.IntegerField(default=0)),
+                ('event', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='checkin_rollups', to='tickets.event')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('event', 'resolution', 'bucket', 'gate'), name='checkin_rollup_bucket_uniq')],
+            },
+        ),
+    ]
@@ -1,7 +1,13 @@
 import uuid
-from django.db import models
+from collections import namedtuple
+from asgiref.sync import sync_to_async
+from django.db import models, transaction
+from django.db.models import F, Subquery
+from django.urls import NoReverseMatch, reverse
 from django.utils import timezone
 
+from .utils import make_signature
+
 
 class Event(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -11,6 +17,17 @@ class Event(models.Model):
     start_at = models.DateTimeField()
     end_at = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bump to rotate the event's derived signing key (see utils.make_signature).
+    signing_key_version = models.PositiveSmallIntegerField(default=1)
+    # Set once the expiry sweep (tickets/expiry.py) has expired the event's tickets.
+    tickets_expired_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # manage_events lists newest first; expiry sweeps look up ended events.
+            models.Index(fields=["-start_at"], name="event_start_at_idx"),
+            models.Index(fields=["end_at"], name="event_end_at_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -25,43 +42,343 @@ class Event(models.Model):
         return timezone.now() > self.end_at
 
 
+CheckInResult = namedtuple("CheckInResult", ["success", "reason", "message", "used_at"])
+
+
 class Ticket(models.Model):
+    STATUS_ACTIVE = "active"
+    STATUS_USED = "used"
+    STATUS_EXPIRED = "expired"
+    STATUS_INVALID = "invalid"
+
     STATUS_CHOICES = [
-        ("active", "Active"),
-        ("used", "Used"),
-        ("expired", "Expired"),
-        ("invalid", "Invalid"),
+        (STATUS_ACTIVE, "Active"),
+        (STATUS_USED, "Used"),
+        (STATUS_EXPIRED, "Expired"),
+        (STATUS_INVALID, "Invalid"),
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="tickets")
+    # Not indexed on its own: every composite index below leads with event.
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="tickets", db_index=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
     created_at = models.DateTimeField(auto_now_add=True)
     used_at = models.DateTimeField(blank=True, null=True)
     qr_image = models.ImageField(upload_to="tickets/qr_codes/", blank=True, null=True)
     signature = models.CharField(max_length=255, blank=True, null=True)
-    token = models.CharField(max_length=100, unique=True, default=uuid.uuid4, editable=False)
+    token = models.UUIDField(unique=True, default=uuid.uuid4, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Live dashboards and the ticket list API: counts and newest-first
+            # pages per (event, status), and per event.
+            models.Index(fields=["event", "status", "created_at", "id"], name="ticket_event_status_idx"),
+            models.Index(fields=["event", "created_at", "id"], name="ticket_event_created_at_idx"),
+            # Scanner lookups of tickets still admissible for an event.
+            models.Index(
+                fields=["event"], condition=models.Q(status="active"), name="ticket_event_active_idx"
+            ),
+            # Throughput charts and check-in exports: used_at ranges per event.
+            models.Index(
+                fields=["event", "used_at"], condition=models.Q(used_at__isnull=False), name="ticket_event_used_at_idx"
+            ),
+            # Incremental offline manifests (?since=).
+            models.Index(fields=["event", "updated_at"], name="ticket_event_updated_at_idx"),
+        ]
 
     def __str__(self):
         return f"Ticket for {self.event.title}"
 
+    @classmethod
+    def new_signed(cls, event):
+        """Unsaved ticket for ``event`` with its signature already filled in."""
+        ticket = cls(event=event)
+        ticket.signature = make_signature(ticket.id, event)
+        return ticket
+
+    @property
+    def qr_image_url(self):
+        """
+        Stored QR image if there is one, otherwise the on-demand QR
+        endpoint; None where that is not routed (scan-only nodes).
+        """
+        if self.qr_image:
+            return self.qr_image.url
+        try:
+            return reverse("ticket_qr", args=[self.token])
+        except NoReverseMatch:
+            return None
+
     # ✅ Core validation logic
+    @classmethod
+    def check_in(cls, gate="", **lookup):
+        """
+        Atomically mark the ticket matching ``lookup`` (e.g. ``token=...`` or
+        ``pk=...``) as used with a single conditional UPDATE, so two scanners
+        can never both validate the same ticket. ``gate`` is the scanner's
+        gate (or device) in the check-in rollup.
+        The ticket is only read back when the UPDATE matched nothing, to
+        explain why. Tickets of ended events are rejected as expired but not
+        rewritten; ``manage.py expire_tickets`` does that in bulk.
+        Returns a CheckInResult whose reason is one of "ok", "not_found",
+        "already_used", "expired" or "invalid".
+        """
+        now = timezone.now()
+        if cls._mark_used(lookup, now, gate):
+            return CheckInResult(True, "ok", "Ticket successfully validated!", now)
+
+        ticket = cls.objects.filter(**lookup).select_related("event").only(
+            "id", "status", "used_at", "event__end_at"
+        ).first()
+        if ticket is None:
+            return cls.rejection("not_found")
+
+        return cls.rejection_for(ticket.status, ticket.event.end_at, ticket.used_at, now) or cls.rejection(
+            "invalid", status=ticket.status
+        )
+
+    @classmethod
+    async def acheck_in(cls, gate="", **lookup):
+        """Async variant of check_in()."""
+        now = timezone.now()
+        if await sync_to_async(cls._mark_used)(lookup, now, gate):
+            return CheckInResult(True, "ok", "Ticket successfully validated!", now)
+
+        ticket = await cls.objects.filter(**lookup).select_related("event").only(
+            "id", "status", "used_at", "event__end_at"
+        ).afirst()
+        if ticket is None:
+            return cls.rejection("not_found")
+
+        return cls.rejection_for(ticket.status, ticket.event.end_at, ticket.used_at, now) or cls.rejection(
+            "invalid", status=ticket.status
+        )
+
+    @classmethod
+    def _mark_used(cls, lookup, now, gate=""):
+        """
+        The conditional UPDATE behind check_in(), counted in the event's
+        EventCounter and check-in rollup in the same transaction. Returns the
+        number of rows updated.
+        """
+        from .rollups import add_for_ticket  # avoid circular import
+
+        with transaction.atomic():
+            updated = cls.objects.filter(
+                status=cls.STATUS_ACTIVE, event__end_at__gte=now, **lookup
+            ).update(status=cls.STATUS_USED, used_at=now, updated_at=now)
+            if updated:
+                EventCounter.add_for_ticket(cls.objects.filter(**lookup), used=updated)
+                add_for_ticket(cls.objects.filter(**lookup), now, gate)
+        return updated
+
+    @classmethod
+    def rejection_for(cls, status, end_at, used_at, now=None):
+        """
+        Return the failed CheckInResult explained by a ticket's state, or
+        None if a ticket in that state can be checked in.
+        """
+        if end_at < (now or timezone.now()):
+            return cls.rejection("expired", used_at=used_at)
+        if status == cls.STATUS_ACTIVE:
+            return None
+        if status == cls.STATUS_USED:
+            return cls.rejection("already_used", used_at=used_at)
+        return cls.rejection("invalid", status=status, used_at=used_at)
+
+    @classmethod
+    def rejection(cls, reason, status=None, used_at=None):
+        """Build the failed CheckInResult for ``reason``."""
+        if reason == "not_found":
+            message = "Ticket not found."
+        elif reason == "expired":
+            message = "This ticket is expired. The event has ended."
+        elif reason == "invalid_signature":
+            message = "This ticket's signature is not valid."
+        elif reason == "already_used":
+            message = f"This ticket was already validated at {used_at.strftime('%Y-%m-%d %H:%M:%S')}."
+        else:
+            message = f"This ticket is {status} and cannot be validated."
+        return CheckInResult(False, reason, message, used_at)
+
     def mark_as_used(self):
         """
         Mark the ticket as used, or return status message if expired/used.
         Returns tuple: (success: bool, message: str)
         """
-        now = timezone.now()
+        from .scan_cache import check_in  # avoid circular import
+
+        result, entry = check_in(ticket_id=self.pk)
+        if entry is not None:
+            self.status, self.used_at = entry.status, entry.used_at
+        return result.success, result.message
 
-        if self.event.end_at < now:
-            self.status = "expired"
-            self.save()
-            return False, "This ticket is expired. The event has ended."
 
-        if self.status == "used":
-            return False, f"This ticket was already validated at {self.used_at.strftime('%Y-%m-%d %H:%M:%S')}."
+class EventCounter(models.Model):
+    """
+    Denormalized ticket counts per event, updated in the same transaction
+    as issuance and check-in so dashboards never need COUNT(*) scans.
+    Rebuild with ``manage.py rebuild_event_counters`` if they drift.
+    """
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name="counter")
+    issued = models.IntegerField(default=0)
+    used = models.IntegerField(default=0)
+    expired = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Counters for {self.event_id}"
+
+    @classmethod
+    def add(cls, event_id, **deltas):
+        """Atomically add ``deltas`` (e.g. ``issued=1``) to an event's counters."""
+        changes = {field: F(field) + delta for field, delta in deltas.items()}
+        if not cls.objects.filter(event_id=event_id).update(**changes):
+            cls.objects.get_or_create(event_id=event_id)
+            cls.objects.filter(event_id=event_id).update(**changes)
+
+    @classmethod
+    def add_for_ticket(cls, tickets, **deltas):
+        """
+        Like add(), for the event of the ticket in ``tickets`` (a queryset
+        matching one ticket), resolved with a subquery instead of a read.
+        Falls back to add() when the event has no counter row yet.
+        """
+        changes = {field: F(field) + delta for field, delta in deltas.items()}
+        if not cls.objects.filter(event_id=Subquery(tickets.values("event_id")[:1])).update(**changes):
+            event_id = tickets.values_list("event_id", flat=True).first()
+            if event_id is not None:
+                cls.add(event_id, **deltas)
+
+
+class EventArchive(models.Model):
+    """
+    An event whose tickets were moved to a compressed file by
+    tickets/archive.py, with their final counts and a Bloom filter of the
+    archived ticket ids and tokens for lookups.
+    """
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name="archive")
+    path = models.CharField(max_length=255)
+    tickets = models.IntegerField(default=0)
+    used = models.IntegerField(default=0)
+    expired = models.IntegerField(default=0)
+    bloom = models.BinaryField()
+    # Tickets created up to this time are in the file.
+    archived_at = models.DateTimeField()
+    # Set once their live rows and QR files have been deleted.
+    compacted_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Archive of {self.event_id}"
+
+
+class ScanAttempt(models.Model):
+    """
+    Append-only record of a scan and its outcome, accepted or not. Written
+    in batches by tickets/scan_log.py, never updated. Ticket and event are
+    plain references (no FK constraint), so the log outlives deleted rows.
+    """
+    OUTCOME_CHOICES = [
+        ("ok", "Validated"),
+        ("already_used", "Already used"),
+        ("expired", "Expired"),
+        ("invalid", "Invalid"),
+        ("not_found", "Not found"),
+        ("invalid_signature", "Invalid signature"),
+        ("invalid_payload", "Invalid payload"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    ticket = models.ForeignKey(
+        Ticket, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+        related_name="scan_attempts", db_index=False,
+    )
+    event = models.ForeignKey(
+        Event, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+        related_name="scan_attempts", db_index=False,
+    )
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    device_id = models.CharField(max_length=64, blank=True, default="")
+    gate = models.CharField(max_length=64, blank=True, default="")
+    scanned_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # A ticket's scan history; per-event (and per-gate) timelines.
+            models.Index(fields=["ticket", "scanned_at"], name="scan_ticket_scanned_at_idx"),
+            models.Index(fields=["event", "scanned_at"], name="scan_event_scanned_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.outcome} at {self.scanned_at}"
+
+
+class CheckInRollup(models.Model):
+    """
+    Check-ins per event, gate and time bucket (UTC), kept up to date by
+    tickets/rollups.py so throughput charts never aggregate Ticket.used_at.
+    Live events have per-minute rows; ended events are folded into hourly
+    ones. ``gate`` is "" for check-ins whose scanner gave no gate or device.
+    """
+    RESOLUTION_MINUTE = "minute"
+    RESOLUTION_HOUR = "hour"
+    RESOLUTION_CHOICES = [
+        (RESOLUTION_MINUTE, "Minute"),
+        (RESOLUTION_HOUR, "Hour"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="checkin_rollups", db_index=False)
+    resolution = models.CharField(max_length=6, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField()
+    gate = models.CharField(max_length=64, blank=True, default="")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index behind an event's time-series reads.
+            models.UniqueConstraint(
+                fields=["event", "resolution", "bucket", "gate"], name="checkin_rollup_bucket_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.count} check-ins at {self.bucket} ({self.gate or 'all gates'})"
+
+
+class IssueJob(models.Model):
+    """
+    Progress of a bulk issuance started from api/issue/ (see
+    tickets/issuance.py). Kept in the database so any worker can answer a
+    status poll; rows idle for settings.TICKET_ISSUE_JOB_TTL are purged.
+    """
+    STATE_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="issue_jobs")
+    count = models.PositiveIntegerField()
+    created = models.PositiveIntegerField(default=0)
+    rendered = models.PositiveIntegerField(default=0)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default="queued")
+    error = models.TextField(blank=True, null=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Issue {self.count} for {self.event_id} ({self.state})"
 
-        self.status = "used"
-        self.used_at = now
-        self.save()
-        return True, "Ticket successfully validated!"
+    def as_dict(self):
+        return {
+            "job_id": str(self.id),
+            "event_id": str(self.event_id),
+            "count": self.count,
+            "created": self.created,
+            "rendered": self.rendered,
+            "state": self.state,
+            "error": self.error,
+        }
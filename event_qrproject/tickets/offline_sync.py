@@ -0,0 +1,205 @@
+# tickets/offline_sync.py
+"""
+Offline scanner sync.
+
+Manifest format (version 2), one JSON document per line:
+
+    {"version": 2, "event_id": ..., "since": ... | null}
+    ["<ticket digest>", "<status>"]
+    ...
+    {"count": N, "cursor": ..., "sha256": ...}
+
+A ticket's digest is ticket_digest(): the first 32 hex digits of the
+SHA-256 of its id (lowercase, hyphenated), so a manifest does not hand out
+ticket ids. Scanners hash the id they scan and look it up; they never hold
+the event's signing key. Instead every offline check-in carries the
+signature read from the QR code, and apply_offline_checkins() verifies it
+with the event's key, rejecting unsigned or forged items. ``sha256``
+covers every line before the trailer (newlines included). Pass the
+trailer's ``cursor`` back as ``since`` to fetch only tickets that changed
+afterwards (rows at exactly the cursor are sent again).
+
+Both endpoints require a scanner token or a staff login (tickets/permissions.py).
+"""
+import datetime
+import hashlib
+import json
+
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import EventCounter, Ticket
+from . import rollups, scan_cache
+from .feed import publish_check_in
+from .utils import verify_many
+
+MANIFEST_VERSION = 2
+
+# Scanner clocks may run this far ahead of ours before a scan counts as
+# being in the future.
+MAX_CLOCK_SKEW = datetime.timedelta(minutes=1)
+
+
+def ticket_digest(ticket_id):
+    """The manifest's stand-in for ``ticket_id``."""
+    return hashlib.sha256(str(ticket_id).lower().encode()).hexdigest()[:32]
+
+
+def parse_cursor(value):
+    """Parse a ``since`` cursor; returns None for a blank value."""
+    if not value:
+        return None
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(f"Invalid cursor: {value}")
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since, datetime.timezone.utc)
+    return since
+
+
+def format_cursor(value):
+    """Format a cursor as UTC ISO 8601 with a "Z" suffix, which is URL-safe."""
+    if value is None:
+        return None
+    return value.astimezone(datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def iter_manifest(event, since=None, chunk_size=2000):
+    """Yield the manifest for ``event`` line by line."""
+    digest = hashlib.sha256()
+
+    def line(obj):
+        data = json.dumps(obj, separators=(",", ":")) + "\n"
+        digest.update(data.encode())
+        return data
+
+    yield line({
+        "version": MANIFEST_VERSION,
+        "event_id": str(event.id),
+        "since": format_cursor(since),
+    })
+
+    tickets = Ticket.objects.filter(event=event)
+    if since is not None:
+        tickets = tickets.filter(updated_at__gte=since)
+
+    count = 0
+    cursor = since
+    rows = tickets.order_by("updated_at").values_list("id", "status", "updated_at").iterator(chunk_size=chunk_size)
+    for ticket_id, status, updated_at in rows:
+        count += 1
+        cursor = updated_at
+        yield line([ticket_digest(ticket_id), status])
+
+    yield json.dumps({
+        "count": count,
+        "cursor": format_cursor(cursor),
+        "sha256": digest.hexdigest(),
+    }, separators=(",", ":")) + "\n"
+
+
+def apply_offline_checkins(event, checkins):
+    """
+    Apply a batch of offline scans for ``event`` in one transaction.
+
+    ``checkins`` is a list of dicts with ``ticket_id``, ``scanned_at``,
+    ``device_id`` and the scanned ``signature``, which is checked against
+    the event's key; unsigned items are rejected like forged ones, and so
+    are scans dated in the future. The earliest scan of a ticket in the
+    batch wins and every other one is returned as a conflict. A ticket that
+    is already used stays as it is, even if this scan is earlier: across
+    uploads and online scans, the first one to reach the server wins.
+    Returns ``(applied_count, conflicts)``.
+    """
+    conflicts = []
+
+    def conflict(item, reason, used_at=None):
+        conflicts.append({
+            "ticket_id": str(item["ticket_id"]),
+            "scanned_at": item["scanned_at"],
+            "device_id": item.get("device_id"),
+            "reason": reason,
+            "used_at": used_at,
+        })
+
+    signed = [item for item in checkins if item.get("signature")]
+    valid = verify_many((item["ticket_id"], item["signature"], event, False) for item in signed)
+    for item in checkins:
+        if not item.get("signature"):
+            conflict(item, "invalid_signature")
+    for item, ok in zip(signed, valid):
+        if not ok:
+            conflict(item, "invalid_signature")
+    checkins = [item for item, ok in zip(signed, valid) if ok]
+
+    now = timezone.now()
+    for item in checkins:
+        if item["scanned_at"] > now + MAX_CLOCK_SKEW:
+            conflict(item, "invalid_scanned_at")
+    checkins = [item for item in checkins if item["scanned_at"] <= now + MAX_CLOCK_SKEW]
+
+    first_scans = {}
+    for item in sorted(checkins, key=lambda c: c["scanned_at"]):
+        if item["ticket_id"] in first_scans:
+            conflict(item, "duplicate_in_batch", first_scans[item["ticket_id"]]["scanned_at"])
+        else:
+            first_scans[item["ticket_id"]] = item
+
+    applied = []
+    touched = []
+    with transaction.atomic():
+        ids = list(first_scans)
+        known = {}
+        for start in range(0, len(ids), 500):
+            rows = Ticket.objects.filter(event=event, pk__in=ids[start:start + 500]).values_list(
+                "id", "token", "status", "used_at"
+            )
+            known.update({row[0]: row[1:] for row in rows})
+
+        claimed = []
+        for ticket_id, item in first_scans.items():
+            if ticket_id not in known:
+                conflict(item, "not_found")
+                continue
+            token, status, used_at = known[ticket_id]
+            if item["scanned_at"] > event.end_at:
+                conflict(item, "expired", used_at)
+            elif status != Ticket.STATUS_ACTIVE:
+                conflict(item, "already_used" if status == Ticket.STATUS_USED else status, used_at)
+            else:
+                claimed.append(ticket_id)
+                touched.append((ticket_id, token))
+
+        # One UPDATE per chunk, each ticket set to its own scan time. Three
+        # parameters per ticket keeps a chunk under SQLite's 999.
+        won = set()
+        for start in range(0, len(claimed), 300):
+            chunk = claimed[start:start + 300]
+            Ticket.objects.filter(pk__in=chunk, status=Ticket.STATUS_ACTIVE).update(
+                status=Ticket.STATUS_USED,
+                used_at=Case(
+                    *(When(pk=ticket_id, then=Value(first_scans[ticket_id]["scanned_at"])) for ticket_id in chunk),
+                    output_field=DateTimeField(),
+                ),
+                updated_at=now,
+            )
+            won.update(Ticket.objects.filter(pk__in=chunk, status=Ticket.STATUS_USED, updated_at=now).values_list(
+                "pk", flat=True
+            ))
+        for ticket_id in claimed:
+            if ticket_id in won:
+                applied.append(first_scans[ticket_id])
+            else:
+                conflict(first_scans[ticket_id], "already_used")
+
+        if applied:
+            EventCounter.add(event.id, used=len(applied))
+            rollups.add_checkins(event.id, applied)
+
+    for ticket_id, token in touched:
+        scan_cache.invalidate_ticket(ticket_id, token)
+    for item in applied:
+        publish_check_in(event.id, item["ticket_id"], item["scanned_at"], "offline")
+    return len(applied), conflicts
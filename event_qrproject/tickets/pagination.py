@@ -0,0 +1,37 @@
+# tickets/pagination.py
+"""
+Pagination that stays cheap on events with hundreds of thousands of tickets.
+
+The list APIs use keyset (cursor) pagination: each page is a range scan
+from the previous page's last sort key, so page 1000 costs the same as
+page 1 and no COUNT(*) is run. The admin cannot use cursors, so it gets
+a paginator whose count is capped instead.
+"""
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class EventCursorPagination(CursorPagination):
+    ordering = ("-start_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+class TicketCursorPagination(CursorPagination):
+    # Backed by the (event, created_at) and (event, status, created_at) indexes;
+    # TicketListAPI always filters by event.
+    ordering = ("-created_at", "-id")
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class CappedCountPaginator(Paginator):
+    """A Paginator that stops counting at ``max_count`` rows."""
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        return self.object_list.order_by()[:self.max_count].count()
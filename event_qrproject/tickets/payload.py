@@ -0,0 +1,95 @@
+# tickets/payload.py
+"""
+Ticket QR payload formats.
+
+Two formats are understood by the scan API:
+
+* legacy text, ``<ticket uuid>|<hex signature>`` (about 100 characters,
+  QR byte mode);
+* compact, ``T1`` followed by the base45 (RFC 9285) encoding of the raw
+  16-byte ticket id and the first ``COMPACT_MAC_BYTES`` bytes of its
+  signature. Base45 only uses QR alphanumeric characters, so the 38
+  characters fit in a version 2 code at error correction level M.
+
+Like qr.py this module has no Django imports.
+"""
+import uuid
+
+BASE45_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+_BASE45_VALUES = {c: i for i, c in enumerate(BASE45_ALPHABET)}
+
+COMPACT_PREFIX = "T1"
+COMPACT_MAC_BYTES = 8
+
+
+def b45encode(data: bytes) -> str:
+    chars = []
+    for i in range(0, len(data) - 1, 2):
+        n = data[i] * 256 + data[i + 1]
+        n, c = divmod(n, 45)
+        e, d = divmod(n, 45)
+        chars += (BASE45_ALPHABET[c], BASE45_ALPHABET[d], BASE45_ALPHABET[e])
+    if len(data) % 2:
+        d, c = divmod(data[-1], 45)
+        chars += (BASE45_ALPHABET[c], BASE45_ALPHABET[d])
+    return "".join(chars)
+
+
+def b45decode(text: str) -> bytes:
+    """Decode base45 text; raises ValueError if it is malformed."""
+    try:
+        values = [_BASE45_VALUES[c] for c in text]
+    except KeyError:
+        raise ValueError("Invalid base45 character.")
+    if len(values) % 3 == 1:
+        raise ValueError("Invalid base45 length.")
+
+    out = bytearray()
+    for i in range(0, len(values), 3):
+        group = values[i:i + 3]
+        if len(group) == 3:
+            n = group[0] + group[1] * 45 + group[2] * 2025
+            if n > 0xFFFF:
+                raise ValueError("Invalid base45 group.")
+            out.extend(divmod(n, 256))
+        else:
+            n = group[0] + group[1] * 45
+            if n > 0xFF:
+                raise ValueError("Invalid base45 group.")
+            out.append(n)
+    return bytes(out)
+
+
+def encode_compact(ticket_id, signature: str) -> str:
+    """Compact payload for ``ticket_id`` and its full hex ``signature``."""
+    raw = uuid.UUID(str(ticket_id)).bytes + bytes.fromhex(signature)[:COMPACT_MAC_BYTES]
+    return COMPACT_PREFIX + b45encode(raw)
+
+
+def decode_compact(payload: str):
+    """
+    Returns ``(ticket_id, truncated_hex_signature)`` for a compact payload.
+    Raises ValueError if it is not one.
+    """
+    if not payload.startswith(COMPACT_PREFIX):
+        raise ValueError("Not a compact payload.")
+    raw = b45decode(payload[len(COMPACT_PREFIX):])
+    if len(raw) != 16 + COMPACT_MAC_BYTES:
+        raise ValueError("Invalid compact payload length.")
+    return str(uuid.UUID(bytes=raw[:16])), raw[16:].hex()
+
+
+def parse_payload(payload: str):
+    """
+    Returns ``(ticket_id, signature, compact)`` from a scanned payload in
+    either format, or None if it is in neither. ``compact`` is true when
+    the signature is the truncated MAC of a compact payload. The ticket id
+    is not validated beyond what the format implies.
+    """
+    if "|" in payload:
+        ticket_id, sig = payload.split("|", 1)
+        return ticket_id, sig, False
+    try:
+        return (*decode_compact(payload), True)
+    except ValueError:
+        return None
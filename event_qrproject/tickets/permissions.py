@@ -0,0 +1,35 @@
+# tickets/permissions.py
+"""
+Access to the scanner-only APIs (offline manifest and check-in upload).
+
+Scanner devices send one of settings.TICKET_SCANNER_TOKENS as
+``Authorization: Scanner <token>`` (or in the X-Scanner-Token header).
+Staff users signed in to the site are let through as well.
+"""
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+def scanner_token(request):
+    """The token the request presents, or ""."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "scanner" and token:
+        return token.strip()
+    return request.headers.get("X-Scanner-Token", "")
+
+
+def is_scanner(request):
+    token = scanner_token(request).encode()
+    # Every token is compared, so the time taken says nothing about which matched.
+    matches = [hmac.compare_digest(token, known.encode()) for known in getattr(settings, "TICKET_SCANNER_TOKENS", ())]
+    return bool(token) and any(matches)
+
+
+class IsScannerOrStaff(BasePermission):
+    message = "A scanner token or a staff login is required."
+
+    def has_permission(self, request, view):
+        user = getattr(request, "user", None)
+        return bool(user is not None and user.is_staff) or is_scanner(request)
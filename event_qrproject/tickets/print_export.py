@@ -0,0 +1,324 @@
+# tickets/print_export.py
+"""
+Streamed print exports of an event's QR codes: a ZIP of one image per
+ticket, or a PDF of multi-up sheets with the ticket id under each code.
+
+Both are generated in chunks of ``chunk_size`` tickets and yielded as
+bytes, so neither the archive nor the document is held in memory (only
+the ZIP central directory and the PDF cross-reference table, a few
+hundred bytes per ticket). Images already in storage are reused; the rest
+are rendered in a process pool, one chunk ahead of the writer.
+"""
+import io
+import multiprocessing
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from django.core.files.storage import default_storage
+
+from .models import Ticket
+from .qr import render_ticket, render_ticket_bits
+from .utils import build_qr_content, get_qr_renderer
+
+PRINT_FORMATS = {
+    "zip": "application/zip",
+    "pdf": "application/pdf",
+}
+
+PAGE_SIZES = {
+    "a4": (595.28, 841.89),
+    "letter": (612, 792),
+}
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+# =============================
+# TICKETS AND IMAGES
+# =============================
+def _chunks(event, status, chunk_size):
+    tickets = Ticket.objects.filter(event=event)
+    if status:
+        tickets = tickets.filter(status=status)
+    rows = tickets.order_by("created_at", "id").values_list("id", "token", "qr_image").iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _read_stored(name):
+    """The stored image ``name``, or None if there is none or it is gone."""
+    if not name:
+        return None
+    try:
+        with default_storage.open(name, "rb") as f:
+            return f.read()
+    except (FileNotFoundError, OSError):
+        return None
+
+
+class _Pool:
+    """Process pool started on first use, so fully stored events never start one."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+
+    def submit(self, fn, items):
+        if not items:
+            return []
+        if self._executor is None:
+            # "spawn" keeps the pool safe to start from a request thread.
+            ctx = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        # Submitted now; results are collected when the chunk is written.
+        return self._executor.map(fn, items, chunksize=max(len(items) // 32, 1))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+
+def _pipelined(event, status, chunk_size, workers, render, reuse=None):
+    """
+    Yield ``(chunk, stored, rendered)`` per chunk of tickets, where
+    ``stored`` maps ticket ids to ``(name, bytes)`` of images found in
+    storage (and accepted by ``reuse(name)``, if given) and ``rendered``
+    iterates ``render((ticket_id, payload))`` results for the rest. The
+    next chunk is already rendering while the caller writes this one.
+    """
+    pool = _Pool(workers)
+    pending = None
+    try:
+        for chunk in _chunks(event, status, chunk_size):
+            stored, missing = {}, []
+            for ticket_id, token, name in chunk:
+                data = _read_stored(name) if not reuse or reuse(name) else None
+                if data is None:
+                    missing.append((str(ticket_id), build_qr_content(ticket_id, token, event)))
+                else:
+                    stored[str(ticket_id)] = (name, data)
+            job = (chunk, stored, pool.submit(render, missing))
+            if pending:
+                yield pending
+            pending = job
+        if pending:
+            yield pending
+    finally:
+        pool.close()
+
+
+# =============================
+# ZIP
+# =============================
+class _StreamSink:
+    """Write-only file object for zipfile; drain() hands back what was written."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_qr_zip(event, status=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, progress=None):
+    """
+    Yield a ZIP archive of ``event``'s QR images, ``ticket_<id>.<ext>``
+    each, as byte chunks. Missing images are rendered with the configured
+    renderer. ``progress`` is an optional callable ``(done)``.
+    """
+    renderer = get_qr_renderer()
+    sink = _StreamSink()
+    # An unseekable sink makes zipfile write data descriptors instead of
+    # seeking back to patch local headers.
+    archive = zipfile.ZipFile(sink, "w", allowZip64=True)
+    now = time.localtime()[:6]
+    done = 0
+
+    render = partial(render_ticket, renderer)
+    for chunk, stored, rendered in _pipelined(event, status, chunk_size, workers, render):
+        images = {ticket_id: (name.rsplit(".", 1)[-1], data) for ticket_id, (name, data) in stored.items()}
+        images.update((ticket_id, (renderer.extension, data)) for ticket_id, data in rendered)
+        for ticket_id, _, _ in chunk:
+            extension, data = images[str(ticket_id)]
+            info = zipfile.ZipInfo(f"ticket_{ticket_id}.{extension}", now)
+            # PNGs are already compressed.
+            info.compress_type = zipfile.ZIP_STORED if extension == "png" else zipfile.ZIP_DEFLATED
+            archive.writestr(info, data)
+        done += len(chunk)
+        if progress:
+            progress(done)
+        yield sink.drain()
+
+    archive.close()
+    yield sink.drain()
+
+
+# =============================
+# PDF
+# =============================
+# Helvetica advance widths (per 1000 em) for the characters of a ticket id.
+_HELVETICA_WIDTHS = {"-": 333, "a": 556, "b": 556, "c": 500, "d": 556, "e": 556, "f": 278}
+
+
+def _text_width(text, font_size):
+    return sum(_HELVETICA_WIDTHS.get(c, 556) for c in text) * font_size / 1000
+
+
+def _bits_from_png(data):
+    """``(width, height, bits)`` of a stored PNG, in render_bits() layout."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("1")
+        return image.width, image.height, image.tobytes()
+
+
+class PDFSheetWriter:
+    """
+    Incremental PDF 1.4 writer: each page is written as soon as it is
+    full, and the page tree and cross-reference table at the end.
+    QR codes are embedded as 1-bit images at one pixel per module and
+    scaled by the page, so they stay sharp at any print resolution.
+    """
+    CATALOG, PAGES, FONT = 1, 2, 3
+
+    def __init__(self, page_size="a4", columns=4, rows=6, margin=28, font_size=6):
+        self.width, self.height = PAGE_SIZES[page_size]
+        self.columns = columns
+        self.rows = rows
+        self.margin = margin
+        self.font_size = font_size
+        self.cell_width = (self.width - 2 * margin) / columns
+        self.cell_height = (self.height - 2 * margin) / rows
+        self.qr_size = min(self.cell_width, self.cell_height - 3 * font_size) * 0.9
+        self._offsets = {}
+        self._position = 0
+        self._next_id = self.FONT + 1
+        self._pages = []
+        self._cells = []
+
+    @property
+    def per_page(self):
+        return self.columns * self.rows
+
+    def _object(self, obj_id, body, stream=None):
+        self._offsets[obj_id] = self._position
+        out = f"{obj_id} 0 obj\n".encode() + body
+        if stream is not None:
+            out += b"\nstream\n" + stream + b"\nendstream"
+        out += b"\nendobj\n"
+        self._position += len(out)
+        return out
+
+    def _reserve(self):
+        self._next_id += 1
+        return self._next_id - 1
+
+    def start(self):
+        """The header and the objects shared by every page."""
+        header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self._position = len(header)
+        return (
+            header
+            + self._object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode())
+            + self._object(self.FONT, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        )
+
+    def add(self, label, width, height, bits):
+        """Queue one code; returns the finished page's bytes when it fills up, else b""."""
+        self._cells.append((label, width, height, bits))
+        if len(self._cells) >= self.per_page:
+            return self.flush_page()
+        return b""
+
+    def flush_page(self):
+        if not self._cells:
+            return b""
+        out = []
+        images = []
+        content = []
+        for i, (label, width, height, bits) in enumerate(self._cells):
+            image_id = self._reserve()
+            images.append(f"/Q{i} {image_id} 0 R")
+            out.append(self._image(image_id, width, height, bits))
+
+            column, row = i % self.columns, i // self.columns
+            left = self.margin + column * self.cell_width
+            top = self.height - self.margin - row * self.cell_height
+            x = left + (self.cell_width - self.qr_size) / 2
+            y = top - self.qr_size - self.font_size / 2
+            content.append(f"q {self.qr_size:.2f} 0 0 {self.qr_size:.2f} {x:.2f} {y:.2f} cm /Q{i} Do Q")
+            text_x = left + (self.cell_width - _text_width(label, self.font_size)) / 2
+            content.append(f"BT /F1 {self.font_size} Tf {text_x:.2f} {y - 1.5 * self.font_size:.2f} Td ({label}) Tj ET")
+
+        stream = zlib.compress("\n".join(content).encode())
+        content_id = self._reserve()
+        out.append(self._object(content_id, f"<< /Filter /FlateDecode /Length {len(stream)} >>".encode(), stream))
+        page_id = self._reserve()
+        out.append(self._object(page_id, (
+            f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {self.width} {self.height}]"
+            f" /Resources << /Font << /F1 {self.FONT} 0 R >> /XObject << {' '.join(images)} >> >>"
+            f" /Contents {content_id} 0 R >>"
+        ).encode()))
+        self._pages.append(page_id)
+        self._cells = []
+        return b"".join(out)
+
+    def _image(self, image_id, width, height, bits):
+        stream = zlib.compress(bits)
+        return self._object(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} /ColorSpace /DeviceGray"
+            f" /BitsPerComponent 1 /Filter /FlateDecode /Length {len(stream)} >>"
+        ).encode(), stream)
+
+    def finish(self):
+        """The last partial page, the page tree, and the cross-reference table."""
+        out = self.flush_page()
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._pages)
+        out += self._object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode())
+        xref_at = self._position
+        lines = [f"xref\n0 {self._next_id}\n", "0000000000 65535 f \n"]
+        lines += [f"{self._offsets[obj_id]:010d} 00000 n \n" for obj_id in range(1, self._next_id)]
+        lines.append(f"trailer\n<< /Size {self._next_id} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref_at}\n%%EOF\n")
+        return out + "".join(lines).encode()
+
+
+def iter_qr_pdf(event, status=None, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, progress=None, **layout):
+    """
+    Yield a PDF of ``event``'s QR codes as byte chunks, ``columns`` x
+    ``rows`` per ``page_size`` sheet (see PDFSheetWriter), with each
+    ticket's id printed under its code. ``progress`` is an optional
+    callable ``(done)``.
+    """
+    writer = PDFSheetWriter(**layout)
+    done = 0
+
+    yield writer.start()
+    chunks = _pipelined(event, status, chunk_size, workers, render_ticket_bits, reuse=lambda name: name.endswith(".png"))
+    for chunk, stored, rendered in chunks:
+        codes = {ticket_id: _bits_from_png(data) for ticket_id, (_, data) in stored.items()}
+        codes.update((ticket_id, (size, size, bits)) for ticket_id, (size, bits) in rendered)
+        out = []
+        for ticket_id, _, _ in chunk:
+            out.append(writer.add(str(ticket_id), *codes[str(ticket_id)]))
+        done += len(chunk)
+        if progress:
+            progress(done)
+        yield b"".join(out)
+    yield writer.finish()
@@ -0,0 +1,180 @@
+# tickets/qr.py
+"""
+QR rendering helpers.
+
+Kept free of Django imports so the functions can run inside worker
+processes started with the "spawn" method. Renderers are plain objects
+and can be pickled into such workers.
+qrcode (and PIL through it) is imported on first render, so processes
+that never render, like scan nodes, don't pay for loading it.
+"""
+import io
+import threading
+
+# qrcode.constants.ERROR_CORRECT_*
+ERROR_CORRECTION = {
+    "L": 1,
+    "M": 0,
+    "Q": 3,
+    "H": 2,
+}
+
+
+def _make_qr(data, box_size, border, error_correction):
+    import qrcode
+
+    qr = qrcode.QRCode(
+        box_size=box_size,
+        border=border,
+        error_correction=ERROR_CORRECTION[error_correction],
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def qr_version(data: str, error_correction: str = "M") -> int:
+    """The smallest QR version (1-40) that holds ``data``."""
+    return _make_qr(data, 1, 0, error_correction).version
+
+
+def render_png(data: str, box_size: int = 10, border: int = 4, error_correction: str = "M") -> bytes:
+    """Render ``data`` as a QR code and return the PNG bytes."""
+    buffer = io.BytesIO()
+    _make_qr(data, box_size, border, error_correction).make_image().save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_bits(data: str, border: int = 4, error_correction: str = "M"):
+    """
+    Render ``data`` as one pixel per module. Returns ``(size, bits)``: rows
+    of packed 1-bit pixels, most significant bit first, each row padded to
+    a whole byte, with 1 for light modules (PDF DeviceGray, PIL mode "1").
+    """
+    matrix = _make_qr(data, 1, border, error_correction).get_matrix()
+    size = len(matrix)
+    bits = bytearray()
+    for row in matrix:
+        value = 0
+        for dark in row:
+            value = (value << 1) | (not dark)
+        pad = -size % 8
+        bits += ((value << pad) | ((1 << pad) - 1)).to_bytes((size + pad) // 8, "big")
+    return size, bytes(bits)
+
+
+def render_svg(data: str, box_size: int = 10, border: int = 4, error_correction: str = "M") -> bytes:
+    """Render ``data`` as a QR code and return the SVG bytes."""
+    from qrcode.image.svg import SvgPathImage
+
+    buffer = io.BytesIO()
+    _make_qr(data, box_size, border, error_correction).make_image(image_factory=SvgPathImage).save(buffer)
+    return buffer.getvalue()
+
+
+# =============================
+# RENDERERS
+# =============================
+class QRRenderer:
+    """Base class: ``render(data)`` returns the encoded image bytes."""
+    content_type = "image/png"
+    extension = "png"
+
+    def render(self, data: str) -> bytes:
+        raise NotImplementedError
+
+
+class PNGRenderer(QRRenderer):
+    def __init__(self, box_size=10, border=4, error_correction="M"):
+        self.box_size = box_size
+        self.border = border
+        self.error_correction = error_correction
+
+    def render(self, data):
+        return render_png(data, self.box_size, self.border, self.error_correction)
+
+
+class SVGRenderer(PNGRenderer):
+    content_type = "image/svg+xml"
+    extension = "svg"
+
+    def render(self, data):
+        return render_svg(data, self.box_size, self.border, self.error_correction)
+
+
+class HTTPRenderer(QRRenderer):
+    """
+    Renders through an external QR API (api.qrserver.com by default) using
+    a pooled ``requests.Session`` with retries. At most ``max_concurrency``
+    requests are in flight per process.
+    """
+    def __init__(self, base_url="https://api.qrserver.com/v1/create-qr-code/", size="300x300",
+                 timeout=3, retries=2, max_concurrency=8):
+        self.base_url = base_url
+        self.size = size
+        self.timeout = timeout
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self._session = None
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def __getstate__(self):
+        state = dict(self.__dict__, _session=None)
+        del state["_slots"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(total=self.retries, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504))
+            adapter = HTTPAdapter(pool_maxsize=self.max_concurrency, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
+    def render(self, data):
+        with self._slots:
+            resp = self.session.get(self.base_url, params={"data": data, "size": self.size}, timeout=self.timeout)
+        if resp.status_code != 200:
+            raise RuntimeError(f"QR API returned {resp.status_code}")
+        return resp.content
+
+
+RENDERERS = {
+    "png": PNGRenderer,
+    "svg": SVGRenderer,
+    "http": HTTPRenderer,
+}
+
+
+def make_renderer(backend="png", **options):
+    try:
+        renderer_class = RENDERERS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown QR renderer: {backend}")
+    return renderer_class(**options)
+
+
+def render_ticket(renderer, item):
+    """
+    Worker entry point for process pools, for use with ``functools.partial``.
+    Takes a ``(ticket_id, data)`` tuple and returns ``(ticket_id, image_bytes)``.
+    """
+    ticket_id, data = item
+    return ticket_id, renderer.render(data)
+
+
+def render_ticket_bits(item, border=4, error_correction="M"):
+    """Like render_ticket(), returning ``(ticket_id, render_bits(data))``."""
+    ticket_id, data = item
+    return ticket_id, render_bits(data, border, error_correction)
@@ -0,0 +1,95 @@
+# tickets/qr_cache.py
+"""
+Content-addressed cache of rendered QR PNGs.
+
+Images are keyed by a hash of (payload, box size), which also serves as
+the HTTP ETag. A bounded in-memory LRU sits in front of an optional disk
+directory (settings.TICKET_QR_CACHE_DIR) that can be wiped at any time.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .metrics import timed
+from .qr import render_png
+
+
+def qr_key(payload: str, box_size: int) -> str:
+    return hashlib.sha256(f"{box_size}:{payload}".encode()).hexdigest()
+
+
+class QRImageCache:
+    def __init__(self, max_bytes, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.png")
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                return data
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+    def _remember(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+qr_image_cache = QRImageCache(
+    max_bytes=getattr(settings, "TICKET_QR_CACHE_BYTES", 64 * 1024 * 1024),
+    disk_dir=getattr(settings, "TICKET_QR_CACHE_DIR", None),
+)
+
+
+def get_qr_png(payload: str, box_size: int = 10) -> bytes:
+    """Return the PNG for ``payload``, rendering it on a cache miss."""
+    key = qr_key(payload, box_size)
+    data = qr_image_cache.get(key)
+    if data is None:
+        with timed("qr"):
+            data = render_png(payload, box_size=box_size)
+        qr_image_cache.put(key, data)
+    return data
@@ -0,0 +1,223 @@
+# tickets/rollups.py
+"""
+Incremental check-in rollups for throughput and gate-load charts.
+
+CheckInRollup counts check-ins per event, gate and UTC minute. Every
+check-in is counted in the transaction that marks its ticket used: one
+upsert per scan in Ticket.check_in(), and one UPDATE (or INSERT, for a new
+minute) per event, gate and minute in scan_cache.check_in_many() and
+apply_offline_checkins(). The gate is the scanner's gate, else its device
+id, else "".
+
+Once an event has been over for settings.TICKET_ROLLUP_MINUTE_DAYS, its
+minute rows are folded into hourly ones (downsample_ended_events()).
+rebuild_rollup() recomputes an event's minute rows from Ticket.used_at,
+which records no gate, taking gates from the scan log where it can.
+"""
+import datetime
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Exists, F, OuterRef, Sum, Value
+from django.db.models.functions import Coalesce, NullIf, TruncHour, TruncMinute
+from django.utils import timezone
+
+from .models import CheckInRollup, Event, ScanAttempt, Ticket
+
+MINUTE = CheckInRollup.RESOLUTION_MINUTE
+HOUR = CheckInRollup.RESOLUTION_HOUR
+RESOLUTIONS = (MINUTE, HOUR)
+
+_utc = datetime.timezone.utc
+
+
+def bucket_start(value, resolution=MINUTE):
+    """The start of the UTC minute (or hour) holding ``value``."""
+    value = value.astimezone(_utc).replace(second=0, microsecond=0)
+    return value.replace(minute=0) if resolution == HOUR else value
+
+
+def gate_key(gate=None, device_id=None):
+    return (gate or device_id or "")[:64]
+
+
+# =============================
+# INCREMENTS
+# =============================
+def add(counts, resolution=MINUTE):
+    """
+    Add ``counts``, a mapping of ``(event_id, bucket, gate)`` to check-ins,
+    to the rollup. Keys are applied in order, so concurrent writers take
+    row locks in the same order.
+    """
+    with transaction.atomic():
+        for (event_id, bucket, gate), n in sorted(counts.items(), key=lambda kv: (str(kv[0][0]), *kv[0][1:])):
+            rows = CheckInRollup.objects.filter(event_id=event_id, resolution=resolution, bucket=bucket, gate=gate)
+            if not rows.update(count=F("count") + n):
+                _, created = CheckInRollup.objects.get_or_create(
+                    event_id=event_id, resolution=resolution, bucket=bucket, gate=gate, defaults={"count": n}
+                )
+                if not created:
+                    rows.update(count=F("count") + n)
+
+
+def add_for_ticket(tickets, at, gate=""):
+    """
+    Count one check-in at ``at`` through ``gate`` for the event of the
+    ticket in ``tickets`` (a queryset matching one ticket), resolved with a
+    subquery like EventCounter.add_for_ticket(). Call it in the check-in's
+    transaction.
+
+    This is one INSERT ... ON CONFLICT DO UPDATE (SQLite and PostgreSQL),
+    so the first check-in of a minute at a gate costs no more queries than
+    the rest.
+    """
+    connection = connections[tickets.db]
+    quote = connection.ops.quote_name
+    table = quote(CheckInRollup._meta.db_table)
+    columns = [quote(CheckInRollup._meta.get_field(name).column) for name in ("event", "resolution", "bucket", "gate")]
+    count = quote(CheckInRollup._meta.get_field("count").column)
+    source, params = tickets.values("event_id")[:1].query.get_compiler(connection=connection).as_sql()
+
+    # "WHERE 1 = 1" keeps SQLite from reading ON CONFLICT as a join constraint.
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}, {count}) "
+        f"SELECT ticket.event_id, %s, %s, %s, 1 FROM ({source}) ticket WHERE 1 = 1 "
+        f"ON CONFLICT ({', '.join(columns)}) DO UPDATE SET {count} = {table}.{count} + 1"
+    )
+    bucket = connection.ops.adapt_datetimefield_value(bucket_start(at))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (MINUTE, bucket, gate_key(gate), *params))
+
+
+def add_checkins(event_id, checkins):
+    """Add offline check-ins (dicts with ``scanned_at`` and ``device_id``) of ``event_id``."""
+    add(Counter(
+        (event_id, bucket_start(item["scanned_at"]), gate_key(item.get("gate"), item.get("device_id")))
+        for item in checkins
+    ))
+
+
+# =============================
+# TIME SERIES
+# =============================
+def series(event_id, resolution=MINUTE, gate=None, by_gate=False, since=None, until=None):
+    """
+    ``(resolution, points)`` for ``event_id``: check-ins per bucket starting
+    in [since, until), oldest first, as dicts with ``bucket`` and ``count``
+    (and ``gate`` if ``by_gate``). A minute series of an event already
+    downsampled comes back hourly, with ``resolution`` saying so.
+    """
+    rows = CheckInRollup.objects.filter(event_id=event_id)
+    if resolution == MINUTE and rows.filter(resolution=HOUR).exists():
+        resolution = HOUR
+    if resolution == MINUTE:
+        rows = rows.filter(resolution=MINUTE)
+    if gate is not None:
+        rows = rows.filter(gate=gate)
+    if since is not None:
+        rows = rows.filter(bucket__gte=since)
+    if until is not None:
+        rows = rows.filter(bucket__lt=until)
+
+    at = F("bucket") if resolution == MINUTE else TruncHour("bucket", tzinfo=_utc)
+    fields = ["gate"] if by_gate else []
+    rows = rows.values(*fields, at=at).annotate(checkins=Sum("count")).order_by("at", *fields)
+    points = []
+    for row in rows:
+        point = {"bucket": row["at"], "count": row["checkins"]}
+        if by_gate:
+            point["gate"] = row["gate"]
+        points.append(point)
+    return resolution, points
+
+
+def recent_checkins(event_ids, minutes=60, now=None):
+    """Check-ins in the last ``minutes`` per event in ``event_ids``, from the minute rows."""
+    since = bucket_start((now or timezone.now()) - timedelta(minutes=minutes - 1))
+    rows = CheckInRollup.objects.filter(event_id__in=event_ids, resolution=MINUTE, bucket__gte=since)
+    return dict(rows.values("event_id").annotate(checkins=Sum("count")).values_list("event_id", "checkins"))
+
+
+# =============================
+# RETENTION
+# =============================
+def downsample_event(event_id):
+    """Fold ``event_id``'s minute rows into hourly ones. Returns the minute rows folded."""
+    with transaction.atomic():
+        minutes = CheckInRollup.objects.filter(event_id=event_id, resolution=MINUTE)
+        hours = minutes.values("gate", at=TruncHour("bucket", tzinfo=_utc)).annotate(checkins=Sum("count"))
+        counts = {(event_id, row["at"], row["gate"]): row["checkins"] for row in hours}
+        if CheckInRollup.objects.filter(event_id=event_id, resolution=HOUR).exists():
+            # Minute rows from offline check-ins synced after a previous pass.
+            add(counts, HOUR)
+        else:
+            CheckInRollup.objects.bulk_create(
+                CheckInRollup(event_id=event_id, resolution=HOUR, bucket=bucket, gate=gate, count=n)
+                for (_, bucket, gate), n in counts.items()
+            )
+        folded, _ = minutes.delete()
+    return folded
+
+
+def downsamplable_events(now=None, days=None, events=None):
+    """Events over for ``days`` (default: settings.TICKET_ROLLUP_MINUTE_DAYS) that still have minute rows."""
+    now = now or timezone.now()
+    days = settings.TICKET_ROLLUP_MINUTE_DAYS if days is None else days
+    events = events if events is not None else Event.objects.all()
+    minutes = CheckInRollup.objects.filter(event=OuterRef("pk"), resolution=MINUTE)
+    return events.filter(end_at__lt=now - timedelta(days=days)).filter(Exists(minutes)).order_by("end_at")
+
+
+def downsample_ended_events(now=None, days=None, events=None, progress=None):
+    """
+    Downsample every event returned by downsamplable_events().
+    Returns ``(events, minute rows folded)``.
+    """
+    done = folded = 0
+    for event in downsamplable_events(now, days, events).only("id", "title", "end_at"):
+        count = downsample_event(event.id)
+        done += 1
+        folded += count
+        if progress:
+            progress(event, count)
+    return done, folded
+
+
+# =============================
+# BACKFILL
+# =============================
+def rebuild_rollup(event, from_scan_log=False):
+    """
+    Replace ``event``'s rollup with minute rows recomputed from its tickets'
+    ``used_at``, all under gate "". With ``from_scan_log``, tickets whose
+    accepted scan is still in the scan log are counted at that scan, under
+    its gate. Returns the check-ins counted. Check-ins landing while it
+    runs may be counted twice or not at all.
+    """
+    tickets = Ticket.objects.filter(event=event, used_at__isnull=False)
+    sources = []
+    if from_scan_log:
+        scans = ScanAttempt.objects.filter(ticket__in=tickets, outcome="ok")
+        sources.append(scans.values(
+            at=TruncMinute("scanned_at", tzinfo=_utc),
+            key=Coalesce(NullIf("gate", Value("")), "device_id"),
+        ))
+        tickets = tickets.exclude(Exists(ScanAttempt.objects.filter(ticket=OuterRef("pk"), outcome="ok")))
+    sources.append(tickets.values(at=TruncMinute("used_at", tzinfo=_utc), key=Value("")))
+
+    counts = Counter()
+    for rows in sources:
+        for row in rows.annotate(checkins=Count("id")).order_by():
+            counts[(row["at"], gate_key(row["key"]))] += row["checkins"]
+
+    with transaction.atomic():
+        CheckInRollup.objects.filter(event=event).delete()
+        CheckInRollup.objects.bulk_create(
+            (CheckInRollup(event=event, resolution=MINUTE, bucket=bucket, gate=gate, count=n)
+             for (bucket, gate), n in counts.items()),
+            batch_size=1000,
+        )
+    return sum(counts.values())
@@ -0,0 +1,334 @@
+# tickets/scan_cache.py
+"""
+Read-through cache of ticket and event state for the scan paths.
+
+Ticket entries live in the "tickets" cache alias, keyed by both token and
+ticket id; events live in the "events" alias. Both default to LocMemCache
+(per-process, least-recently-used entries are culled first) and can be
+pointed at a file-based or shared backend in settings.CACHES.
+Status transitions made through ``check_in`` are written through to the
+cache; saves and deletes through the ORM invalidate it.
+"""
+import uuid
+from collections import Counter, namedtuple
+
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import rollups
+from .feed import publish_check_in
+from .models import CheckInResult, Event, EventCounter, Ticket
+from .utils import verify_many
+
+TicketEntry = namedtuple("TicketEntry", ["ticket_id", "token", "event_id", "status", "used_at", "qr_image"])
+
+ENTRY_FIELDS = ("id", "token", "event_id", "status", "used_at", "qr_image")
+
+
+def _token_key(token):
+    return f"token:{token}"
+
+
+def _id_key(ticket_id):
+    return f"id:{ticket_id}"
+
+
+def _event_key(event_id):
+    return f"event:{event_id}"
+
+
+def _canonical_id(ticket_id):
+    try:
+        return str(uuid.UUID(str(ticket_id)))
+    except ValueError:
+        raise ValidationError(f"'{ticket_id}' is not a valid UUID.")
+
+
+def _entry_from_row(row):
+    ticket_id, token, event_id, status, used_at, qr_image = row
+    return TicketEntry(str(ticket_id), str(token), str(event_id), status, used_at, qr_image or "")
+
+
+# =============================
+# TICKETS
+# =============================
+def store_ticket(entry):
+    caches["tickets"].set_many({_token_key(entry.token): entry, _id_key(entry.ticket_id): entry})
+
+
+async def astore_ticket(entry):
+    await caches["tickets"].aset_many({_token_key(entry.token): entry, _id_key(entry.ticket_id): entry})
+
+
+def invalidate_ticket(ticket_id, token):
+    caches["tickets"].delete_many([_token_key(token), _id_key(ticket_id)])
+
+
+def invalidate_tickets(pairs):
+    """Invalidate many ``(ticket_id, token)`` pairs in one round trip."""
+    keys = []
+    for ticket_id, token in pairs:
+        keys += [_token_key(token), _id_key(ticket_id)]
+    if keys:
+        caches["tickets"].delete_many(keys)
+
+
+async def ainvalidate_ticket(ticket_id, token):
+    await caches["tickets"].adelete_many([_token_key(token), _id_key(ticket_id)])
+
+
+def _entry_lookup(token, ticket_id):
+    if token is not None:
+        token = _canonical_id(token)
+        return _token_key(token), {"token": token}
+    ticket_id = _canonical_id(ticket_id)
+    return _id_key(ticket_id), {"pk": ticket_id}
+
+
+def get_ticket_entry(token=None, ticket_id=None):
+    """
+    Return the TicketEntry for ``token`` or ``ticket_id``, loading it from
+    the database on a miss. Returns None if the ticket does not exist.
+    Raises ValidationError if the token or id is not a UUID.
+    """
+    key, lookup = _entry_lookup(token, ticket_id)
+    entry = caches["tickets"].get(key)
+    if entry is None:
+        row = Ticket.objects.filter(**lookup).values_list(*ENTRY_FIELDS).first()
+        if row is None:
+            return None
+        entry = _entry_from_row(row)
+        store_ticket(entry)
+    return entry
+
+
+async def aget_ticket_entry(token=None, ticket_id=None):
+    """Async variant of get_ticket_entry()."""
+    key, lookup = _entry_lookup(token, ticket_id)
+    entry = await caches["tickets"].aget(key)
+    if entry is None:
+        row = await Ticket.objects.filter(**lookup).values_list(*ENTRY_FIELDS).afirst()
+        if row is None:
+            return None
+        entry = _entry_from_row(row)
+        await astore_ticket(entry)
+    return entry
+
+
+def build_ticket(entry):
+    """Build an unsaved Ticket (with its cached event) for rendering."""
+    return Ticket(
+        id=entry.ticket_id,
+        token=entry.token,
+        event=get_event(entry.event_id),
+        status=entry.status,
+        used_at=entry.used_at,
+        qr_image=entry.qr_image,
+    )
+
+
+async def abuild_ticket(entry):
+    """Async variant of build_ticket()."""
+    return Ticket(
+        id=entry.ticket_id,
+        token=entry.token,
+        event=await aget_event(entry.event_id),
+        status=entry.status,
+        used_at=entry.used_at,
+        qr_image=entry.qr_image,
+    )
+
+
+# =============================
+# EVENTS
+# =============================
+def get_event(event_id):
+    key = _event_key(event_id)
+    event = caches["events"].get(key)
+    if event is None:
+        event = Event.objects.filter(pk=event_id).first()
+        if event is not None:
+            caches["events"].set(key, event)
+    return event
+
+
+async def aget_event(event_id):
+    key = _event_key(event_id)
+    event = await caches["events"].aget(key)
+    if event is None:
+        event = await Event.objects.filter(pk=event_id).afirst()
+        if event is not None:
+            await caches["events"].aset(key, event)
+    return event
+
+
+def invalidate_event(event_id):
+    caches["events"].delete(_event_key(event_id))
+
+
+def warm_event(event, chunk_size=2000):
+    """Load every ticket of ``event`` into the cache. Returns the count."""
+    caches["events"].set(_event_key(event.id), event)
+    batch = {}
+    count = 0
+    rows = Ticket.objects.filter(event=event).values_list(*ENTRY_FIELDS).iterator(chunk_size=chunk_size)
+    for row in rows:
+        entry = _entry_from_row(row)
+        batch[_token_key(entry.token)] = entry
+        batch[_id_key(entry.ticket_id)] = entry
+        count += 1
+        if len(batch) >= chunk_size:
+            caches["tickets"].set_many(batch)
+            batch = {}
+    if batch:
+        caches["tickets"].set_many(batch)
+    return count
+
+
+# =============================
+# CHECK-IN
+# =============================
+def check_in(token=None, ticket_id=None, gate=""):
+    """
+    Cached front for ``Ticket.check_in``; ``gate`` is passed through.
+
+    Rejections that the cached state already explains (used, invalid, or
+    the event has ended) are answered without touching the database; only
+    the status transition itself is written.
+    Returns ``(CheckInResult, TicketEntry | None)``.
+    """
+    entry = get_ticket_entry(token=token, ticket_id=ticket_id)
+    if entry is None:
+        return Ticket.rejection("not_found"), None
+
+    event = get_event(entry.event_id)
+    rejection = Ticket.rejection_for(entry.status, event.end_at, entry.used_at)
+    if rejection is not None:
+        return rejection, entry
+
+    result = Ticket.check_in(pk=entry.ticket_id, gate=gate)
+    if result.success:
+        entry = entry._replace(status=Ticket.STATUS_USED, used_at=result.used_at)
+        store_ticket(entry)
+        publish_check_in(entry.event_id, entry.ticket_id, result.used_at, "scan")
+        return result, entry
+
+    # Cached entry was stale; reload what the database now holds.
+    invalidate_ticket(entry.ticket_id, entry.token)
+    if result.reason == "not_found":
+        return result, None
+    return result, get_ticket_entry(ticket_id=entry.ticket_id)
+
+
+async def acheck_in(token=None, ticket_id=None, gate=""):
+    """Async variant of check_in()."""
+    entry = await aget_ticket_entry(token=token, ticket_id=ticket_id)
+    if entry is None:
+        return Ticket.rejection("not_found"), None
+
+    event = await aget_event(entry.event_id)
+    rejection = Ticket.rejection_for(entry.status, event.end_at, entry.used_at)
+    if rejection is not None:
+        return rejection, entry
+
+    result = await Ticket.acheck_in(pk=entry.ticket_id, gate=gate)
+    if result.success:
+        entry = entry._replace(status=Ticket.STATUS_USED, used_at=result.used_at)
+        await astore_ticket(entry)
+        publish_check_in(entry.event_id, entry.ticket_id, result.used_at, "scan")
+        return result, entry
+
+    await ainvalidate_ticket(entry.ticket_id, entry.token)
+    if result.reason == "not_found":
+        return result, None
+    return result, await aget_ticket_entry(ticket_id=entry.ticket_id)
+
+
+def check_in_many(items, event_id=None, gate=""):
+    """
+    Check in a batch of ``(ticket_id, signature, compact)`` items (canonical
+    ids, or None for an unreadable item; ``compact`` if the signature is a
+    compact payload's truncated MAC) with one IN query, one signature pass and
+    one transaction of set-based UPDATEs, counted in the check-in rollup
+    under ``gate``. A ticket of another event than ``event_id`` counts as
+    not found, and a ticket repeated within the batch is only checked in
+    once.
+    Returns a CheckInResult per item, in input order.
+    """
+    rows = Ticket.objects.filter(pk__in={tid for tid, _, _ in items if tid}).values_list(*ENTRY_FIELDS)
+    entries = {entry.ticket_id: entry for entry in map(_entry_from_row, rows)}
+    events = {eid: get_event(eid) for eid in {entry.event_id for entry in entries.values()}}
+
+    results = [None] * len(items)
+    candidates = []
+    for i, (ticket_id, sig, compact) in enumerate(items):
+        entry = entries.get(ticket_id)
+        if entry is None or (event_id and entry.event_id != str(event_id)):
+            results[i] = Ticket.rejection("not_found")
+        else:
+            candidates.append((i, entry, sig, compact))
+
+    now = timezone.now()
+    claimed = {}
+    repeats = []
+    valid = verify_many(
+        (entry.ticket_id, sig, events[entry.event_id], compact) for _, entry, sig, compact in candidates
+    )
+    for (i, entry, _, _), ok in zip(candidates, valid):
+        if not ok:
+            results[i] = Ticket.rejection("invalid_signature")
+        elif entry.ticket_id in claimed:
+            repeats.append((i, entry.ticket_id))
+        else:
+            results[i] = Ticket.rejection_for(entry.status, events[entry.event_id].end_at, entry.used_at, now)
+            if results[i] is None:
+                claimed[entry.ticket_id] = i
+
+    won = set()
+    if claimed:
+        with transaction.atomic():
+            Ticket.objects.filter(pk__in=claimed, status=Ticket.STATUS_ACTIVE, event__end_at__gte=now).update(
+                status=Ticket.STATUS_USED, used_at=now, updated_at=now
+            )
+            won = {str(pk) for pk in Ticket.objects.filter(
+                pk__in=claimed, status=Ticket.STATUS_USED, used_at=now
+            ).values_list("pk", flat=True)}
+            checkins = Counter(entries[tid].event_id for tid in won)
+            for eid, count in checkins.items():
+                EventCounter.add(eid, used=count)
+            rollups.add({(eid, rollups.bucket_start(now), rollups.gate_key(gate)): n for eid, n in checkins.items()})
+
+    for ticket_id, i in claimed.items():
+        entry = entries[ticket_id]
+        if ticket_id in won:
+            results[i] = CheckInResult(True, "ok", "Ticket successfully validated!", now)
+            store_ticket(entry._replace(status=Ticket.STATUS_USED, used_at=now))
+            publish_check_in(entry.event_id, ticket_id, now, "scan")
+        else:
+            # Changed under us since the read; explain from the fresh state.
+            invalidate_ticket(ticket_id, entry.token)
+            fresh = get_ticket_entry(ticket_id=ticket_id)
+            if fresh is None:
+                results[i] = Ticket.rejection("not_found")
+            else:
+                results[i] = Ticket.rejection_for(fresh.status, events[fresh.event_id].end_at, fresh.used_at) or (
+                    Ticket.rejection("invalid", status=fresh.status)
+                )
+    for i, ticket_id in repeats:
+        first = results[claimed[ticket_id]]
+        results[i] = Ticket.rejection("already_used", used_at=first.used_at) if first.success else first
+    return results
+
+
+@receiver([post_save, post_delete], sender=Ticket)
+def _invalidate_ticket_on_change(sender, instance, **kwargs):
+    invalidate_ticket(instance.pk, instance.token)
+
+
+@receiver([post_save, post_delete], sender=Event)
+def _invalidate_event_on_change(sender, instance, **kwargs):
+    invalidate_event(instance.pk)
@@ -0,0 +1,179 @@
+# tickets/scan_log.py
+"""
+Buffered writer for the ScanAttempt log.
+
+Scan views call record(), which only appends to an in-process buffer; a
+background thread writes the buffer with one bulk_create once it holds
+settings.TICKET_SCAN_LOG_BATCH_SIZE attempts or its oldest attempt has
+waited settings.TICKET_SCAN_LOG_FLUSH_SECONDS, so no scan waits on an
+INSERT. Attempts still buffered when a process dies are lost: at most one
+flush interval's worth. The buffer holds at most
+settings.TICKET_SCAN_LOG_MAX_PENDING attempts; past that (e.g. while the
+database is unreachable) the oldest are dropped and counted in
+tickets_scan_attempts_dropped_total. Nothing else depends on the log:
+check-ins are counted in the check-in rollup (tickets/rollups.py) when
+they are made.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import rollups
+from .metrics import registry
+from .models import ScanAttempt
+from .shield import device_id
+
+logger = logging.getLogger("tickets.scan_log")
+
+ATTEMPTS_WRITTEN = registry.counter("tickets_scan_attempts_written_total", "Scan attempts written to the log.")
+ATTEMPTS_DROPPED = registry.counter(
+    "tickets_scan_attempts_dropped_total", "Scan attempts lost to a full buffer or a failed write.", ("cause",)
+)
+
+
+def _canonical(value):
+    try:
+        return uuid.UUID(str(value)) if value else None
+    except ValueError:
+        return None
+
+
+def gate_id(request, data=None):
+    """The scanner's gate, from the JSON body or the X-Gate header."""
+    if isinstance(data, dict) and data.get("gate"):
+        return str(data["gate"])
+    return request.headers.get("X-Gate", "")
+
+
+def rollup_gate(request, data=None):
+    """The key a check-in by this scanner is counted under in the check-in rollup."""
+    return rollups.gate_key(gate_id(request, data), device_id(request, data))
+
+
+class ScanLogBuffer:
+    def __init__(self, batch_size=500, flush_seconds=2.0, max_pending=50000):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def append(self, attempt):
+        """Queue ``attempt`` (an unsaved ScanAttempt); never touches the database."""
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                ATTEMPTS_DROPPED.inc(cause="buffer_full")
+            self._pending.append(attempt)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._cond.notify()
+            elif len(self._pending) >= self.batch_size:
+                self._cond.notify()
+            self._ensure_writer()
+
+    def flush(self):
+        """Write everything buffered now, from the calling thread."""
+        with self._cond:
+            batch = self._take()
+        self._write(batch)
+
+    def _ensure_writer(self):
+        # Started on first use, and again in a forked worker (threads don't survive fork).
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="scan-log-writer", daemon=True)
+            self._thread.start()
+
+    def _take(self):
+        batch = list(self._pending)
+        self._pending.clear()
+        self._oldest = None
+        return batch
+
+    def _wait_time(self):
+        if self._oldest is None:
+            return None
+        if len(self._pending) >= self.batch_size:
+            return 0
+        return max(self._oldest + self.flush_seconds - time.monotonic(), 0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                timeout = self._wait_time()
+                while timeout != 0:
+                    self._cond.wait(timeout)
+                    timeout = self._wait_time()
+                batch = self._take()
+            self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        with self._write_lock:
+            try:
+                close_old_connections()
+                ScanAttempt.objects.bulk_create(batch, batch_size=self.batch_size)
+            except Exception:
+                logger.exception("Could not write %d scan attempts", len(batch))
+                ATTEMPTS_DROPPED.inc(len(batch), cause="write_error")
+            else:
+                ATTEMPTS_WRITTEN.inc(len(batch))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ScanLogBuffer(
+                    batch_size=getattr(settings, "TICKET_SCAN_LOG_BATCH_SIZE", 500),
+                    flush_seconds=getattr(settings, "TICKET_SCAN_LOG_FLUSH_SECONDS", 2),
+                    max_pending=getattr(settings, "TICKET_SCAN_LOG_MAX_PENDING", 50000),
+                )
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def record(request, outcome, ticket_id=None, event_id=None, data=None):
+    """
+    Log a scan made by ``request`` with ``outcome`` (a CheckInResult or
+    shield.Rejection reason). ``ticket_id`` and ``event_id`` are kept only
+    if they are UUIDs; ``data`` is the JSON body, for device and gate.
+    Safe to call from async views: it never blocks on the database.
+    """
+    # Not logged: the buffer would fill with the flood the limit absorbs.
+    # tickets_shield_rejections_total counts them.
+    if outcome == "rate_limited" or not getattr(settings, "TICKET_SCAN_LOG", True):
+        return
+    get_buffer().append(ScanAttempt(
+        ticket_id=_canonical(ticket_id),
+        event_id=_canonical(event_id),
+        outcome=outcome,
+        device_id=device_id(request, data)[:64],
+        gate=gate_id(request, data)[:64],
+        scanned_at=timezone.now(),
+    ))
+
+
+def flush():
+    """Write any buffered attempts now (e.g. before reading the log back)."""
+    if _buffer is not None:
+        _buffer.flush()
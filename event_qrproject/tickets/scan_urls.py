@@ -0,0 +1,23 @@
+# tickets/scan_urls.py
+"""
+URL patterns of a scan-only node (event_qrproject.settings_scan): the
+validation and offline-sync endpoints plus the metrics scrape, at the same
+paths and names as in tickets/urls.py. Imports none of the issuance,
+export or QR modules.
+"""
+from django.urls import path
+
+from . import async_views, metrics, validation_views
+
+urlpatterns = [
+    path("api/validate/", validation_views.validate_ticket_api, name="api_validate_ticket"),
+    path("api/async/validate/", async_views.validate_ticket_api, name="api_validate_ticket_async"),
+    path("api/validate/batch/", validation_views.validate_tickets_batch_api, name="api_validate_tickets_batch"),
+    path("api/events/<uuid:event_id>/manifest/", validation_views.offline_manifest_api, name="api_offline_manifest"),
+    path("api/events/<uuid:event_id>/checkins/", validation_views.offline_checkins_api, name="api_offline_checkins"),
+    path("metrics/", metrics.metrics_view, name="metrics"),
+
+    # Validation URL using token from QR code
+    path("validate/<uuid:token>/", validation_views.validate_ticket, name="validate_ticket"),
+    path("async/validate/<uuid:token>/", async_views.validate_ticket, name="validate_ticket_async"),
+]
@@ -4,9 +4,46 @@ from .models import Ticket, Event
 class TicketRegisterSerializer(serializers.Serializer):
     event_id = serializers.UUIDField()
 
+class TicketBulkIssueSerializer(serializers.Serializer):
+    event_id = serializers.UUIDField()
+    count = serializers.IntegerField(min_value=1, max_value=200000)
+    render_qr = serializers.BooleanField(default=True)
+
+class OfflineCheckInSerializer(serializers.Serializer):
+    ticket_id = serializers.UUIDField()
+    scanned_at = serializers.DateTimeField()
+    device_id = serializers.CharField(max_length=100, required=False)
+    # The signature read from the ticket's QR code, checked against the event's key.
+    signature = serializers.CharField(max_length=255)
+
+class OfflineCheckInBatchSerializer(serializers.Serializer):
+    device_id = serializers.CharField(max_length=100, required=False)
+    checkins = OfflineCheckInSerializer(many=True, allow_empty=False, max_length=5000)
+
+class BatchValidationSerializer(serializers.Serializer):
+    payloads = serializers.ListField(
+        child=serializers.CharField(max_length=255, trim_whitespace=False), allow_empty=False, max_length=100
+    )
+    event_id = serializers.UUIDField(required=False)
+    device_id = serializers.CharField(max_length=100, required=False)
+
+class EventListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Event
+        fields = ("id", "title", "location", "start_at", "end_at")
+        read_only_fields = fields
+
+class TicketListSerializer(serializers.ModelSerializer):
+    event_title = serializers.CharField(source="event.title", read_only=True)
+    class Meta:
+        model = Ticket
+        fields = ("id", "event", "event_title", "status", "created_at", "used_at")
+        read_only_fields = fields
+
 class TicketResponseSerializer(serializers.ModelSerializer):
     event_title = serializers.CharField(source="event.title", read_only=True)
+    qr_url = serializers.CharField(source="qr_image_url", read_only=True)
     class Meta:
         model = Ticket
-        fields = ("id", "event", "event_title", "status", "created_at", "used_at", "qr_image", "signature")
+        fields = ("id", "event", "event_title", "status", "created_at", "used_at", "qr_image", "qr_url", "signature")
         read_only_fields = fields
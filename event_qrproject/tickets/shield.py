@@ -0,0 +1,390 @@
+# tickets/shield.py
+"""
+Cheap rejection of junk traffic on the public scan endpoints, before any
+HMAC or database work:
+
+* token-bucket rate limits per client IP and per scanner device
+  (settings.TICKET_RATE_LIMITS);
+* a negative cache of ticket ids, tokens and signatures that were recently
+  rejected as not found or forged (settings.TICKET_NEGATIVE_CACHE_TTL);
+* a Bloom filter of each event's ticket ids and tokens, consulted when the
+  scanner says which event it is gating (``event_id`` in the request).
+
+Buckets, rejections and filter generations live in the "shield" cache
+alias. Filters themselves are built per process from the database, in a
+background thread, never on the request path. Creating tickets (through
+the ORM or issue_tickets()) bumps the event's generation once committed
+and adds them to this process's filter; other processes see their filter
+go stale and rebuild it, as does every process after
+settings.TICKET_BLOOM_TTL seconds. Only a current filter rejects: while
+an event has none, or a stale one, its scans go on to the database.
+With a per-process cache, tickets issued from another process (e.g. the
+issue_tickets command) are only seen once that TTL has passed; point the
+"shield" alias at a shared cache to avoid that.
+"""
+import hashlib
+import logging
+import math
+import random
+import struct
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .metrics import registry
+from .models import Ticket
+
+logger = logging.getLogger("tickets.shield")
+
+Rejection = namedtuple("Rejection", ["reason", "status", "retry_after"])
+
+REJECTION_STATUS = {
+    "rate_limited": 429,
+    "not_found": 404,
+    "invalid_signature": 403,
+}
+
+SHIELD_REJECTIONS = registry.counter(
+    "tickets_shield_rejections_total", "Scan requests rejected before reaching the database.", ("reason",)
+)
+
+
+def _reject(reason, retry_after=None):
+    SHIELD_REJECTIONS.inc(reason=reason)
+    return Rejection(reason, REJECTION_STATUS[reason], retry_after)
+
+
+def _canonical(value):
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def client_ip(request):
+    """The client address; set REMOTE_ADDR from the proxy header when behind one."""
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def device_id(request, data=None):
+    """The scanner's device id, from the JSON body or the X-Device-ID header."""
+    if isinstance(data, dict) and data.get("device_id"):
+        return str(data["device_id"])
+    return request.headers.get("X-Device-ID", "")
+
+
+# =============================
+# RATE LIMITS
+# =============================
+def _bucket_key(scope, key):
+    return "bucket:" + scope + ":" + hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+
+def _refill(state, now, rate, burst, cost=1):
+    tokens, stamp = state or (burst, now)
+    tokens = min(burst, tokens + (now - stamp) * rate)
+    if tokens < cost:
+        return (tokens, now), (min(cost, burst) - tokens) / rate
+    return (tokens - cost, now), 0
+
+
+def _limits(request, data):
+    limits = getattr(settings, "TICKET_RATE_LIMITS", {})
+    keys = {"ip": client_ip(request), "device": device_id(request, data)}
+    for scope, limit in limits.items():
+        if limit and keys.get(scope):
+            rate, burst = limit
+            yield _bucket_key(scope, keys[scope]), rate, burst
+
+
+def take(request, data=None, cost=1):
+    """
+    Take ``cost`` tokens (one per scan) from the caller's IP and device
+    buckets. Returns 0, or the seconds to wait before retrying.
+    """
+    cache = caches["shield"]
+    wait = 0
+    for key, rate, burst in _limits(request, data):
+        state, retry_after = _refill(cache.get(key), time.time(), rate, burst, cost)
+        cache.set(key, state, math.ceil(burst / rate) + 1)
+        wait = max(wait, retry_after)
+    return wait
+
+
+async def atake(request, data=None):
+    """Async variant of take()."""
+    cache = caches["shield"]
+    wait = 0
+    for key, rate, burst in _limits(request, data):
+        state, retry_after = _refill(await cache.aget(key), time.time(), rate, burst)
+        await cache.aset(key, state, math.ceil(burst / rate) + 1)
+        wait = max(wait, retry_after)
+    return wait
+
+
+# =============================
+# NEGATIVE CACHE
+# =============================
+def _negative_keys(ticket_id=None, token=None, sig=None):
+    keys = {}
+    if token is not None:
+        keys["not_found"] = f"neg:token:{str(token).lower()}"
+    elif ticket_id is not None:
+        keys["not_found"] = f"neg:id:{str(ticket_id).lower()}"
+        if sig is not None:
+            digest = hashlib.blake2b(f"{ticket_id}|{sig}".lower().encode(), digest_size=16).hexdigest()
+            keys["invalid_signature"] = f"neg:sig:{digest}"
+    return keys
+
+
+def remember_rejection(reason, ticket_id=None, token=None, sig=None):
+    """Record a not_found or invalid_signature outcome for later requests."""
+    key = _negative_keys(ticket_id, token, sig).get(reason)
+    if key:
+        caches["shield"].set(key, True, getattr(settings, "TICKET_NEGATIVE_CACHE_TTL", 300))
+
+
+def forget_rejections(items):
+    """
+    Drop the cached rejections of ``(ticket_id, token, sig)`` items, e.g.
+    once their tickets have been re-signed. ``sig`` may be None.
+    """
+    keys = []
+    for ticket_id, token, sig in items:
+        keys += _negative_keys(ticket_id=ticket_id, sig=sig).values()
+        keys += _negative_keys(token=token).values()
+    if keys:
+        caches["shield"].delete_many(keys)
+
+
+async def aremember_rejection(reason, ticket_id=None, token=None, sig=None):
+    """Async variant of remember_rejection()."""
+    key = _negative_keys(ticket_id, token, sig).get(reason)
+    if key:
+        await caches["shield"].aset(key, True, getattr(settings, "TICKET_NEGATIVE_CACHE_TTL", 300))
+
+
+def _negative_hit(found, keys):
+    for reason, key in keys.items():
+        if key in found:
+            return reason
+    return None
+
+
+# =============================
+# BLOOM FILTERS
+# =============================
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def to_bytes(self):
+        return struct.pack(">IB", self.size, self.hashes) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hashes = struct.unpack_from(">IB", data)
+        bloom.bits = bytearray(data[5:])
+        return bloom
+
+
+# event_id -> (generation, expires_at, BloomFilter), per process
+_filters = {}
+# events whose filter is being built in the background
+_building = set()
+_filters_lock = threading.Lock()
+
+
+def _generation_key(event_id):
+    return f"bloomgen:{event_id}"
+
+
+def bump_event(event_id):
+    """
+    Mark ``event_id``'s Bloom filters stale, e.g. after deleting or
+    re-signing its tickets. Returns the new generation.
+    """
+    cache = caches["shield"]
+    try:
+        return cache.incr(_generation_key(event_id))
+    except ValueError:
+        # Not set (or evicted): any filter built before is stale anyway.
+        generation = random.getrandbits(62)
+        cache.set(_generation_key(event_id), generation, None)
+        return generation
+
+
+def add_tickets(event_id, items):
+    """
+    Record new ``(ticket_id, token)`` items of ``event_id``; call once they
+    are committed. Bumps the event's generation, so other processes rebuild
+    their filters, and adds the items to this process's filter, which stays
+    current if no other process bumped the generation in between.
+    """
+    event_id = str(event_id)
+    generation = bump_event(event_id)
+    with _filters_lock:
+        cached = _filters.get(event_id)
+        if cached and cached[0] == generation - 1:
+            for ticket_id, token in items:
+                cached[2].add(str(ticket_id))
+                cached[2].add(str(token))
+            _filters[event_id] = (generation, cached[1], cached[2])
+
+
+def _current_generation(found, event_id):
+    generation = found.get(_generation_key(event_id))
+    if generation is None:
+        caches["shield"].add(_generation_key(event_id), random.getrandbits(62), None)
+        generation = caches["shield"].get(_generation_key(event_id))
+    return generation
+
+
+def _cached_filter(event_id, generation):
+    with _filters_lock:
+        cached = _filters.get(event_id)
+    if cached and cached[0] == generation and cached[1] > time.monotonic():
+        return cached[2]
+    return None
+
+
+def build_filter(event_id, generation):
+    """(Re)build the Bloom filter of ``event_id``'s ticket ids and tokens."""
+    tickets = Ticket.objects.filter(event_id=event_id)
+    count = tickets.count()
+    # Room for tickets added to it later by add_tickets().
+    bloom = BloomFilter(2 * (count + count // 4 + 64), getattr(settings, "TICKET_BLOOM_ERROR_RATE", 0.001))
+    for ticket_id, token in tickets.values_list("id", "token").iterator(chunk_size=5000):
+        bloom.add(str(ticket_id))
+        bloom.add(str(token))
+    expires = time.monotonic() + getattr(settings, "TICKET_BLOOM_TTL", 300)
+    with _filters_lock:
+        _filters[event_id] = (generation, expires, bloom)
+    return bloom
+
+
+def _build_in_background(event_id, generation):
+    try:
+        build_filter(event_id, generation)
+    except Exception:
+        logger.exception("Building the Bloom filter of event %s failed", event_id)
+    finally:
+        connection.close()
+        with _filters_lock:
+            _building.discard(event_id)
+
+
+def schedule_build(event_id, generation):
+    """Build ``event_id``'s filter in a background thread, unless one is already building it."""
+    with _filters_lock:
+        if event_id in _building:
+            return
+        _building.add(event_id)
+    threading.Thread(
+        target=_build_in_background, args=(event_id, generation), name=f"bloom-{event_id}", daemon=True
+    ).start()
+
+
+# =============================
+# SCREENING
+# =============================
+def _screen_keys(ticket_id, token, sig, event_id):
+    negative = _negative_keys(ticket_id, token, sig)
+    event_id = _canonical(event_id) if event_id else None
+    keys = list(negative.values())
+    if event_id:
+        keys.append(_generation_key(event_id))
+    return negative, event_id, keys
+
+
+def screen(request, data=None, ticket_id=None, token=None, sig=None, event_id=None):
+    """
+    Run the checks above for a scan of ``ticket_id`` (API) or ``token``
+    (QR link). Returns None if the request may proceed, otherwise a
+    Rejection to answer with.
+    """
+    retry_after = take(request, data)
+    if retry_after:
+        return _reject("rate_limited", retry_after)
+
+    negative, event_id, keys = _screen_keys(ticket_id, token, sig, event_id)
+    found = caches["shield"].get_many(keys)
+    reason = _negative_hit(found, negative)
+    if reason:
+        return _reject(reason)
+
+    if event_id and getattr(settings, "TICKET_BLOOM_FILTERS", True):
+        item = _canonical(ticket_id if token is None else token)
+        if item:
+            generation = _current_generation(found, event_id)
+            bloom = _cached_filter(event_id, generation)
+            if bloom is None:
+                schedule_build(event_id, generation)
+            elif item not in bloom:
+                # Not cached: the negative cache is not per event, and the
+                # ticket may belong to another one.
+                return _reject("not_found")
+    return None
+
+
+async def ascreen(request, data=None, ticket_id=None, token=None, sig=None, event_id=None):
+    """Async variant of screen()."""
+    retry_after = await atake(request, data)
+    if retry_after:
+        return _reject("rate_limited", retry_after)
+
+    negative, event_id, keys = _screen_keys(ticket_id, token, sig, event_id)
+    found = await caches["shield"].aget_many(keys)
+    reason = _negative_hit(found, negative)
+    if reason:
+        return _reject(reason)
+
+    if event_id and getattr(settings, "TICKET_BLOOM_FILTERS", True):
+        item = _canonical(ticket_id if token is None else token)
+        if item:
+            generation = found.get(_generation_key(event_id))
+            if generation is None:
+                generation = await sync_to_async(_current_generation)(found, event_id)
+            bloom = _cached_filter(event_id, generation)
+            if bloom is None:
+                schedule_build(event_id, generation)
+            elif item not in bloom:
+                # Not cached: the negative cache is not per event, and the
+                # ticket may belong to another one.
+                return _reject("not_found")
+    return None
+
+
+@receiver(post_save, sender=Ticket)
+def _add_created_ticket(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        def added():
+            add_tickets(instance.event_id, [(instance.pk, instance.token)])
+            forget_rejections([(instance.pk, instance.token, None)])
+
+        transaction.on_commit(added)
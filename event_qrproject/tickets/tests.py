@@ -1,3 +1,1255 @@
-from django.test import TestCase
+import io
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+import uuid
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    archive, feed, issuance, loadtest, metrics, print_export, qr, qr_cache, rollups, scan_cache, scan_log, shield, views,
+)
+from .expiry import expire_ended_events
+from .issuance import issue_tickets
+from .models import CheckInRollup, Event, EventArchive, EventCounter, IssueJob, ScanAttempt, Ticket
+from .offline_sync import apply_offline_checkins, ticket_digest
+from .payload import COMPACT_MAC_BYTES, COMPACT_PREFIX, b45decode, b45encode, encode_compact, parse_payload
+from .utils import build_payload, build_qr_content, make_signature, verify_many, verify_signature
+from .views import store_qr_image
+
+_media = tempfile.mkdtemp(prefix="tickets-test-media-")
+
+
+def make_event(title="Test event", starts_in=timedelta(hours=-1), lasts=timedelta(hours=6), **fields):
+    start_at = timezone.now() + starts_in
+    return Event.objects.create(title=title, start_at=start_at, end_at=start_at + lasts, **fields)
+
+
+def signed_payload(ticket):
+    return build_payload(str(ticket.id), make_signature(ticket.id, ticket.event))
+
+
+@override_settings(MEDIA_ROOT=_media, TICKET_RATE_LIMITS={}, TICKET_SCAN_LOG=False)
+class TicketTestCase(TestCase):
+    """
+    Clears the process-wide caches around each test, since they outlive
+    transactions, and keeps Bloom filter builds off background threads,
+    which cannot see the test's transaction.
+    """
+
+    def setUp(self):
+        for alias in ("tickets", "events", "shield"):
+            caches[alias].clear()
+        patcher = mock.patch.object(shield, "schedule_build")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scan(self, payload, **extra):
+        return self.client.post(reverse("api_validate_ticket"), {"payload": payload, **extra}, content_type="application/json")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(_media, ignore_errors=True)
+
+
+# =============================
+# BULK ISSUANCE
+# =============================
+class BulkIssuanceTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+
+    def test_issue_tickets_creates_signed_rows_and_counts_them(self):
+        event = make_event()
+        self.assertEqual(issue_tickets(event, 25, chunk_size=10, render_qr=False), 25)
+        self.assertEqual(Ticket.objects.filter(event=event).count(), 25)
+        self.assertFalse(Ticket.objects.filter(event=event, signature__isnull=True).exists())
+        self.assertEqual(EventCounter.objects.get(event=event).issued, 25)
+
+    def test_each_chunk_is_rendered_before_the_next_is_created(self):
+        event = make_event()
+        pool = mock.Mock()
+        pool.map.side_effect = lambda fn, items, chunksize: map(fn, items)
+        calls = []
+        issue_tickets(event, 5, chunk_size=2, pool=pool, progress=lambda *args: calls.append(args))
+
+        self.assertEqual(calls, [
+            ("created", 2, 5), ("rendered", 2, 5), ("created", 4, 5), ("rendered", 4, 5),
+            ("created", 5, 5), ("rendered", 5, 5),
+        ])
+        self.assertEqual(pool.map.call_count, 3)
+        self.assertEqual(Ticket.objects.filter(event=event, qr_image__startswith="tickets/qr_codes/").count(), 5)
+
+    def test_job_progress_is_kept_in_the_database(self):
+        event = make_event()
+        job = IssueJob.objects.create(event=event, count=5)
+        issuance.run_issue_job(job.id, event, 5, render_qr=False)
+
+        response = self.client.get(reverse("api_bulk_issue_status", args=[job.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["state"], "done")
+        self.assertEqual(response.json()["created"], 5)
+
+    def test_unknown_job_is_404(self):
+        response = self.client.get(reverse("api_bulk_issue_status", args=[uuid.uuid4()]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_issue_endpoints_are_staff_only(self):
+        event = make_event()
+        job = IssueJob.objects.create(event=event, count=5)
+        self.client.logout()
+        with mock.patch.object(views, "start_issue_job") as start:
+            response = self.client.post(reverse("api_bulk_issue"), {"event_id": str(event.id), "count": 5},
+                                        content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+        start.assert_not_called()
+        self.assertEqual(self.client.get(reverse("api_bulk_issue_status", args=[job.id])).status_code, 403)
+
+    def test_start_purges_idle_jobs_and_reuses_the_runner(self):
+        event = make_event()
+        stale = IssueJob.objects.create(event=event, count=1, state="done")
+        IssueJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        runner = mock.Mock()
+        with mock.patch.object(issuance, "_pools", return_value=(runner, None)):
+            first = issuance.start_issue_job(event, 3, render_qr=False)
+            second = issuance.start_issue_job(event, 3, render_qr=False)
+
+        self.assertFalse(IssueJob.objects.filter(pk=stale.pk).exists())
+        self.assertEqual(issuance.get_job(first)["state"], "queued")
+        self.assertNotEqual(first, second)
+        self.assertEqual(runner.submit.call_count, 2)
+
+
+# =============================
+# CHECK-IN
+# =============================
+class CheckInTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        self.ticket = Ticket.new_signed(self.event)
+        self.ticket.save()
+
+    def test_second_scan_is_a_conflict(self):
+        first = self.scan(signed_payload(self.ticket))
+        second = self.scan(signed_payload(self.ticket))
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(second.json()["reason"], "already_used")
+        self.assertEqual(EventCounter.objects.get(event=self.event).used, 1)
+
+    def test_update_is_conditional_on_the_row_not_the_cache(self):
+        # Another worker checked the ticket in after this one cached it as active.
+        scan_cache.get_ticket_entry(ticket_id=str(self.ticket.id))
+        Ticket.objects.filter(pk=self.ticket.pk).update(status=Ticket.STATUS_USED, used_at=timezone.now())
+
+        result = Ticket.check_in(pk=self.ticket.pk)
+        self.assertFalse(result.success)
+        self.assertEqual(result.reason, "already_used")
+        self.assertEqual(self.scan(signed_payload(self.ticket)).status_code, 409)
+
+    def test_ended_event_is_expired_without_rewriting_the_ticket(self):
+        Event.objects.filter(pk=self.event.pk).update(end_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(Ticket.check_in(pk=self.ticket.pk).reason, "expired")
+        self.assertEqual(Ticket.objects.get(pk=self.ticket.pk).status, Ticket.STATUS_ACTIVE)
+
+    def test_non_object_body_is_rejected(self):
+        for body in ([], "payload", 3):
+            response = self.client.post(reverse("api_validate_ticket"), json.dumps(body), content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["reason"], "invalid_payload")
+
+
+# =============================
+# SCAN CACHE
+# =============================
+class ScanCacheTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        self.ticket = Ticket.new_signed(self.event)
+        self.ticket.save()
+
+    def test_entries_are_served_from_the_cache(self):
+        scan_cache.get_ticket_entry(token=str(self.ticket.token))
+        with self.assertNumQueries(0):
+            entry = scan_cache.get_ticket_entry(token=str(self.ticket.token))
+            self.assertEqual(scan_cache.get_ticket_entry(ticket_id=str(self.ticket.id)), entry)
+        self.assertEqual(entry.status, Ticket.STATUS_ACTIVE)
+
+    def test_saving_a_ticket_invalidates_its_entries(self):
+        scan_cache.get_ticket_entry(token=str(self.ticket.token))
+        self.ticket.status = Ticket.STATUS_INVALID
+        self.ticket.save()
+        self.assertEqual(scan_cache.get_ticket_entry(token=str(self.ticket.token)).status, Ticket.STATUS_INVALID)
+        self.assertEqual(scan_cache.get_ticket_entry(ticket_id=str(self.ticket.id)).status, Ticket.STATUS_INVALID)
+
+    def test_deleting_a_ticket_invalidates_its_entries(self):
+        scan_cache.get_ticket_entry(ticket_id=str(self.ticket.id))
+        Ticket.objects.get(pk=self.ticket.pk).delete()
+        self.assertIsNone(scan_cache.get_ticket_entry(ticket_id=str(self.ticket.id)))
+
+    def test_saving_an_event_invalidates_it(self):
+        scan_cache.get_event(self.event.id)
+        self.event.end_at = timezone.now() - timedelta(minutes=1)
+        self.event.save()
+        result, _ = scan_cache.check_in(ticket_id=str(self.ticket.id))
+        self.assertEqual(result.reason, "expired")
+
+    def test_check_in_updates_the_cached_entry(self):
+        result, _ = scan_cache.check_in(token=str(self.ticket.token))
+        self.assertTrue(result.success)
+        with self.assertNumQueries(0):
+            again, entry = scan_cache.check_in(token=str(self.ticket.token))
+        self.assertEqual(again.reason, "already_used")
+        self.assertEqual(entry.status, Ticket.STATUS_USED)
+
+    def test_malformed_ids_raise_validation_error(self):
+        with self.assertRaises(ValidationError):
+            scan_cache.get_ticket_entry(ticket_id="not-a-uuid")
+
+
+# =============================
+# OFFLINE SYNC
+# =============================
+@override_settings(TICKET_SCANNER_TOKENS=["scanner-secret"])
+class OfflineSyncTests(TicketTestCase):
+    auth = {"HTTP_AUTHORIZATION": "Scanner scanner-secret"}
+
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        issue_tickets(self.event, 3, render_qr=False)
+        self.tickets = list(Ticket.objects.filter(event=self.event).select_related("event"))
+
+    def upload(self, checkins, **extra):
+        return self.client.post(
+            reverse("api_offline_checkins", args=[self.event.id]),
+            {"device_id": "handheld-1", "checkins": checkins},
+            content_type="application/json", **extra,
+        )
+
+    def item(self, ticket, signature=None, minutes_ago=5):
+        return {
+            "ticket_id": str(ticket.id),
+            "scanned_at": (timezone.now() - timedelta(minutes=minutes_ago)).isoformat(),
+            "signature": make_signature(ticket.id, self.event) if signature is None else signature,
+        }
+
+    def test_endpoints_require_a_scanner_token_or_staff(self):
+        manifest = reverse("api_offline_manifest", args=[self.event.id])
+        self.assertEqual(self.client.get(manifest).status_code, 403)
+        self.assertEqual(self.client.get(manifest, HTTP_AUTHORIZATION="Scanner wrong").status_code, 403)
+        self.assertEqual(self.upload([self.item(self.tickets[0])]).status_code, 403)
+        self.assertEqual(Ticket.objects.filter(event=self.event, status=Ticket.STATUS_USED).count(), 0)
+
+        self.assertEqual(self.client.get(manifest, HTTP_X_SCANNER_TOKEN="scanner-secret").status_code, 200)
+        staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(manifest).status_code, 200)
+
+    def test_manifest_lists_digests_not_ids(self):
+        response = self.client.get(reverse("api_offline_manifest", args=[self.event.id]), **self.auth)
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        header, rows, trailer = lines[0], lines[1:-1], lines[-1]
+        self.assertEqual(header["version"], 2)
+        self.assertEqual(trailer["count"], 3)
+        self.assertEqual({digest for digest, _ in rows}, {ticket_digest(t.id) for t in self.tickets})
+        body = json.dumps(lines)
+        self.assertFalse(any(str(t.id) in body for t in self.tickets))
+
+    def test_unsigned_items_are_refused(self):
+        item = self.item(self.tickets[0])
+        del item["signature"]
+        self.assertEqual(self.upload([item], **self.auth).status_code, 400)
+
+        applied, conflicts = apply_offline_checkins(self.event, [
+            {"ticket_id": self.tickets[0].id, "scanned_at": timezone.now(), "device_id": "x"},
+        ])
+        self.assertEqual(applied, 0)
+        self.assertEqual(conflicts[0]["reason"], "invalid_signature")
+        self.assertEqual(Ticket.objects.get(pk=self.tickets[0].pk).status, Ticket.STATUS_ACTIVE)
+
+    def test_forged_signatures_are_conflicts(self):
+        response = self.upload([self.item(self.tickets[0], signature="0" * 64)], **self.auth)
+        self.assertEqual(response.json()["applied"], 0)
+        self.assertEqual(response.json()["conflicts"][0]["reason"], "invalid_signature")
+        self.assertEqual(Ticket.objects.get(pk=self.tickets[0].pk).status, Ticket.STATUS_ACTIVE)
+
+    def test_earliest_signed_scan_wins(self):
+        first, later = self.item(self.tickets[0], minutes_ago=10), self.item(self.tickets[0], minutes_ago=2)
+        response = self.upload([later, first, self.item(self.tickets[1])], **self.auth)
+        self.assertEqual(response.json()["applied"], 2)
+        self.assertEqual([c["reason"] for c in response.json()["conflicts"]], ["duplicate_in_batch"])
+        self.assertEqual(EventCounter.objects.get(event=self.event).used, 2)
+        ticket = Ticket.objects.get(pk=self.tickets[0].pk)
+        self.assertEqual(ticket.status, Ticket.STATUS_USED)
+        self.assertEqual(ticket.used_at.isoformat(), first["scanned_at"])
+
+    def test_winners_are_applied_in_one_update(self):
+        items = [self.item(ticket, minutes_ago=i + 1) for i, ticket in enumerate(self.tickets)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(items, **self.auth)
+        self.assertEqual(response.json()["applied"], 3)
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('UPDATE "tickets_ticket"')]
+        self.assertEqual(len(updates), 1)
+        for ticket, item in zip(self.tickets, items):
+            self.assertEqual(Ticket.objects.get(pk=ticket.pk).used_at.isoformat(), item["scanned_at"])
+
+    def test_scans_dated_in_the_future_are_conflicts(self):
+        response = self.upload([self.item(self.tickets[0], minutes_ago=-10)], **self.auth)
+        self.assertEqual(response.json()["applied"], 0)
+        self.assertEqual(response.json()["conflicts"][0]["reason"], "invalid_scanned_at")
+        self.assertEqual(Ticket.objects.get(pk=self.tickets[0].pk).status, Ticket.STATUS_ACTIVE)
+
+    def test_first_upload_wins_over_an_earlier_scan(self):
+        self.scan(signed_payload(self.tickets[0]))
+        used_at = Ticket.objects.get(pk=self.tickets[0].pk).used_at
+        response = self.upload([self.item(self.tickets[0], minutes_ago=30)], **self.auth)
+        self.assertEqual(response.json()["applied"], 0)
+        self.assertEqual(response.json()["conflicts"][0]["reason"], "already_used")
+        self.assertEqual(Ticket.objects.get(pk=self.tickets[0].pk).used_at, used_at)
+
+
+# =============================
+# EXPORTS
+# =============================
+class ExportTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        issue_tickets(self.event, 4, render_qr=False)
+        Ticket.check_in(pk=Ticket.objects.filter(event=self.event).first().pk)
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+
+    def export(self, **params):
+        response = self.client.get(reverse("export_tickets", args=[self.event.id]), params)
+        return response, b"".join(response.streaming_content).decode() if response.streaming else response.content
+
+    def test_csv_has_a_header_and_one_row_per_ticket(self):
+        response, body = self.export()
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = body.splitlines()
+        self.assertEqual(lines[0], "id,status,created_at,used_at,token")
+        self.assertEqual(len(lines), 5)
+
+    def test_ndjson_filters_by_status(self):
+        response, body = self.export(format="ndjson", status="used")
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["status"], "used")
+        self.assertIsNotNone(records[0]["used_at"])
+
+    def test_unknown_format_is_rejected(self):
+        response, _ = self.export(format="xlsx")
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_is_staff_only(self):
+        self.client.logout()
+        response, body = self.export()
+        self.assertEqual(response.status_code, 302)
+        token = Ticket.objects.filter(event=self.event).first().token
+        self.assertNotIn(str(token), body.decode() if isinstance(body, bytes) else body)
+
+
+# =============================
+# QR IMAGES
+# =============================
+class QRImageTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        qr_cache.qr_image_cache.clear()
+        self.event = make_event()
+        self.ticket = Ticket.new_signed(self.event)
+        self.ticket.save()
+
+    def test_qr_is_rendered_once_and_revalidated_by_etag(self):
+        url = reverse("ticket_qr", args=[self.ticket.token])
+        with mock.patch.object(qr_cache, "render_png", return_value=b"png-bytes") as render:
+            first = self.client.get(url)
+            second = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["Content-Type"], "image/png")
+        self.assertEqual(second.content, b"png-bytes")
+        self.assertEqual(render.call_count, 1)
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_unknown_token_is_404(self):
+        self.assertEqual(self.client.get(reverse("ticket_qr", args=[uuid.uuid4()])).status_code, 404)
+
+    def test_cache_evicts_least_recently_used_entries(self):
+        cache = qr_cache.QRImageCache(max_bytes=10)
+        cache.put("a", b"12345")
+        cache.put("b", b"12345")
+        cache.get("a")
+        cache.put("c", b"12345")
+        self.assertEqual(cache.get("a"), b"12345")
+        self.assertIsNone(cache.get("b"))
+        cache.put("big", b"x" * 11)
+        self.assertIsNone(cache.get("big"))
+
+
+class QRRendererTests(TestCase):
+    def test_png_and_svg_renderers(self):
+        png = qr.make_renderer("png", box_size=2).render("hello")
+        svg = qr.make_renderer("svg").render("hello")
+        self.assertTrue(png.startswith(b"\x89PNG"))
+        self.assertIn(b"<svg", svg)
+        self.assertEqual(qr.make_renderer("svg").extension, "svg")
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            qr.make_renderer("gif")
+
+    def test_http_renderer_pickles_without_its_session(self):
+        renderer = qr.make_renderer("http", max_concurrency=2)
+        renderer._session = object()
+        clone = pickle.loads(pickle.dumps(renderer))
+        self.assertIsNone(clone._session)
+        self.assertEqual(clone.max_concurrency, 2)
+
+    def test_render_ticket_keeps_the_ticket_id(self):
+        ticket_id, image = qr.render_ticket(qr.make_renderer("png", box_size=1), ("abc", "data"))
+        self.assertEqual(ticket_id, "abc")
+        self.assertTrue(image.startswith(b"\x89PNG"))
+
+
+# =============================
+# ASYNC SCANS
+# =============================
+class AsyncScanTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        self.ticket = Ticket.new_signed(self.event)
+        self.ticket.save()
+
+    async def test_async_api_checks_in_once(self):
+        url = reverse("api_validate_ticket_async")
+        body = {"payload": signed_payload(self.ticket)}
+        first = await self.async_client.post(url, body, content_type="application/json")
+        second = await self.async_client.post(url, body, content_type="application/json")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(await Ticket.objects.filter(status=Ticket.STATUS_USED).acount(), 1)
+
+    async def test_async_api_rejects_bad_bodies(self):
+        url = reverse("api_validate_ticket_async")
+        for body in ("[]", "not json", '{"payload": "garbage"}'):
+            response = await self.async_client.post(url, body, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+
+    async def test_async_html_page(self):
+        response = await self.async_client.get(reverse("validate_ticket_async", args=[self.ticket.token]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "successfully validated")
+        missing = await self.async_client.get(reverse("validate_ticket_async", args=[uuid.uuid4()]))
+        self.assertEqual(missing.status_code, 404)
+
+
+# =============================
+# KEY ROTATION
+# =============================
+class KeyRotationTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        self.tickets = [Ticket.new_signed(self.event) for _ in range(3)]
+        Ticket.objects.bulk_create(self.tickets)
+
+    def rotate(self):
+        call_command("rotate_event_key", str(self.event.id), "--chunk-size", "2", stdout=mock.Mock())
+        self.event.refresh_from_db()
+
+    @override_settings(TICKET_ACCEPT_GLOBAL_SIGNATURES=False)
+    def test_rotation_evicts_the_cached_event_and_rejections(self):
+        old, fresh = self.tickets[0], self.tickets[1]
+        old_payload = signed_payload(old)
+        # Cache the event at the old key version, and a rejection of the new signature.
+        scan_cache.get_event(self.event.id)
+        rotated = Event(id=self.event.id, signing_key_version=self.event.signing_key_version + 1)
+        new_sig = make_signature(fresh.id, rotated)
+        shield.remember_rejection("invalid_signature", ticket_id=str(fresh.id), sig=new_sig)
+
+        with mock.patch.object(Event, "save", lambda event, **kwargs: Event.objects.filter(pk=event.pk).update(
+            signing_key_version=event.signing_key_version)):
+            # As if the command ran in another process: no post_save here.
+            self.rotate()
+
+        self.assertEqual(self.event.signing_key_version, 2)
+        self.assertEqual(Ticket.objects.get(pk=fresh.pk).signature, new_sig)
+        self.assertEqual(self.scan(build_payload(str(fresh.id), new_sig)).status_code, 200)
+        self.assertEqual(self.scan(old_payload).status_code, 403)
+
+    def test_unknown_event(self):
+        with self.assertRaises(CommandError):
+            call_command("rotate_event_key", "nope", stdout=mock.Mock())
+
+
+# =============================
+# EVENT COUNTERS
+# =============================
+class EventCounterTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        self.ticket = Ticket.new_signed(self.event)
+        self.ticket.save()
+
+    def counts(self):
+        return EventCounter.objects.filter(event=self.event).values("issued", "used", "expired").first()
+
+    def test_counters_follow_issuance_check_in_and_deletion(self):
+        issue_tickets(self.event, 2, render_qr=False)
+        Ticket.check_in(pk=self.ticket.pk)
+        self.assertEqual(self.counts(), {"issued": 3, "used": 1, "expired": 0})
+        Ticket.objects.get(pk=self.ticket.pk).delete()
+        self.assertEqual(self.counts(), {"issued": 2, "used": 0, "expired": 0})
+
+    def test_check_in_creates_a_missing_counter_row(self):
+        EventCounter.objects.filter(event=self.event).delete()
+        self.assertTrue(Ticket.check_in(pk=self.ticket.pk).success)
+        self.assertEqual(self.counts()["used"], 1)
+
+    def test_rebuild_repairs_drift(self):
+        EventCounter.objects.filter(event=self.event).update(issued=99, used=7)
+        call_command("rebuild_event_counters", str(self.event.id), stdout=mock.Mock())
+        self.assertEqual(self.counts(), {"issued": 1, "used": 0, "expired": 0})
+
+    def test_rebuild_validates_event_ids(self):
+        with self.assertRaises(CommandError):
+            call_command("rebuild_event_counters", "not-a-uuid", stdout=mock.Mock())
+        with self.assertRaises(CommandError):
+            call_command("rebuild_event_counters", str(uuid.uuid4()), stdout=mock.Mock())
+
+
+# =============================
+# CHECK-IN FEED
+# =============================
+class CheckInFeedTests(TicketTestCase):
+    def test_long_poll_returns_check_ins_after_the_cursor(self):
+        event = make_event()
+        ticket = Ticket.new_signed(event)
+        ticket.save()
+        url = reverse("api_checkin_feed", args=[event.id])
+        start = self.client.get(url, {"timeout": 0}).json()["cursor"]
+
+        self.scan(signed_payload(ticket))
+        body = self.client.get(url, {"after": start, "timeout": 0}).json()
+        self.assertEqual([c["ticket_id"] for c in body["checkins"]], [str(ticket.id)])
+        self.assertEqual(body["checkins"][0]["source"], "scan")
+        self.assertEqual(self.client.get(url, {"after": body["cursor"], "timeout": 0}).json()["checkins"], [])
+
+    def test_bad_parameters_and_unknown_event(self):
+        event = make_event()
+        self.assertEqual(self.client.get(reverse("api_checkin_feed", args=[event.id]), {"after": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_checkin_feed", args=[uuid.uuid4()])).status_code, 404)
+
+    def test_slow_subscribers_are_dropped(self):
+        broker = feed.Broker(subscriber_buffer=2, recent=3)
+        sub = broker.subscribe("e")
+        for i in range(3):
+            broker.publish("e", {"n": i})
+        self.assertTrue(sub.dropped)
+        self.assertEqual([seq for seq, _ in sub.get(0)], [1, 2])
+        self.assertEqual([seq for seq, _ in broker.recent("e", after=1)], [2, 3])
+
+
+# =============================
+# PER-EVENT SIGNING KEYS
+# =============================
+class SigningKeyTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        self.other = make_event("Other event")
+        self.ticket = Ticket.new_signed(self.event)
+        self.ticket.save()
+
+    def test_events_sign_with_different_keys(self):
+        self.assertNotEqual(make_signature(self.ticket.id, self.event), make_signature(self.ticket.id, self.other))
+        self.assertTrue(verify_signature(self.ticket.id, self.ticket.signature, self.event))
+        self.assertFalse(verify_signature(self.ticket.id, make_signature(self.ticket.id, self.other), self.event))
+
+    def test_master_key_signatures_follow_the_setting(self):
+        legacy = make_signature(self.ticket.id)
+        with override_settings(TICKET_ACCEPT_GLOBAL_SIGNATURES=True):
+            self.assertTrue(verify_signature(self.ticket.id, legacy, self.event))
+        with override_settings(TICKET_ACCEPT_GLOBAL_SIGNATURES=False):
+            self.assertFalse(verify_signature(self.ticket.id, legacy, self.event))
+
+    def test_verify_many_keeps_input_order(self):
+        good = make_signature(self.ticket.id, self.event)
+        results = verify_many([
+            (self.ticket.id, good, self.event, False),
+            (self.ticket.id, "0" * 64, self.event, False),
+            (self.ticket.id, good.upper(), self.event, False),
+            (self.ticket.id, None, self.event, False),
+            (self.ticket.id, good[:COMPACT_MAC_BYTES * 2], self.event, True),
+        ])
+        self.assertEqual(results, [True, False, True, False, True])
+
+    def test_truncated_macs_are_only_accepted_from_compact_payloads(self):
+        short = make_signature(self.ticket.id, self.event)[:COMPACT_MAC_BYTES * 2]
+        self.assertFalse(verify_signature(self.ticket.id, short, self.event))
+        self.assertTrue(verify_signature(self.ticket.id, short, self.event, truncated=True))
+        self.assertFalse(verify_signature(self.ticket.id, self.ticket.signature, self.event, truncated=True))
+
+        for body in ({"payload": build_payload(str(self.ticket.id), short)},
+                     {"ticket_id": str(self.ticket.id), "signature": short}):
+            response = self.client.post(reverse("api_validate_ticket"), body, content_type="application/json")
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(response.json()["reason"], "invalid_signature")
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, Ticket.STATUS_ACTIVE)
+
+    def test_scan_signed_for_another_event_is_forbidden(self):
+        forged = build_payload(str(self.ticket.id), make_signature(self.ticket.id, self.other))
+        with override_settings(TICKET_ACCEPT_GLOBAL_SIGNATURES=False):
+            response = self.scan(forged)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()["reason"], "invalid_signature")
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, Ticket.STATUS_ACTIVE)
+
+
+# =============================
+# COMPACT PAYLOADS
+# =============================
+class CompactPayloadTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        self.ticket = Ticket.new_signed(self.event)
+        self.ticket.save()
+        self.compact = encode_compact(self.ticket.id, self.ticket.signature)
+
+    def test_round_trip(self):
+        self.assertTrue(self.compact.startswith(COMPACT_PREFIX))
+        self.assertEqual(len(self.compact), 38)
+        self.assertEqual(b45decode(b45encode(b"\x00\xffab c")), b"\x00\xffab c")
+        ticket_id, sig, compact = parse_payload(self.compact)
+        self.assertEqual(ticket_id, str(self.ticket.id))
+        self.assertEqual(sig, self.ticket.signature[:COMPACT_MAC_BYTES * 2])
+        self.assertTrue(compact)
+        self.assertFalse(parse_payload(signed_payload(self.ticket))[2])
+
+    def test_malformed_payloads_do_not_parse(self):
+        for payload in ("T1", "T1abc", self.compact[:-3], "T1" + "~" * 36, "hello"):
+            self.assertIsNone(parse_payload(payload), payload)
+
+    def test_compact_scan_checks_in(self):
+        response = self.scan(self.compact)
+        self.assertEqual(response.status_code, 200)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, Ticket.STATUS_USED)
+
+    def test_bad_mac_is_forbidden(self):
+        bad_sig = ("0" if self.ticket.signature[0] != "0" else "1") + self.ticket.signature[1:]
+        response = self.scan(encode_compact(self.ticket.id, bad_sig))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()["reason"], "invalid_signature")
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.status, Ticket.STATUS_ACTIVE)
+
+    @override_settings(TICKET_QR_PAYLOAD="compact")
+    def test_qr_content_is_compact_when_configured(self):
+        self.assertEqual(build_qr_content(self.ticket.id, self.ticket.token, self.event), self.compact)
+
+
+# =============================
+# CHECK-IN BENCHMARK
+# =============================
+@override_settings(TICKET_SCAN_LOG=False)
+class CheckInBenchmarkTests(TransactionTestCase):
+    """Writer threads open their own connections, so the rows must be committed."""
+
+    def test_benchmark_checks_in_every_ticket_and_cleans_up(self):
+        out = io.StringIO()
+        call_command("benchmark_checkins", tickets=20, writers=1, json=True, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(result["tickets"], 20)
+        self.assertEqual(result["errors"], 0)
+        self.assertGreater(result["checkins_per_sec"], 0)
+        self.assertFalse(Event.objects.filter(title="benchmark_checkins").exists())
+
+    def test_rejects_empty_runs(self):
+        with self.assertRaises(CommandError):
+            call_command("benchmark_checkins", tickets=0)
+
+
+# =============================
+# LOAD TEST
+# =============================
+@override_settings(TICKET_RATE_LIMITS={}, TICKET_SCAN_LOG=False)
+class LoadTestTests(TransactionTestCase):
+    def setUp(self):
+        for alias in ("tickets", "events", "shield"):
+            caches[alias].clear()
+
+    def test_in_process_run_reports_every_workload_without_anomalies(self):
+        report = loadtest.run(tickets=10, register=5, concurrency=1, duplicates=2)
+        self.assertEqual(set(report["workloads"]), {"register", "scan_html", "scan_api"})
+        for stats in report["workloads"].values():
+            self.assertEqual(stats["errors"], 0)
+            self.assertIsNotNone(stats["p95_ms"])
+        self.assertFalse(any(report["anomalies"].values()), report["anomalies"])
+        self.assertFalse(Event.objects.filter(title="loadtest").exists())
+        json.dumps(report)
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertIsNone(loadtest.percentile([], 50))
+
+
+# =============================
+# REQUEST METRICS
+# =============================
+class MetricsTests(TicketTestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        registry = metrics.Registry()
+        histogram = registry.histogram("test_seconds", "Test latency.", ("view",), buckets=(0.1, 1))
+        histogram.observe(0.05, view="a")
+        histogram.observe(0.5, view="a")
+        histogram.observe(5, view="a")
+        registry.counter("test_total", "Test requests.").inc(2)
+
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE test_seconds histogram", lines)
+        self.assertIn('test_seconds_bucket{view="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{view="a",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{view="a",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{view="a"} 3', lines)
+        self.assertIn("test_total 2.0", lines)
+
+    def test_requests_are_recorded_per_view(self):
+        before = metrics.REQUESTS._values[("api_validate_ticket", "POST", "400")]
+        self.scan("")
+        self.assertEqual(metrics.REQUESTS._values[("api_validate_ticket", "POST", "400")], before + 1)
+
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('tickets_http_requests_total{view="api_validate_ticket",method="POST",status="400"}', body)
+        self.assertIn('tickets_http_request_db_queries_count{view="api_validate_ticket"}', body)
+
+    @override_settings(TICKET_QUERY_BUDGETS={"api_validate_ticket": 0})
+    def test_going_over_the_query_budget_logs_a_warning(self):
+        ticket = Ticket.new_signed(make_event())
+        ticket.save()
+        with self.assertLogs("tickets.metrics", "WARNING") as logs:
+            self.scan(signed_payload(ticket))
+        self.assertIn("budget 0", logs.output[0])
+
+
+# =============================
+# EXPIRY SWEEP
+# =============================
+class ExpirySweepTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ended = make_event("Ended", starts_in=timedelta(days=-2), lasts=timedelta(hours=3))
+        self.running = make_event("Running")
+        issue_tickets(self.ended, 5, render_qr=False)
+        issue_tickets(self.running, 2, render_qr=False)
+        self.used = Ticket.objects.filter(event=self.ended).first()
+        Ticket.objects.filter(pk=self.used.pk).update(status=Ticket.STATUS_USED, used_at=timezone.now())
+
+    def test_sweep_expires_active_tickets_of_ended_events_once(self):
+        self.assertEqual(expire_ended_events(chunk_size=2), (1, 4))
+        self.assertEqual(expire_ended_events(chunk_size=2), (0, 0))
+
+        statuses = dict(Ticket.objects.filter(event=self.ended).values_list("id", "status"))
+        self.assertEqual(statuses.pop(self.used.pk), Ticket.STATUS_USED)
+        self.assertEqual(set(statuses.values()), {Ticket.STATUS_EXPIRED})
+        self.assertFalse(Ticket.objects.filter(event=self.running).exclude(status=Ticket.STATUS_ACTIVE).exists())
+        self.assertEqual(EventCounter.objects.get(event=self.ended).expired, 4)
+        self.ended.refresh_from_db()
+        self.assertIsNotNone(self.ended.tickets_expired_at)
+
+    def test_resweep_picks_up_tickets_issued_late(self):
+        expire_ended_events()
+        issue_tickets(self.ended, 1, render_qr=False)
+        self.assertEqual(expire_ended_events(), (0, 0))
+        self.assertEqual(expire_ended_events(resweep=True), (1, 1))
+
+    def test_command_rejects_bad_event_ids(self):
+        with self.assertRaises(CommandError):
+            call_command("expire_tickets", event_ids=["not-a-uuid"], stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command("expire_tickets", event_ids=[str(uuid.uuid4())], stdout=io.StringIO())
+
+
+# =============================
+# SCAN SHIELD BLOOM FILTERS
+# =============================
+@mock.patch.object(shield, "schedule_build")
+class BloomFilterTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        shield._filters.clear()
+        self.event = make_event()
+        self.ticket = Ticket.new_signed(self.event)
+        self.ticket.save()
+
+    def scan_at_gate(self, ticket_id):
+        payload = build_payload(str(ticket_id), make_signature(ticket_id, self.event))
+        return self.scan(payload, event_id=str(self.event.id))
+
+    def shield_rejections(self):
+        return shield.SHIELD_REJECTIONS._values[("not_found",)]
+
+    def build(self):
+        event_id = str(self.event.id)
+        shield.build_filter(event_id, shield._current_generation({}, event_id))
+
+    def test_without_a_filter_scans_go_to_the_database(self, schedule_build):
+        before = self.shield_rejections()
+        self.assertEqual(self.scan_at_gate(uuid.uuid4()).status_code, 404)
+        self.assertEqual(self.shield_rejections(), before)
+        schedule_build.assert_called_once()
+        self.assertNotIn(str(self.event.id), shield._filters)
+
+    def test_current_filter_rejects_unknown_tickets(self, schedule_build):
+        self.build()
+        before = self.shield_rejections()
+        self.assertEqual(self.scan_at_gate(uuid.uuid4()).status_code, 404)
+        self.assertEqual(self.shield_rejections(), before + 1)
+        self.assertEqual(self.scan_at_gate(self.ticket.id).status_code, 200)
+        schedule_build.assert_not_called()
+
+    def test_tickets_created_here_are_added_to_the_filter(self, schedule_build):
+        self.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            late = Ticket.new_signed(self.event)
+            late.save()
+        issue_tickets(self.event, 3, render_qr=False)
+        bulk = Ticket.objects.filter(event=self.event).exclude(pk__in=[self.ticket.pk, late.pk]).first()
+
+        self.assertEqual(self.scan_at_gate(late.id).status_code, 200)
+        self.assertEqual(self.scan_at_gate(bulk.id).status_code, 200)
+        schedule_build.assert_not_called()
+
+    def test_scan_at_the_wrong_gate_does_not_block_the_ticket(self, schedule_build):
+        other = make_event("Other event")
+        wrong_gate = {"event_id": str(other.id)}
+        self.assertEqual(self.scan(signed_payload(self.ticket), **wrong_gate).status_code, 404)
+        shield.build_filter(str(other.id), shield._current_generation({}, str(other.id)))
+        self.assertEqual(self.scan(signed_payload(self.ticket), **wrong_gate).status_code, 404)
+
+        self.assertEqual(self.scan_at_gate(self.ticket.id).status_code, 200)
+        self.assertEqual(self.scan(signed_payload(self.ticket)).status_code, 409)
+
+    def test_stale_filter_falls_back_to_the_database(self, schedule_build):
+        self.build()
+        # Tickets created by another process only bump the generation here.
+        late = Ticket.new_signed(self.event)
+        late.save()
+        shield.bump_event(self.event.id)
+
+        self.assertEqual(self.scan_at_gate(late.id).status_code, 200)
+        schedule_build.assert_called_once()
+
+
+class BloomFilterBuildTests(TestCase):
+    def test_one_background_build_per_event(self):
+        with mock.patch.object(shield.threading, "Thread") as thread:
+            shield.schedule_build("e", 1)
+            shield.schedule_build("e", 2)
+        thread.assert_called_once()
+        target, args = thread.call_args.kwargs["target"], thread.call_args.kwargs["args"]
+        with mock.patch.object(shield, "build_filter") as build, mock.patch.object(shield, "connection"):
+            target(*args)
+        build.assert_called_once_with("e", 1)
+        self.assertNotIn("e", shield._building)
+
+
+# =============================
+# BATCH VALIDATION
+# =============================
+class BatchValidationTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        issue_tickets(self.event, 3, render_qr=False)
+        self.tickets = list(Ticket.objects.filter(event=self.event).order_by("id"))
+
+    def scan_batch(self, payloads, **extra):
+        return self.client.post(
+            reverse("api_validate_tickets_batch"), {"payloads": payloads, **extra}, content_type="application/json"
+        )
+
+    def test_results_follow_the_payload_order(self):
+        a, b, c = self.tickets
+        forged = build_payload(str(a.id), "0" * 64)
+        payloads = [signed_payload(c), "garbage", signed_payload(a), signed_payload(c), forged, signed_payload(b)]
+        response = self.scan_batch(payloads)
+        self.assertEqual(response.status_code, 200)
+
+        results = response.json()["results"]
+        self.assertEqual([r["code"] for r in results], [200, 400, 200, 409, 403, 200])
+        self.assertEqual(
+            [r["ticket_id"] for r in results],
+            [str(c.id), None, str(a.id), str(c.id), str(a.id), str(b.id)],
+        )
+        self.assertEqual(results[3]["reason"], "already_used")
+        self.assertEqual(EventCounter.objects.get(event=self.event).used, 3)
+
+    def test_event_id_limits_the_batch_to_one_event(self):
+        other = Ticket.new_signed(make_event("Other event"))
+        other.save()
+        payloads = [signed_payload(other), signed_payload(self.tickets[0])]
+        results = self.scan_batch(payloads, event_id=str(self.event.id)).json()["results"]
+        self.assertEqual([r["code"] for r in results], [404, 200])
+
+    def test_truncated_macs_only_pass_in_compact_payloads(self):
+        a, b, _ = self.tickets
+        short = build_payload(str(a.id), a.signature[:COMPACT_MAC_BYTES * 2])
+        results = self.scan_batch([short, encode_compact(b.id, b.signature)]).json()["results"]
+        self.assertEqual([r["code"] for r in results], [403, 200])
+
+    def test_empty_or_oversized_batches_are_rejected(self):
+        self.assertEqual(self.scan_batch([]).status_code, 400)
+        self.assertEqual(self.scan_batch([signed_payload(self.tickets[0])] * 101).status_code, 400)
+
+
+# =============================
+# LIST APIS
+# =============================
+class TicketListTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        issue_tickets(self.event, 7, render_qr=False)
+        issue_tickets(make_event("Other event"), 2, render_qr=False)
+        self.staff = User.objects.create(username="staff", is_staff=True)
+        self.client.force_login(self.staff)
+
+    def pages(self, **params):
+        url = reverse("api_ticket_list") + "?" + "&".join(f"{k}={v}" for k, v in params.items())
+        while url:
+            body = self.client.get(url).json()
+            yield [row["id"] for row in body["results"]]
+            url = body["next"]
+
+    def test_cursor_pages_are_stable_while_tickets_are_added(self):
+        pages = self.pages(event=self.event.id, page_size=3)
+        first = next(pages)
+        # Newer tickets sort before the cursor and must not shift later pages.
+        issue_tickets(self.event, 2, render_qr=False)
+        seen = first + [ticket_id for page in pages for ticket_id in page]
+
+        expected = [str(pk) for pk in Ticket.objects.filter(event=self.event)
+                    .order_by("-created_at", "-id").values_list("id", flat=True)][2:]
+        self.assertEqual(len(first), 3)
+        self.assertEqual(seen, expected)
+
+    def test_status_filter(self):
+        ticket = Ticket.objects.filter(event=self.event).first()
+        Ticket.check_in(pk=ticket.pk)
+        pages = list(self.pages(event=self.event.id, status=Ticket.STATUS_USED))
+        self.assertEqual(pages, [[str(ticket.pk)]])
+
+    def test_event_is_required_and_validated(self):
+        url = reverse("api_ticket_list")
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url + "?event=bogus").status_code, 400)
+        self.assertEqual(self.client.get(f"{url}?event={self.event.id}&status=bogus").status_code, 400)
+
+    def test_list_is_staff_only(self):
+        ticket = Ticket.objects.filter(event=self.event).first()
+        detail = reverse("api_ticket_detail", args=[ticket.pk])
+        self.client.logout()
+        self.assertIn(self.client.get(f"{reverse('api_ticket_list')}?event={self.event.id}").status_code, (401, 403))
+        self.assertEqual(self.client.get(detail).status_code, 200)
+
+
+# =============================
+# SCAN LOG
+# =============================
+@override_settings(TICKET_SCAN_LOG=True)
+class ScanLogTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        # Flushed by hand from the test thread, not by a writer thread.
+        self.buffer = scan_log.ScanLogBuffer(batch_size=2, max_pending=3)
+        patcher = mock.patch.object(scan_log.ScanLogBuffer, "_ensure_writer")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(scan_log, "get_buffer", return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.event = make_event()
+        self.ticket = Ticket.new_signed(self.event)
+        self.ticket.save()
+
+    def test_scans_are_logged_with_device_and_gate(self):
+        self.scan(signed_payload(self.ticket), device_id="handheld-1", gate="north")
+        self.scan(signed_payload(self.ticket), event_id=str(self.event.id))
+        self.scan("garbage")
+        self.assertFalse(ScanAttempt.objects.exists())
+        self.buffer.flush()
+
+        attempts = list(ScanAttempt.objects.order_by("id").values_list("outcome", "ticket_id", "device_id", "gate"))
+        self.assertEqual(attempts, [
+            ("ok", self.ticket.id, "handheld-1", "north"),
+            ("already_used", self.ticket.id, "", ""),
+            ("invalid_payload", None, "", ""),
+        ])
+
+    def test_rate_limited_scans_are_not_logged(self):
+        with override_settings(TICKET_RATE_LIMITS={"ip": (0.001, 1)}):
+            self.scan(signed_payload(self.ticket))
+            self.assertEqual(self.scan(signed_payload(self.ticket)).status_code, 429)
+        self.buffer.flush()
+        self.assertEqual(list(ScanAttempt.objects.values_list("outcome", flat=True)), ["ok"])
+
+    def test_full_buffer_drops_the_oldest_attempts(self):
+        for reason in ("not_found", "invalid_signature", "already_used", "ok"):
+            self.buffer.append(ScanAttempt(outcome=reason, scanned_at=timezone.now()))
+        self.buffer.flush()
+        self.assertEqual(
+            list(ScanAttempt.objects.order_by("id").values_list("outcome", flat=True)),
+            ["invalid_signature", "already_used", "ok"],
+        )
+
+
+# =============================
+# PRINT EXPORTS
+# =============================
+class PrintExportTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        # Render in-process rather than in a spawned pool.
+        patcher = mock.patch.object(print_export._Pool, "submit", lambda pool, fn, items: map(fn, items))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.event = make_event()
+        issue_tickets(self.event, 5, render_qr=False)
+        self.stored = Ticket.objects.filter(event=self.event).order_by("created_at", "id").first()
+        store_qr_image(self.stored)
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+
+    def test_zip_has_one_valid_image_per_ticket(self):
+        response = self.client.get(reverse("print_tickets", args=[self.event.id]) + "?format=zip")
+        self.assertEqual(response["Content-Type"], "application/zip")
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+        self.assertIsNone(archive.testzip())
+        ids = Ticket.objects.filter(event=self.event).order_by("created_at", "id").values_list("id", flat=True)
+        self.assertEqual([name.rsplit(".", 1)[0] for name in archive.namelist()], [f"ticket_{pk}" for pk in ids])
+        with self.stored.qr_image.open("rb") as f:
+            self.assertEqual(archive.read(f"ticket_{self.stored.id}.png"), f.read())
+
+    def test_pdf_command_writes_a_complete_document(self):
+        output = f"{_media}/tickets.pdf"
+        call_command("print_tickets", str(self.event.id), output=output, columns=2, rows=2,
+                     chunk_size=2, stdout=io.StringIO(), stderr=io.StringIO())
+        with open(output, "rb") as f:
+            pdf = f.read()
+        self.assertTrue(pdf.startswith(b"%PDF-"))
+        self.assertTrue(pdf.rstrip().endswith(b"%%EOF"))
+        # Five codes at 2 x 2 per sheet: two pages.
+        self.assertIn(b"/Count 2 >>", pdf)
+        self.assertEqual(pdf.count(b"/Subtype /Image"), 5)
+
+    def test_bad_format_and_event(self):
+        url = reverse("print_tickets", args=[self.event.id])
+        self.assertEqual(self.client.get(url + "?format=tiff").status_code, 400)
+        with self.assertRaises(CommandError):
+            call_command("print_tickets", "bogus", output=f"{_media}/x.pdf")
+
+    def test_print_is_staff_only(self):
+        self.client.logout()
+        response = self.client.get(reverse("print_tickets", args=[self.event.id]) + "?format=zip")
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.streaming)
+
+
+# =============================
+# ARCHIVAL
+# =============================
+@override_settings(TICKET_ARCHIVE_DIR=f"{_media}/archive")
+class ArchiveTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        archive._blooms.clear()
+        self.event = make_event("Old event", starts_in=timedelta(days=-40), lasts=timedelta(hours=4))
+        issue_tickets(self.event, 4, render_qr=False)
+        self.used = Ticket.objects.filter(event=self.event).first()
+        used_at = timezone.now() - timedelta(days=39)
+        Ticket.objects.filter(pk=self.used.pk).update(status=Ticket.STATUS_USED, used_at=used_at)
+        self.recent = make_event("Recent event")
+        issue_tickets(self.recent, 1, render_qr=False)
+
+    def test_archive_compacts_ended_events_and_keeps_their_stats(self):
+        self.assertEqual(archive.archive_ended_events(), (1, 4))
+        self.assertEqual(archive.archive_ended_events(), (0, 0))
+
+        self.assertFalse(Ticket.objects.filter(event=self.event).exists())
+        self.assertTrue(Ticket.objects.filter(event=self.recent).exists())
+        record = self.event.archive
+        self.assertEqual((record.tickets, record.used, record.expired), (4, 1, 3))
+        self.assertIsNotNone(record.compacted_at)
+        self.assertEqual(EventCounter.objects.get(event=self.event).issued, 4)
+
+    def test_lookup_by_id_or_token(self):
+        token = self.used.token
+        archive.archive_ended_events()
+
+        by_id = archive.lookup(self.used.id)
+        self.assertEqual(by_id["status"], Ticket.STATUS_USED)
+        self.assertEqual(by_id["event_id"], str(self.event.id))
+        self.assertEqual(archive.lookup(token)["id"], str(self.used.id))
+        self.assertIsNone(archive.lookup(uuid.uuid4()))
+        self.assertIsNone(archive.lookup(self.used.id, event_id=self.recent.id))
+
+        response = self.client.get(reverse("api_archived_ticket", args=[self.used.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["used"])
+
+    def test_bloom_filters_are_read_once_per_archive(self):
+        archive.archive_ended_events()
+        archive.lookup(self.used.id)
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(archive.lookup(self.used.id))
+
+        # A rewritten archive has its filter read again.
+        EventArchive.objects.filter(event=self.event).update(archived_at=timezone.now())
+        with self.assertNumQueries(2):
+            archive.lookup(self.used.id)
+
+    def test_bad_event_ids_are_rejected(self):
+        url = reverse("api_archived_ticket", args=[self.used.id])
+        response = self.client.get(url + "?event=bogus")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["reason"], "invalid_event")
+        with self.assertRaises(CommandError):
+            call_command("lookup_archived_ticket", str(self.used.id), event="bogus")
+
+
+# =============================
+# SCAN-NODE PROFILE
+# =============================
+@override_settings(ROOT_URLCONF="event_qrproject.urls_scan")
+class ScanProfileTests(TicketTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ticket = Ticket.new_signed(make_event())
+        self.ticket.save()
+
+    def test_scan_endpoints_are_routed(self):
+        self.assertEqual(self.scan(signed_payload(self.ticket)).status_code, 200)
+        page = self.client.get(reverse("validate_ticket", args=[self.ticket.token]))
+        self.assertEqual(page.status_code, 200)
+
+    def test_unrouted_qr_endpoint_has_no_url(self):
+        self.assertIsNone(self.ticket.qr_image_url)
+
+    def test_scan_node_does_not_load_qr_or_issuance_modules(self):
+        script = (
+            "import sys, django; django.setup()\n"
+            "from django.urls import resolve\n"
+            "resolve('/tickets/api/validate/'); resolve('/tickets/api/validate/batch/')\n"
+            "print(sorted(m for m in ('qrcode', 'PIL', 'tickets.views', 'tickets.issuance') if m in sys.modules))\n"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "event_qrproject.settings_scan"}
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
+
+
+# =============================
+# CHECK-IN ROLLUPS
+# =============================
+class CheckInRollupTests(TicketTestCase):
+    """TICKET_SCAN_LOG is off here: the rollup must not depend on the scan log."""
+
+    def setUp(self):
+        super().setUp()
+        self.event = make_event()
+        issue_tickets(self.event, 6, render_qr=False)
+        self.tickets = list(Ticket.objects.filter(event=self.event).select_related("event"))
+
+    def gates(self):
+        rows = CheckInRollup.objects.filter(event=self.event, resolution=CheckInRollup.RESOLUTION_MINUTE)
+        return dict(rows.values("gate").annotate(n=Sum("count")).values_list("gate", "n"))
+
+    def test_every_check_in_path_is_counted_by_gate(self):
+        a, b, c, d, e, f = self.tickets
+        self.scan(signed_payload(a), gate="north")
+        self.scan(signed_payload(a), gate="north")  # already used
+        self.scan(signed_payload(b), device_id="handheld-1")
+        self.client.get(reverse("validate_ticket", args=[c.token]), HTTP_X_GATE="south")
+        self.client.post(reverse("api_validate_tickets_batch"), {"payloads": [signed_payload(d)]},
+                         content_type="application/json", HTTP_X_GATE="south")
+        async_to_sync(scan_cache.acheck_in)(ticket_id=str(e.id), gate="north")
+        apply_offline_checkins(self.event, [{
+            "ticket_id": f.id, "scanned_at": timezone.now(), "device_id": "handheld-2", "signature": f.signature,
+        }])
+
+        self.assertEqual(self.gates(), {"north": 2, "handheld-1": 1, "south": 2, "handheld-2": 1})
+        self.assertEqual(sum(self.gates().values()), EventCounter.objects.get(event=self.event).used)
+
+    def test_first_check_in_of_a_minute_creates_its_row(self):
+        a, b = self.tickets[:2]
+        Ticket.check_in(pk=a.pk, gate="north")
+        CheckInRollup.objects.all().delete()
+        Ticket.check_in(pk=b.pk, gate="north")
+        self.assertEqual(self.gates(), {"north": 1})
+
+    def test_new_rows_cost_no_extra_queries(self):
+        a, b = self.tickets[:2]
+        with self.assertNumQueries(3):
+            rollups.add_for_ticket(Ticket.objects.filter(pk=a.pk), timezone.now(), "east")
+            rollups.add_for_ticket(Ticket.objects.filter(pk=b.pk), timezone.now(), "east")
+            rollups.add_for_ticket(Ticket.objects.filter(pk=uuid.uuid4()), timezone.now(), "east")
+        self.assertEqual(self.gates(), {"east": 2})
+
+    def test_series_and_rebuild_agree(self):
+        for ticket in self.tickets[:3]:
+            Ticket.check_in(pk=ticket.pk)
+        resolution, points = rollups.series(self.event.id)
+        self.assertEqual(resolution, CheckInRollup.RESOLUTION_MINUTE)
+        self.assertEqual(sum(point["count"] for point in points), 3)
+        self.assertEqual(rollups.recent_checkins([self.event.id]), {self.event.id: 3})
+
+        CheckInRollup.objects.all().delete()
+        self.assertEqual(rollups.rebuild_rollup(self.event), 3)
+        self.assertEqual(self.gates(), {"": 3})
+
+    def test_downsampling_folds_minutes_into_hours(self):
+        for ticket in self.tickets[:2]:
+            Ticket.check_in(pk=ticket.pk)
+        Event.objects.filter(pk=self.event.pk).update(end_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(rollups.downsample_ended_events(), (1, 1))
+        resolution, points = rollups.series(self.event.id)
+        self.assertEqual(resolution, CheckInRollup.RESOLUTION_HOUR)
+        self.assertEqual([point["count"] for point in points], [2])
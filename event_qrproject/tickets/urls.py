@@ -1,16 +1,37 @@
 from django.urls import path
-from . import views
+from . import async_views, metrics, views, validation_views
 
 urlpatterns = [
     # ===== API Endpoints =====
     path("api/register/", views.RegisterTicketAPI.as_view(), name="api_register_ticket"),
+    path("api/issue/", views.BulkIssueTicketsAPI.as_view(), name="api_bulk_issue"),
+    path("api/issue/<uuid:job_id>/", views.BulkIssueStatusAPI.as_view(), name="api_bulk_issue_status"),
     path("api/detail/<uuid:pk>/", views.TicketDetailAPI.as_view(), name="api_ticket_detail"),
+    path("api/events/", views.EventListAPI.as_view(), name="api_event_list"),
+    path("api/tickets/", views.TicketListAPI.as_view(), name="api_ticket_list"),
+    path("api/validate/", validation_views.validate_ticket_api, name="api_validate_ticket"),
+    path("api/async/validate/", async_views.validate_ticket_api, name="api_validate_ticket_async"),
+    path("api/validate/batch/", validation_views.validate_tickets_batch_api, name="api_validate_tickets_batch"),
+    path("api/events/<uuid:event_id>/stats/", views.EventStatsAPI.as_view(), name="api_event_stats"),
+    path("api/events/<uuid:event_id>/throughput/", views.CheckInThroughputAPI.as_view(), name="api_checkin_throughput"),
+    path("api/events/<uuid:event_id>/feed/", views.CheckInFeedAPI.as_view(), name="api_checkin_feed"),
+    path("api/events/<uuid:event_id>/stream/", async_views.checkin_stream, name="api_checkin_stream"),
+    path("api/events/<uuid:event_id>/manifest/", validation_views.offline_manifest_api, name="api_offline_manifest"),
+    path("api/events/<uuid:event_id>/checkins/", validation_views.offline_checkins_api, name="api_offline_checkins"),
+    path("api/archive/tickets/<uuid:key>/", views.ArchivedTicketAPI.as_view(), name="api_archived_ticket"),
 
     # ===== HTML Pages =====
     path("register/", views.register_ticket, name="ticket-register-page"),
     path("landing/", views.landing_validate_page, name="landing_validate_page"),
     path("manage-events/", views.manage_events, name="manage_events"),
+    path("events/<uuid:event_id>/export/", views.export_tickets, name="export_tickets"),
+    path("events/<uuid:event_id>/print/", views.print_tickets, name="print_tickets"),
+    path("metrics/", metrics.metrics_view, name="metrics"),
+
+    # QR image for a ticket, rendered on demand
+    path("qr/<uuid:token>/", views.ticket_qr, name="ticket_qr"),
 
     # Validation URL using token from QR code
-    path("validate/<str:token>/", views.validate_ticket, name="validate_ticket"),
+    path("validate/<uuid:token>/", validation_views.validate_ticket, name="validate_ticket"),
+    path("async/validate/<uuid:token>/", async_views.validate_ticket, name="validate_ticket_async"),
 ]
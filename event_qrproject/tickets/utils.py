@@ -1,35 +1,107 @@
 # tickets/utils.py
 import hmac
 import hashlib
-from urllib.parse import quote_plus
-import requests
+from functools import lru_cache
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.core.files.base import ContentFile
 from django.urls import reverse
 
-QR_API_BASE = "https://api.qrserver.com/v1/create-qr-code/"
+from .metrics import timed
+from .payload import COMPACT_MAC_BYTES, encode_compact
+from .qr import make_renderer
 
-def make_signature(ticket_uuid: str) -> str:
-    key = settings.TICKET_HMAC_KEY.encode()
-    msg = ticket_uuid.encode()
-    sig = hmac.new(key, msg, hashlib.sha256).hexdigest()
-    return sig
+_qr_renderer = None
 
-def verify_signature(ticket_uuid: str, sig: str) -> bool:
-    expected = make_signature(ticket_uuid)
+KEY_DERIVATION_SALT = b"eventrs-ticket-keys"
+
+def derive_event_key(master_key: bytes, event_id, version: int = 1) -> bytes:
+    """HKDF-SHA256 (RFC 5869) of the master key for one event and key version."""
+    prk = hmac.new(KEY_DERIVATION_SALT, master_key, hashlib.sha256).digest()
+    info = f"event:{event_id}:v{version}".encode()
+    return hmac.new(prk, info + b"\x01", hashlib.sha256).digest()
+
+@lru_cache(maxsize=1024)
+def _keyed_mac(event_id, version):
+    """
+    Pre-keyed HMAC state for an event (or the master key when event_id is
+    None). Signing copies it, so the key pads are hashed once per process.
+    """
+    master_key = settings.TICKET_HMAC_KEY.encode()
+    key = master_key if event_id is None else derive_event_key(master_key, event_id, version)
+    return hmac.new(key, digestmod=hashlib.sha256)
+
+def clear_key_cache():
+    _keyed_mac.cache_clear()
+
+@receiver(setting_changed)
+def _clear_key_cache_on_setting_change(setting, **kwargs):
+    if setting == "TICKET_HMAC_KEY":
+        clear_key_cache()
+
+def make_signature(ticket_uuid: str, event=None) -> str:
+    """
+    Sign ``ticket_uuid`` with ``event``'s derived key, or with the master
+    key when no event is given.
+    """
+    if event is None:
+        mac = _keyed_mac(None, None).copy()
+    else:
+        mac = _keyed_mac(str(event.id), event.signing_key_version).copy()
+    mac.update(str(ticket_uuid).encode())
+    return mac.hexdigest()
+
+def _signature_matches(expected: str, sig: str, truncated: bool = False) -> bool:
+    # Compact QR payloads carry only the first COMPACT_MAC_BYTES of the MAC.
+    if truncated:
+        expected = expected[:COMPACT_MAC_BYTES * 2]
     return hmac.compare_digest(expected, sig)
 
+def verify_signature(ticket_uuid: str, sig: str, event=None, truncated: bool = False) -> bool:
+    """
+    Check ``sig`` against ``event``'s key. Only the truncated MAC of a
+    compact payload is accepted when ``truncated`` is set, and only the full
+    one otherwise. Signatures made with the master key are also accepted
+    while settings.TICKET_ACCEPT_GLOBAL_SIGNATURES is on.
+    """
+    if not isinstance(sig, str):
+        return False
+    sig = sig.lower()
+    if _signature_matches(make_signature(ticket_uuid, event), sig, truncated):
+        return True
+    if event is not None and getattr(settings, "TICKET_ACCEPT_GLOBAL_SIGNATURES", True):
+        return _signature_matches(make_signature(ticket_uuid), sig, truncated)
+    return False
+
+def verify_many(items) -> list:
+    """
+    Verify a batch of ``(ticket_uuid, sig, event, truncated)`` tuples.
+    Returns one bool per item, in order.
+    """
+    return [verify_signature(*item) for item in items]
+
 def build_payload(ticket_uuid: str, signature: str) -> str:
     return f"{ticket_uuid}|{signature}"
 
-def generate_qr_and_save(ticket, payload_str: str, size: str = "300x300") -> str:
-    encoded = quote_plus(payload_str)
-    url = f"{QR_API_BASE}?data={encoded}&size={size}"
-    resp = requests.get(url, timeout=10)
-    if resp.status_code != 200:
-        raise RuntimeError(f"QR API returned {resp.status_code}")
-    filename = f"ticket_{ticket.id}.png"
-    content = ContentFile(resp.content)
+def get_qr_renderer():
+    """
+    Returns the QR renderer configured by settings.TICKET_QR_RENDERER
+    ("png", "svg" or "http") and TICKET_QR_RENDERER_OPTIONS.
+    """
+    global _qr_renderer
+    if _qr_renderer is None:
+        _qr_renderer = make_renderer(
+            getattr(settings, "TICKET_QR_RENDERER", "png"),
+            **getattr(settings, "TICKET_QR_RENDERER_OPTIONS", {}),
+        )
+    return _qr_renderer
+
+def generate_qr_and_save(ticket, payload_str: str, renderer=None) -> str:
+    renderer = renderer or get_qr_renderer()
+    filename = f"ticket_{ticket.id}.{renderer.extension}"
+    with timed("qr"):
+        content = ContentFile(renderer.render(payload_str))
     ticket.qr_image.save(filename, content, save=False)
     return ticket.qr_image.url
 
@@ -42,4 +114,19 @@ def build_landing_url(request, path: str):
     base = getattr(settings, "BASE_URL", "") or ""
     if base:
         return base.rstrip('/') + path
-    return request.build_absolute_uri(path)
\ No newline at end of file
+    return request.build_absolute_uri(path)
+
+def build_ticket_qr_url(token) -> str:
+    """Returns the validation URL encoded into a ticket's QR code."""
+    base_url = getattr(settings, "BASE_URL", "http://127.0.0.1:8000")
+    return f"{base_url}/tickets/validate/{token}/"
+
+def build_qr_content(ticket_id, token, event) -> str:
+    """
+    Returns what a ticket's QR code encodes: the validation URL, or the
+    compact payload for gate scanners when settings.TICKET_QR_PAYLOAD is
+    "compact".
+    """
+    if getattr(settings, "TICKET_QR_PAYLOAD", "url") == "compact":
+        return encode_compact(ticket_id, make_signature(ticket_id, event))
+    return build_ticket_qr_url(token)
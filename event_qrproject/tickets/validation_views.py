@@ -1,38 +1,209 @@
 # tickets/validation_views.py
+import uuid
+
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from django.utils import timezone
-from django.shortcuts import get_object_or_404
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
 
-from .models import Ticket
+from . import scan_cache, scan_log, shield
+from .models import Event
+from .offline_sync import apply_offline_checkins, iter_manifest, parse_cursor
+from .payload import parse_payload
+from .permissions import IsScannerOrStaff
+from .serializers import BatchValidationSerializer, OfflineCheckInBatchSerializer
 from .utils import verify_signature
 
+CHECK_IN_ERROR_STATUS = {
+    "not_found": status.HTTP_404_NOT_FOUND,
+    "already_used": status.HTTP_409_CONFLICT,
+    "expired": status.HTTP_410_GONE,
+    "invalid": status.HTTP_409_CONFLICT,
+    "invalid_signature": status.HTTP_403_FORBIDDEN,
+}
+
+
+def parse_validation_request(data):
+    """
+    Extract ``(ticket_id, signature)`` from a validation request body: a
+    scanned ``payload`` in the legacy or compact format, or separate
+    ``ticket_id`` and ``signature`` fields.
+    Returns ``(ticket_id, signature, compact, None)`` or
+    ``(None, None, False, (body, status))`` with the error response to send.
+    ``compact`` is true when the signature is a compact payload's truncated MAC.
+    """
+    if not isinstance(data, dict):
+        return None, None, False, ({"status": "error", "reason": "invalid_payload"}, status.HTTP_400_BAD_REQUEST)
+    payload = data.get("payload")
+    parsed = parse_payload(payload) if isinstance(payload, str) and payload else None
+    if parsed:
+        ticket_id, sig, compact = parsed
+    else:
+        ticket_id = data.get("ticket_id")
+        sig = data.get("signature")
+        compact = False
+
+    if not ticket_id or not sig:
+        return None, None, False, ({"status": "error", "reason": "invalid_payload"}, status.HTTP_400_BAD_REQUEST)
+    return ticket_id, sig, compact, None
+
+
+def rejection_response(rejection):
+    """Returns ``(body, status, headers)`` for a shield.Rejection."""
+    headers = {}
+    if rejection.retry_after:
+        headers["Retry-After"] = str(max(int(rejection.retry_after + 0.999), 1))
+    return {"status": "error", "reason": rejection.reason}, rejection.status, headers
+
+
+def signature_error(ticket_id, sig, entry, event, event_id=None, compact=False):
+    """
+    Check ``sig`` (a compact payload's truncated MAC if ``compact``) with
+    the key of the ticket's event. Returns None if it is valid, otherwise
+    the ``(body, status)`` error response. A ticket of another event than
+    the scanner's ``event_id`` counts as not found.
+    """
+    if entry is None or (event_id and entry.event_id != str(event_id)):
+        return {"status": "error", "reason": "not_found"}, status.HTTP_404_NOT_FOUND
+    if not verify_signature(ticket_id, sig, event, compact):
+        return {"status": "error", "reason": "invalid_signature"}, status.HTTP_403_FORBIDDEN
+    return None
+
+
+def check_in_response(ticket_id, result):
+    """Returns ``(body, status)`` for a CheckInResult."""
+    if not result.success:
+        return {"status": "error", "reason": result.reason, "used_at": result.used_at}, CHECK_IN_ERROR_STATUS[result.reason]
+    return {"status": "ok", "ticket_id": str(ticket_id), "used_at": result.used_at}, status.HTTP_200_OK
+
+
+def validate_ticket(request, token):
+    """Validate ticket when QR code is scanned."""
+    rejection = shield.screen(request, token=token)
+    if rejection:
+        scan_log.record(request, rejection.reason)
+        body, code, headers = rejection_response(rejection)
+        return HttpResponse(body["reason"], status=code, headers=headers)
+
+    result, entry = scan_cache.check_in(token=token, gate=scan_log.rollup_gate(request))
+    if entry is None:
+        scan_log.record(request, "not_found")
+        shield.remember_rejection("not_found", token=token)
+        raise Http404("Ticket not found.")
+    scan_log.record(request, result.reason, entry.ticket_id, entry.event_id)
+
+    ticket = scan_cache.build_ticket(entry)
+    color = "success" if result.success else "danger" if ticket.status == "used" else "secondary"
+
+    return render(request, "tickets/validate.html", {
+        "ticket": ticket,
+        "message": result.message,
+        "color": color
+    })
+
+
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def validate_ticket_api(request):
-    payload = request.data.get("payload")
-    if payload and "|" in payload:
-        ticket_id, sig = payload.split("|", 1)
-    else:
-        ticket_id = request.data.get("ticket_id")
-        sig = request.data.get("signature")
+    data = request.data
+    ticket_id, sig, compact, error = parse_validation_request(data)
+    if error:
+        scan_log.record(request, error[0]["reason"], data=data)
+        return Response(*error)
 
-    if not ticket_id or not sig:
+    event_id = data.get("event_id")
+    rejection = shield.screen(request, data, ticket_id=ticket_id, sig=sig, event_id=event_id)
+    if rejection:
+        scan_log.record(request, rejection.reason, ticket_id, event_id, data)
+        body, code, headers = rejection_response(rejection)
+        return Response(body, status=code, headers=headers)
+
+    try:
+        entry = scan_cache.get_ticket_entry(ticket_id=ticket_id)
+    except ValidationError:
+        scan_log.record(request, "invalid_payload", event_id=event_id, data=data)
         return Response({"status": "error", "reason": "invalid_payload"}, status=status.HTTP_400_BAD_REQUEST)
+    error = signature_error(ticket_id, sig, entry, entry and scan_cache.get_event(entry.event_id), event_id, compact)
+    if error:
+        scan_log.record(request, error[0]["reason"], ticket_id, event_id or (entry and entry.event_id), data)
+        # A ticket of another gate's event is only "not found" for that gate.
+        if entry is None or error[0]["reason"] != "not_found":
+            shield.remember_rejection(error[0]["reason"], ticket_id=ticket_id, sig=sig)
+        return Response(*error)
+
+    result, entry = scan_cache.check_in(ticket_id=ticket_id, gate=scan_log.rollup_gate(request, data))
+    scan_log.record(request, result.reason, ticket_id, entry and entry.event_id, data)
+    return Response(*check_in_response(ticket_id, result))
+
 
-    if not verify_signature(ticket_id, sig):
-        return Response({"status": "error", "reason": "invalid_signature"}, status=status.HTTP_403_FORBIDDEN)
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def validate_tickets_batch_api(request):
+    """
+    Validate up to 100 scanned payloads in one request, for turnstiles and
+    handhelds that buffer reads. Returns one result per payload, in order,
+    each shaped like a validate_ticket_api response plus its HTTP ``code``.
+    """
+    serializer = BatchValidationSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+
+    retry_after = shield.take(request, data, cost=len(data["payloads"]))
+    if retry_after:
+        body, code, headers = rejection_response(shield.Rejection("rate_limited", 429, retry_after))
+        return Response(body, status=code, headers=headers)
+
+    items = []
+    for payload in data["payloads"]:
+        ticket_id, sig, compact = parse_payload(payload) or (None, None, False)
+        try:
+            items.append((ticket_id and str(uuid.UUID(ticket_id)), sig, compact))
+        except ValueError:
+            items.append((None, None, False))
 
-    ticket = get_object_or_404(Ticket, pk=ticket_id)
+    results = scan_cache.check_in_many(items, data.get("event_id"), gate=scan_log.rollup_gate(request, data))
+    bodies = []
+    for (ticket_id, _, _), result in zip(items, results):
+        if ticket_id is None:
+            body, code = {"status": "error", "reason": "invalid_payload"}, status.HTTP_400_BAD_REQUEST
+        else:
+            body, code = check_in_response(ticket_id, result)
+        scan_log.record(request, result.reason if ticket_id else "invalid_payload", ticket_id, data.get("event_id"), data)
+        bodies.append({**body, "ticket_id": ticket_id, "code": code})
+    return Response({"status": "ok", "results": bodies}, status=status.HTTP_200_OK)
 
-    if ticket.status == Ticket.STATUS_USED:
-        return Response({"status": "error", "reason": "already_used", "used_at": ticket.used_at}, status=status.HTTP_409_CONFLICT)
 
-    # mark used
-    ticket.status = Ticket.STATUS_USED
-    ticket.used_at = timezone.now()
-    ticket.save()
+# =============================
+# OFFLINE SCANNER SYNC
+# =============================
+@api_view(["GET"])
+@permission_classes([IsScannerOrStaff])
+def offline_manifest_api(request, event_id):
+    event = get_object_or_404(Event, pk=event_id)
+    try:
+        since = parse_cursor(request.GET.get("since"))
+    except ValueError:
+        return Response({"status": "error", "reason": "invalid_cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+    return StreamingHttpResponse(iter_manifest(event, since), content_type="application/x-ndjson")
+
+
+@api_view(["POST"])
+@permission_classes([IsScannerOrStaff])
+def offline_checkins_api(request, event_id):
+    event = get_object_or_404(Event, pk=event_id)
+    serializer = OfflineCheckInBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    return Response({"status": "ok", "ticket_id": str(ticket.id), "used_at": ticket.used_at}, status=status.HTTP_200_OK)
+    device_id = serializer.validated_data.get("device_id")
+    checkins = [
+        {**item, "device_id": item.get("device_id", device_id)}
+        for item in serializer.validated_data["checkins"]
+    ]
+    applied, conflicts = apply_offline_checkins(event, checkins)
+    return Response({"status": "ok", "applied": applied, "conflicts": conflicts}, status=status.HTTP_200_OK)
@@ -1,19 +1,47 @@
-import io
-import qrcode
+from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.renderers import JSONRenderer
-from .models import Ticket, Event
-from .serializers import TicketRegisterSerializer, TicketResponseSerializer
+from .models import Ticket, Event, EventCounter
+from .serializers import (
+    EventListSerializer, TicketBulkIssueSerializer, TicketListSerializer, TicketRegisterSerializer,
+    TicketResponseSerializer,
+)
+from .pagination import EventCursorPagination, TicketCursorPagination
+from .issuance import start_issue_job, get_job
+from . import archive, metrics, rollups, scan_cache
+from .export import EXPORT_FORMATS, iter_export
+from .print_export import PRINT_FORMATS, iter_qr_pdf, iter_qr_zip
+from .feed import broker
+from .qr import render_png
+from .qr_cache import get_qr_png, qr_key
+from .utils import build_qr_content, build_ticket_qr_url
+import uuid
 from datetime import datetime
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib import messages
 
 
+def store_qr_image(ticket):
+    """Render the ticket's QR code and save it to ``qr_image``."""
+    with metrics.timed("qr"):
+        png = render_png(build_qr_content(ticket.id, ticket.token, ticket.event))
+    ticket.qr_image.save(f"ticket_{ticket.id}.png", ContentFile(png), save=True)
+
+
 # =============================
 # API VIEWS
 # =============================
@@ -26,15 +54,13 @@ class RegisterTicketAPI(APIView):
             event_id = serializer.validated_data["event_id"]
             event = get_object_or_404(Event, id=event_id)
 
-            ticket = Ticket.objects.create(event=event)
+            with transaction.atomic():
+                ticket = Ticket.new_signed(event)
+                ticket.save(force_insert=True)
 
             # Use token for secure QR link
-            base_url = getattr(settings, "BASE_URL", "http://127.0.0.1:8000")
-            qr_url = f"{base_url}/tickets/validate/{ticket.token}/"
-            qr_image = qrcode.make(qr_url)
-            buffer = io.BytesIO()
-            qr_image.save(buffer, format="PNG")
-            ticket.qr_image.save(f"ticket_{ticket.id}.png", ContentFile(buffer.getvalue()), save=True)
+            if settings.TICKET_STORE_QR_IMAGES:
+                store_qr_image(ticket)
 
             response_serializer = TicketResponseSerializer(ticket)
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
@@ -42,9 +68,184 @@ class RegisterTicketAPI(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BulkIssueTicketsAPI(APIView):
+    """Issue many tickets for one event in a background job."""
+    renderer_classes = [JSONRenderer]
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = TicketBulkIssueSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        event = get_object_or_404(Event, id=data["event_id"])
+        job_id = start_issue_job(event, data["count"], render_qr=data["render_qr"])
+        return Response(get_job(job_id), status=status.HTTP_202_ACCEPTED)
+
+
+class BulkIssueStatusAPI(APIView):
+    renderer_classes = [JSONRenderer]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, job_id):
+        job = get_job(job_id)
+        if job is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job)
+
+
+class EventStatsAPI(APIView):
+    """Live issued/used/expired counts for an event, read from EventCounter."""
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request, event_id):
+        counts = EventCounter.objects.filter(event_id=event_id).values("issued", "used", "expired").first()
+        if counts is None:
+            get_object_or_404(Event, id=event_id)
+            counts = {"issued": 0, "used": 0, "expired": 0}
+        return Response({"event_id": str(event_id), **counts})
+
+
+class CheckInThroughputAPI(APIView):
+    """
+    Check-ins per minute (or ``?resolution=hour``) for an event, read from
+    the check-in rollup. ``?gate=`` keeps one gate, ``?by=gate`` splits
+    every bucket per gate, and ``?since=`` / ``?until=`` (ISO 8601) bound
+    the buckets returned.
+    """
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request, event_id):
+        get_object_or_404(Event, id=event_id)
+        resolution = request.GET.get("resolution", rollups.MINUTE)
+        if resolution not in rollups.RESOLUTIONS:
+            return Response({"detail": "Invalid resolution."}, status=status.HTTP_400_BAD_REQUEST)
+        bounds = {}
+        for name in ("since", "until"):
+            value = request.GET.get(name)
+            if value:
+                bounds[name] = parse_datetime(value)
+                if bounds[name] is None:
+                    return Response({"detail": f"Invalid {name}."}, status=status.HTTP_400_BAD_REQUEST)
+                if timezone.is_naive(bounds[name]):
+                    bounds[name] = timezone.make_aware(bounds[name])
+
+        by_gate = request.GET.get("by") == "gate"
+        resolution, points = rollups.series(
+            event_id, resolution, gate=request.GET.get("gate"), by_gate=by_gate, **bounds
+        )
+        return Response({
+            "event_id": str(event_id),
+            "resolution": resolution,
+            "total": sum(point["count"] for point in points),
+            "series": points,
+        })
+
+
+class ArchivedTicketAPI(APIView):
+    """
+    Read-only lookup of an archived ticket by id or token (see
+    tickets/archive.py): was it used, and when.
+    """
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request, key):
+        event_id = request.GET.get("event")
+        if event_id:
+            try:
+                event_id = uuid.UUID(event_id)
+            except ValueError:
+                return Response({"status": "error", "reason": "invalid_event"}, status=status.HTTP_400_BAD_REQUEST)
+        record = archive.lookup(key, event_id=event_id)
+        if record is None:
+            return Response({"status": "error", "reason": "not_found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "ticket_id": record["id"],
+            "event_id": record["event_id"],
+            "status": record["status"],
+            "used": record["status"] == Ticket.STATUS_USED,
+            "used_at": record["used_at"],
+            "created_at": record["created_at"],
+        })
+
+
+class CheckInFeedAPI(APIView):
+    """
+    Long-poll feed of an event's check-ins: returns check-ins with a sequence
+    number above ``?after=`` at once, or waits up to ``?timeout=`` seconds
+    (max 25) for the next ones. Pass the returned cursor back as ``after``.
+    """
+    renderer_classes = [JSONRenderer]
+
+    def get(self, request, event_id):
+        get_object_or_404(Event, id=event_id)
+        try:
+            after = int(request.GET.get("after", 0))
+            timeout = min(max(float(request.GET.get("timeout", 25)), 0), 25)
+        except ValueError:
+            return Response({"detail": "Invalid after/timeout."}, status=status.HTTP_400_BAD_REQUEST)
+
+        messages = broker.recent(event_id, after)
+        if not messages:
+            sub = broker.subscribe(event_id)
+            try:
+                messages = broker.recent(event_id, after) or sub.get(timeout)
+            finally:
+                sub.close()
+
+        messages = [(seq, data) for seq, data in messages if seq > after]
+        return Response({
+            "event_id": str(event_id),
+            "cursor": messages[-1][0] if messages else after,
+            "checkins": [{"seq": seq, **data} for seq, data in messages],
+        })
+
+
+class EventListAPI(ListAPIView):
+    """Events, newest first, cursor-paginated (?cursor=, ?page_size=)."""
+    renderer_classes = [JSONRenderer]
+    serializer_class = EventListSerializer
+    pagination_class = EventCursorPagination
+    queryset = Event.objects.only("id", "title", "location", "start_at", "end_at")
+
+
+class TicketListAPI(ListAPIView):
+    """
+    Staff only. Tickets of one event (?event=, required), newest first,
+    cursor-paginated and optionally filtered by ?status=. Each page is one
+    indexed range scan, however deep.
+    """
+    renderer_classes = [JSONRenderer]
+    permission_classes = [IsAdminUser]
+    serializer_class = TicketListSerializer
+    pagination_class = TicketCursorPagination
+
+    def get_queryset(self):
+        tickets = Ticket.objects.select_related("event").only(
+            "id", "status", "created_at", "used_at", "event__id", "event__title"
+        )
+        tickets = tickets.filter(event_id=self.request.query_params["event"])
+        status_filter = self.request.query_params.get("status")
+        if status_filter:
+            tickets = tickets.filter(status=status_filter)
+        return tickets
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get("event"):
+            return Response({"detail": "The event parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+        status_filter = request.query_params.get("status")
+        if status_filter and status_filter not in dict(Ticket.STATUS_CHOICES):
+            return Response({"detail": f"Invalid status: {status_filter}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return super().list(request, *args, **kwargs)
+        except ValidationError:
+            return Response({"detail": "Invalid event id."}, status=status.HTTP_400_BAD_REQUEST)
+
+
 class TicketDetailAPI(APIView):
     def get(self, request, pk):
-        ticket = get_object_or_404(Ticket, pk=pk)
+        ticket = get_object_or_404(Ticket.objects.select_related("event"), pk=pk)
         serializer = TicketResponseSerializer(ticket)
         return Response(serializer.data)
 
@@ -63,38 +264,92 @@ def register_ticket(request):
             })
 
         event = get_object_or_404(Event, id=event_id)
-        ticket = Ticket.objects.create(event=event)
+        with transaction.atomic():
+            ticket = Ticket.new_signed(event)
+            ticket.save(force_insert=True)
 
-        base_url = getattr(settings, "BASE_URL", "http://127.0.0.1:8000")
-        qr_url = f"{base_url}/tickets/validate/{ticket.token}/"
-        qr_image = qrcode.make(qr_url)
-        buffer = io.BytesIO()
-        qr_image.save(buffer, format="PNG")
-        ticket.qr_image.save(f"ticket_{ticket.id}.png", ContentFile(buffer.getvalue()), save=True)
+        if settings.TICKET_STORE_QR_IMAGES:
+            store_qr_image(ticket)
 
         return render(request, "tickets/register.html", {
             "success": True,
             "ticket": ticket,
-            "qr_url": ticket.qr_image.url if ticket.qr_image else None,
-            "fallback": qr_url,
+            "qr_url": ticket.qr_image_url,
+            "fallback": build_ticket_qr_url(ticket.token),
         })
 
     events = Event.objects.all()
     return render(request, "tickets/register.html", {"events": events})
 
 
-def validate_ticket(request, token):
-    """Validate ticket when QR code is scanned."""
-    ticket = get_object_or_404(Ticket, token=token)
+def _qr_box_size(request):
+    try:
+        return min(max(int(request.GET.get("size", 10)), 1), 40)
+    except ValueError:
+        return 10
+
+
+def _qr_content(token):
+    entry = scan_cache.get_ticket_entry(token=token)
+    if entry is None:
+        return None
+    return build_qr_content(entry.ticket_id, entry.token, scan_cache.get_event(entry.event_id))
+
+
+def _qr_etag(request, token):
+    content = _qr_content(token)
+    return content and qr_key(content, _qr_box_size(request))
+
+
+@condition(etag_func=_qr_etag)
+def ticket_qr(request, token):
+    """Serve a ticket's QR code, rendered on demand (?size= sets the box size)."""
+    content = _qr_content(token)
+    if content is None:
+        raise Http404("Ticket not found.")
+
+    png = get_qr_png(content, _qr_box_size(request))
+    response = HttpResponse(png, content_type="image/png")
+    patch_cache_control(response, public=True, max_age=settings.TICKET_QR_CACHE_MAX_AGE)
+    return response
+
+
+@staff_member_required
+def export_tickets(request, event_id):
+    """
+    Stream every ticket of an event as CSV or NDJSON (?format=csv|ndjson&status=...).
+    Staff only: the export carries each ticket's token.
+    """
+    event = get_object_or_404(Event, id=event_id)
+    fmt = request.GET.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unsupported format: {fmt}")
+
+    response = StreamingHttpResponse(
+        iter_export(event, fmt, status=request.GET.get("status")),
+        content_type=EXPORT_FORMATS[fmt],
+    )
+    response["Content-Disposition"] = f'attachment; filename="tickets_{event.id}.{fmt}"'
+    return response
+
 
-    success, message = ticket.mark_as_used()
-    color = "success" if success else "danger" if ticket.status == "used" else "secondary"
+@staff_member_required
+def print_tickets(request, event_id):
+    """
+    Stream an event's QR codes for printing: a ZIP of images or a PDF of
+    multi-up sheets (?format=zip|pdf&status=...). Staff only: each code
+    carries its ticket's token.
+    """
+    event = get_object_or_404(Event, id=event_id)
+    fmt = request.GET.get("format", "pdf")
+    if fmt not in PRINT_FORMATS:
+        return HttpResponseBadRequest(f"Unsupported format: {fmt}")
 
-    return render(request, "tickets/validate.html", {
-        "ticket": ticket,
-        "message": message,
-        "color": color
-    })
+    iter_print = iter_qr_zip if fmt == "zip" else iter_qr_pdf
+    chunks = iter_print(event, status=request.GET.get("status"), workers=settings.TICKET_PRINT_WORKERS)
+    response = StreamingHttpResponse(chunks, content_type=PRINT_FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="tickets_{event.id}_qr.{fmt}"'
+    return response
 
 
 def landing_validate_page(request):
@@ -128,5 +383,9 @@ def manage_events(request):
         else:
             messages.error(request, "Please fill out all required fields.")
 
-    events = Event.objects.all().order_by("-start_at")
-    return render(request, "tickets/manage_events.html", {"events": events})
+    events = Event.objects.order_by("-start_at", "-id").only("id", "title", "location", "start_at", "end_at")
+    page = Paginator(events, 50).get_page(request.GET.get("page"))
+    recent = rollups.recent_checkins([e.id for e in page])
+    for e in page:
+        e.checkins_last_hour = recent.get(e.id, 0)
+    return render(request, "tickets/manage_events.html", {"events": page, "page": page})